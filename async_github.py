@@ -0,0 +1,185 @@
+import asyncio
+import json
+import logging
+import threading
+from urllib.parse import parse_qs, urlencode, urlparse
+
+import aiohttp
+from github import UnknownObjectException
+
+from github_cache import API_URL, MAX_PER_PAGE, RestOrganization, \
+    next_link, raise_for_status, update_rate_limit
+from instrumentation import metrics
+
+logger = logging.getLogger(__name__)
+
+
+# asyncio client for the REST endpoints this tool reads, through get_json
+# and get_pages like CachedGitHubClient. All requests share one connection
+# pool and at most `concurrency` of them are in flight; list pages after
+# the first are requested together.
+class AsyncGitHubClient:
+    def __init__(self, github_token, base_url=API_URL, per_page=MAX_PER_PAGE,
+                 concurrency=16):
+        self.github_token = github_token
+        self.base_url = base_url
+        self.per_page = per_page
+        self.concurrency = concurrency
+        self.session = None
+        self.semaphore = None
+        self.rate_limiting = (-1, -1)
+        self.rate_limiting_resettime = 0
+        self.requests_made = 0
+
+    async def open(self):
+        # bound to the running event loop, so opened from inside it
+        if self.session is None:
+            headers = {'Accept': 'application/vnd.github+json'}
+            if self.github_token:
+                headers['Authorization'] = f'token {self.github_token}'
+            self.session = aiohttp.ClientSession(
+                headers=headers,
+                connector=aiohttp.TCPConnector(limit=self.concurrency))
+            self.semaphore = asyncio.Semaphore(self.concurrency)
+
+    async def close(self):
+        if self.session is not None:
+            await self.session.close()
+            self.session = None
+
+    async def request(self, url, stats=None):
+        # stats, if given, counts the pages and body bytes read
+        await self.open()
+        async with self.semaphore:
+            self.requests_made += 1
+            async with self.session.get(url) as response:
+                update_rate_limit(self, response.headers)
+                body = await response.read()
+                payload = json.loads(body) if body else None
+                if stats is not None:
+                    stats["pages"] += 1
+                    stats["bytes"] += len(body)
+                raise_for_status(response.status, payload, response.headers)
+                return payload, response.headers
+
+    async def get_json(self, path, params=None):
+        payload, _ = await self.request(self.url(path, params))
+        return payload
+
+    async def get_pages(self, path, stats=None):
+        payload, headers = await self.request(
+            self.url(path, {'per_page': self.per_page}), stats=stats)
+        items = list(payload)
+        links = headers.get('Link')
+        last_page = page_number(next_link(links, rel='last'))
+        if last_page is not None:
+            # GitHub announces the last page, so fetch the rest at once
+            pages = await asyncio.gather(*(
+                self.request(self.url(path, {'per_page': self.per_page,
+                                             'page': page}), stats=stats)
+                for page in range(2, last_page + 1)))
+            for payload, _ in pages:
+                items.extend(payload)
+            return items
+
+        url = next_link(links)
+        while url:
+            payload, headers = await self.request(url, stats=stats)
+            items.extend(payload)
+            url = next_link(headers.get('Link'))
+        return items
+
+    def url(self, path, params=None):
+        url = self.base_url + path
+        if params:
+            url += '?' + urlencode(params)
+        return url
+
+    async def get_team_members(self, org_name, team_slug, stats=None):
+        members = await self.get_pages(
+            f'/orgs/{org_name}/teams/{team_slug}/members', stats)
+        return [member['login'] for member in members]
+
+    async def fetch_members(self, org_name, team_slugs):
+        # format: {"team_slug": ["member_login"]}, missing teams are left out
+        team_slugs = list(dict.fromkeys(team_slugs))
+        stats = [{"pages": 0, "bytes": 0} for _ in team_slugs]
+        results = await asyncio.gather(
+            *(self.get_team_members(org_name, slug, team_stats)
+              for slug, team_stats in zip(team_slugs, stats)),
+            return_exceptions=True)
+        members = {}
+        for slug, result, team_stats in zip(team_slugs, results, stats):
+            if isinstance(result, UnknownObjectException):
+                logger.info(f"Team not found on GitHub: {slug}")
+            elif isinstance(result, BaseException):
+                raise result
+            else:
+                members[slug] = result
+                metrics.count_call("get_members", team_stats["pages"])
+                metrics.record_team(f"{org_name}/{slug}",
+                                    team_stats["pages"], team_stats["bytes"])
+        return members
+
+
+# Synchronous, PyGithub-shaped face of AsyncGitHubClient, so TeamMerger and
+# FetchAdditionalTeams take it in place of Github. The client runs on an
+# event loop of its own thread; calls from any thread share its pool.
+# fetch() also makes it a SyncMain membership_fetcher, which prefetches
+# every team's members concurrently.
+class AsyncGitHubBackend:
+    def __init__(self, github_token, base_url=API_URL, per_page=MAX_PER_PAGE,
+                 concurrency=16):
+        self.client = AsyncGitHubClient(github_token, base_url, per_page,
+                                        concurrency)
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(target=self.loop.run_forever,
+                                       daemon=True)
+        self.thread.start()
+
+    @property
+    def per_page(self):
+        return self.client.per_page
+
+    @property
+    def rate_limiting(self):
+        return self.client.rate_limiting
+
+    @property
+    def rate_limiting_resettime(self):
+        return self.client.rate_limiting_resettime
+
+    @property
+    def requests_made(self):
+        return self.client.requests_made
+
+    def run(self, coroutine):
+        return asyncio.run_coroutine_threadsafe(coroutine, self.loop).result()
+
+    def get_organization(self, org_name):
+        return RestOrganization(self, org_name)
+
+    def get_json(self, path, params=None):
+        return self.run(self.client.get_json(path, params))
+
+    def get_pages(self, path, stats=None):
+        return self.run(self.client.get_pages(path, stats))
+
+    def fetch(self, org_name, team_slugs):
+        members = self.run(self.client.fetch_members(org_name, team_slugs))
+        logger.info(f"Fetched members of {len(members)} teams with "
+                    f"{self.client.requests_made} requests")
+        return members
+
+    def close(self):
+        self.run(self.client.close())
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join()
+        self.loop.close()
+
+
+def page_number(url):
+    if url is None:
+        return None
+    pages = parse_qs(urlparse(url).query).get('page')
+    return int(pages[0]) if pages else None
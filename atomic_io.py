@@ -0,0 +1,35 @@
+import os
+import shutil
+import tempfile
+
+
+def write_atomic(path, content):
+    # written next to the target and renamed over it, so a crash leaves
+    # either the old file or the new one, never a truncated one
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp_path = tempfile.mkstemp(
+        dir=directory, prefix=f'.{os.path.basename(path)}.', suffix='.tmp')
+    try:
+        if isinstance(content, bytes):
+            file = os.fdopen(fd, 'wb')
+        else:
+            file = os.fdopen(fd, 'w', newline='')
+        with file:
+            file.write(content)
+            file.flush()
+            os.fsync(file.fileno())
+        if os.path.exists(path):
+            shutil.copymode(path, tmp_path)
+        else:
+            os.chmod(tmp_path, 0o666 & ~_umask())
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.unlink(tmp_path)
+        raise
+
+
+def _umask():
+    mask = os.umask(0)
+    os.umask(mask)
+    return mask
@@ -1,43 +1,404 @@
-import json
+import io
 import logging
-import re
-import sys
+import math
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 from pathlib import Path
 
-from github import GithubException
 from ruamel.yaml import YAML, scalarstring
 
+from atomic_io import write_atomic
+from diff_report import DryRunReport
+from instrumentation import metrics, timed
+from repo_groups import group_by_repo, merge_developer_sets
+from sync_state import SyncState, hash_file, hash_json
+from slug_resolver import default_resolver
+from team_snapshot import ALL_TEAMS_FILE, TeamSnapshot
 from yaml_definitions import AdditionalTeamDefinition, DeveloperInfo, \
-    RepoYamlDefinition, SpecialYamlDefinition
+    DeveloperList, RepoYamlDefinition, SpecialYamlDefinition, normalize_login
 
-logging.basicConfig(level=logging.DEBUG, format='%(message)s',
-                    stream=sys.stdout)
+# PyGithub is imported where GitHub is first talked to, so that loading
+# YAML alone (reconcile.py, --help) starts fast. ruamel stays a top-level
+# import: every user of this module parses YAML, and it loads in ~20 ms.
 
 logger = logging.getLogger(__name__)
 
 
 class SyncMain:
-    def __init__(self, github_client):
+    def __init__(self, github_client, snapshot=None, aliases=None,
+                 membership_fetcher=None, state=None, team_index=None,
+                 dry_run=False):
         self.github_client = github_client
-
-    def run(self, args):
+        self.snapshot = snapshot
+        self.aliases = aliases
+        self.membership_fetcher = membership_fetcher
+        # incremental mode when set, see sync_state.SyncState
+        self.state = state
+        # kept up to date from the parse pass, see team_index.TeamFileIndex
+        self.team_index = team_index
+        # format: {"file_path": ["team_slug"]}, collected for team_index
+        self.team_refs = {}
+        # format: {"file_path": {"parse": seconds, "dump": seconds}}
+        self.timings = {}
+        # format: {"file_path": "written" | "unchanged" | "skipped" | ...}
+        self.file_status = {}
+        self.file_counts = Counter()
+        # developers the files of one repo disagree on, see repo_groups
+        self.conflicts = []
+        # what the run would change, collected instead of writing files
+        self.report = DryRunReport() if dry_run else None
+
+    def run(self, args, workers=1, full=False, processes=1):
         if len(args) == 0:
             raise ValueError("No file path provided.")
 
+        # loaded once per run and shared by every file
+        if self.snapshot is None:
+            self.snapshot = TeamSnapshot.load()
+        metrics.record_rate_limit(self.github_client)
+
+        if self.report is not None:
+            self.run_dry(args, workers)
+        elif processes > 1:
+            self.run_in_processes(args, workers, full, processes)
+        else:
+            # every file is loaded first: files sharing a repo are only
+            # known once all of them are
+            self.run_prefetched(args, workers, full)
+        self.finish_run()
+
+    def run_prefetched(self, args, workers, full):
+        teams = []
+        documents = []
+        for yaml_file_path in args:
+            logger.info(f"Loading team for: {yaml_file_path}")
+            team, document = self.load_file(yaml_file_path)
+            teams.append(team)
+            documents.append(document)
+
+        merger = self.create_merger(workers)
+        merger.membership = self.prefetch_membership(merger, teams, workers)
+        self.sync_and_write(merger, YamlWriter(), args, teams, documents,
+                            full)
+
+    def sync_and_write(self, merger, writer, args, teams, documents, full):
+        # unchanged files are left out before the merge; the files of one
+        # repo are merged together, so they are left out only if none of
+        # them changed
+        selected = []
+        fingerprints = {}
+        for group in group_by_repo(teams):
+            paths = [args[i] for i in group]
+            group_fingerprints = [self.fingerprint(merger, teams[i], args[i])
+                                  for i in group]
+            if len(group) > 1:
+                for fingerprint in group_fingerprints:
+                    if fingerprint is not None:
+                        # a file joining or leaving rewrites the group
+                        fingerprint["group"] = hash_json(paths)
+            if not full and self.state is not None and all(
+                    self.state.is_unchanged(yaml_file_path, fingerprint)
+                    for yaml_file_path, fingerprint in zip(
+                        paths, group_fingerprints)):
+                for yaml_file_path, fingerprint in zip(paths,
+                                                       group_fingerprints):
+                    self.is_unchanged(yaml_file_path, fingerprint)
+                continue
+            selected.extend(group)
+            fingerprints.update(zip(paths, group_fingerprints))
+
+        # written in input order so the output matches a serial run
+        selected.sort()
+        args = [args[i] for i in selected]
+        teams = [teams[i] for i in selected]
+        documents = [documents[i] for i in selected]
+        self.sync_teams(merger, args, teams)
+        for yaml_file_path, team, document in zip(args, teams, documents):
+            logger.info(f"Writing team for: {yaml_file_path}")
+            self.write_team(writer, team, yaml_file_path, document)
+            self.record(yaml_file_path, fingerprints[yaml_file_path])
+
+    def sync_teams(self, merger, args, teams):
+        # permission files of the same org/repo share one team: the union of
+        # their developers is synced once and replaces each file's team in
+        # teams, so every file of the group is written from the same result
+        for group in group_by_repo(teams):
+            if len(group) > 1:
+                leader = teams[group[0]]
+                leader.developers, conflicts = merge_developer_sets(
+                    [args[i] for i in group], [teams[i] for i in group])
+                self.conflicts.extend(conflicts)
+                for i in group[1:]:
+                    teams[i] = leader
+                logger.info(f"Merged {len(group)} files of "
+                            f"{leader.org_name}/{leader.repo_name}")
+            self.sync_team(merger, teams[group[0]])
+
+    def run_dry(self, args, workers):
+        # the load/merge pipeline in memory only: nothing is dumped, so the
+        # faster safe loader is enough, and no file or state is written
+        teams = []
+        configs = []
         for yaml_file_path in args:
-            logger.info(f"Processing team for: {yaml_file_path}")
-            team = YamlDataLoader.load_team(yaml_file_path)
-            merger = TeamMerger(self.github_client)
-            writer = YamlWriter()
+            team, config = YamlDataLoader.peek_team_with_config(
+                yaml_file_path)
+            teams.append(team)
+            configs.append(config)
+
+        merger = self.create_merger(workers)
+        merger.membership = self.prefetch_membership(merger, teams, workers)
+        developers_before = [[(developer.ldap, developer.github)
+                              for developer in team.developers]
+                             for team in teams]
+        self.sync_teams(merger, args, teams)
+        self.report.conflicts = self.conflicts
+        for yaml_file_path, team, config, developers_before in zip(
+                args, teams, configs, developers_before):
+            entry = self.report.add(yaml_file_path, team, config,
+                                    developers_before)
+            self.set_status(yaml_file_path,
+                            "would_write" if entry["changed"] else "unchanged")
+
+    def run_in_processes(self, args, workers, full, processes):
+        with ProcessPoolExecutor(max_workers=processes) as pool:
+            # each file is parsed once, here, with the faster safe loader;
+            # the units carry the definitions to the workers, and only the
+            # files being written are loaded again, as documents to dump
+            peeked = pool.map(peek_file, args,
+                              chunksize=max(1, len(args) // processes))
+            teams = []
+            for yaml_file_path, (team, references, seconds) in zip(args,
+                                                                   peeked):
+                teams.append(team)
+                self.timings[yaml_file_path] = {"parse": seconds}
+                if self.team_index is not None:
+                    self.team_refs[yaml_file_path] = team_references(
+                        team, self.snapshot, references)
+            # files sharing a repo go to the same worker, as one unit
+            units = [[(args[i], teams[i]) for i in group]
+                     for group in group_by_repo(teams)]
+            merger = self.create_merger(workers)
+            membership = self.prefetch_membership(merger, teams, workers)
+
+            context = {
+                "snapshot": self.snapshot,
+                "aliases": self.aliases,
+                "membership": membership,
+                "state_entries": None if self.state is None
+                else self.state.entries,
+                "full": full,
+                "permissions_path": YamlDataLoader.PERMISSIONS_PATH,
+                "teams_path": YamlDataLoader.TEAMS_PATH,
+            }
+            shard_size = -(-len(args) // processes)
+            shards = [[]]
+            for unit in units:
+                if sum(map(len, shards[-1])) >= shard_size:
+                    shards.append([])
+                shards[-1].append(unit)
+            results = list(pool.map(transform_files, shards,
+                                    [context] * len(shards)))
+
+        failed = []
+        for report, state_entries, worker_metrics, conflicts in results:
+            metrics.merge(worker_metrics)
+            self.conflicts.extend(conflicts)
+            for entry in report:
+                yaml_file_path = entry["file"]
+                self.set_status(yaml_file_path, entry["status"])
+                self.timings[yaml_file_path].update(entry["timings"])
+                if entry["status"] == "failed":
+                    failed.append(yaml_file_path)
+                    logger.error(f"Failed to sync {yaml_file_path}: "
+                                 f"{entry['error']}")
+            if self.state is not None:
+                self.state.entries.update(state_entries)
+        if failed:
+            raise RuntimeError(f"Failed to sync {len(failed)} files: "
+                               f"{', '.join(failed)}")
+
+    def create_merger(self, workers=1):
+        from rate_limit import RateLimitGate
+        gate = RateLimitGate(self.github_client) if workers > 1 else None
+        return TeamMerger(self.github_client, self.snapshot, gate,
+                          self.aliases)
+
+    def process_group(self, merger, writer, yaml_file_paths, teams,
+                      full=False):
+        # teams parsed by the caller; without a document the writer loads
+        # the file, so unchanged files are not loaded here at all
+        self.sync_and_write(merger, writer, yaml_file_paths, teams,
+                            [None] * len(teams), full)
+
+    def fingerprint(self, merger, team, yaml_file_path):
+        if self.state is None:
+            return None
+        if isinstance(team, RepoYamlDefinition):
+            roles = self.snapshot.get_repo_roles(team.repo_name)
+        else:
+            roles = self.snapshot.get_slug(team.team_name)
+        members = {f"{org_name}/{team_slug}": sorted(
+            merger.fetch_member_logins(org_name, team_slug) or [])
+            for org_name, team_slug in merger.required_team_slugs(team)}
+        return {"yaml": hash_file(yaml_file_path), "roles": hash_json(roles),
+                "members": hash_json(members)}
+
+    def is_unchanged(self, yaml_file_path, fingerprint):
+        if self.state is None or \
+                not self.state.is_unchanged(yaml_file_path, fingerprint):
+            return False
+        logger.info(f"Unchanged since last sync, skipping: {yaml_file_path}")
+        self.set_status(yaml_file_path, "skipped")
+        return True
+
+    def record(self, yaml_file_path, fingerprint):
+        if self.state is not None:
+            # the hash of the file as written, so the next run can skip it
+            fingerprint["yaml"] = hash_file(yaml_file_path)
+            self.state.record(yaml_file_path, fingerprint)
+
+    def set_status(self, yaml_file_path, status):
+        self.file_status[yaml_file_path] = status
+        self.file_counts[status] += 1
+
+    def finish_run(self):
+        metrics.record_rate_limit(self.github_client)
+        logger.info("Sync metrics:\n" + metrics.summary_table())
+        if self.conflicts:
+            logger.warning(f"{len(self.conflicts)} conflicts between files "
+                           f"of the same repo, the first file was kept")
+        if self.report is not None:
+            logger.info("Dry run, no files written:\n" +
+                        self.report.summary_table())
+            return
+        logger.info(f"Files written: {self.file_counts['written']}, "
+                    f"unchanged: {self.file_counts['unchanged']}, "
+                    f"skipped: {self.file_counts['skipped']}")
+        if self.state is not None:
+            self.state.save()
+        if self.team_index is not None:
+            for yaml_file_path, slugs in self.team_refs.items():
+                self.team_index.update(yaml_file_path, slugs)
+            self.team_index.save()
+
+    def prefetch_membership(self, merger, teams, workers=1):
+        slugs_by_org = {}
+        for team in teams:
+            for org_name, team_slug in merger.required_team_slugs(team):
+                slugs_by_org.setdefault(org_name, []).append(team_slug)
+
+        if self.membership_fetcher is None:
+            # one REST call chain per team, spread over the thread pool
+            keys = list(dict.fromkeys(
+                (org_name, team_slug)
+                for org_name, team_slugs in slugs_by_org.items()
+                for team_slug in team_slugs))
+            with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+                # list() re-raises the first worker exception, if any
+                list(pool.map(lambda key: merger.fetch_member_logins(*key),
+                              keys))
+            return dict(merger.fetched_members)
+
+        membership = {}
+        for org_name, team_slugs in slugs_by_org.items():
+            members = self.membership_fetcher.fetch(org_name, team_slugs)
+            for team_slug, logins in members.items():
+                membership[(org_name, team_slug)] = logins
+        return membership
 
-            if isinstance(team, RepoYamlDefinition):
-                if team.repo_name:
-                    merger.sync_repository_team(team)
-                writer.write_repo_team_to_yaml(team, yaml_file_path)
-            elif isinstance(team, SpecialYamlDefinition):
-                if team.team_name:
-                    merger.sync_special_team(team)
-                writer.write_special_team_to_yaml(team, yaml_file_path)
+    @staticmethod
+    def sync_team(merger, team):
+        if isinstance(team, RepoYamlDefinition):
+            if team.repo_name:
+                merger.sync_repository_team(team)
+        elif isinstance(team, SpecialYamlDefinition):
+            if team.team_name:
+                merger.sync_special_team(team)
+
+    def load_file(self, yaml_file_path):
+        start = time.perf_counter()
+        team, document = YamlDataLoader.load_team_with_document(
+            yaml_file_path)
+        self.timings[yaml_file_path] = {
+            "parse": time.perf_counter() - start}
+        if self.team_index is not None:
+            self.team_refs[yaml_file_path] = team_references(
+                team, self.snapshot, document)
+        return team, document
+
+    def write_team(self, writer, team, yaml_file_path, document=None):
+        start = time.perf_counter()
+        written = None
+        if isinstance(team, RepoYamlDefinition):
+            written = writer.write_repo_team_to_yaml(team, yaml_file_path,
+                                                     document)
+        elif isinstance(team, SpecialYamlDefinition):
+            written = writer.write_special_team_to_yaml(team, yaml_file_path,
+                                                        document)
+        if written is not None:
+            self.set_status(yaml_file_path,
+                            "written" if written else "unchanged")
+        self.timings.setdefault(yaml_file_path, {})["dump"] = \
+            time.perf_counter() - start
+
+
+def transform_files(units, context):
+    # runs in a worker process: load, merge from the prefetched membership
+    # and write each unit of files sharing a repo, reporting a status per
+    # file instead of raising
+    metrics.reset()
+    YamlDataLoader.PERMISSIONS_PATH = context["permissions_path"]
+    YamlDataLoader.TEAMS_PATH = context["teams_path"]
+    state = None
+    if context["state_entries"] is not None:
+        state = SyncState(None, dict(context["state_entries"]))
+    sync_main = SyncMain(None, context["snapshot"], context["aliases"],
+                         state=state)
+    merger = TeamMerger(None, context["snapshot"], aliases=context["aliases"],
+                        membership=context["membership"])
+    writer = YamlWriter()
+
+    report = []
+    for unit in units:
+        paths = [yaml_file_path for yaml_file_path, _ in unit]
+        error = None
+        try:
+            sync_main.process_group(merger, writer, paths,
+                                    [team for _, team in unit],
+                                    context["full"])
+        except Exception as e:
+            # a group fails as a whole, none of its files is half synced
+            error = repr(e)
+        for yaml_file_path in paths:
+            entry = {"file": yaml_file_path}
+            if error is None:
+                entry["status"] = sync_main.file_status.get(yaml_file_path,
+                                                            "processed")
+            else:
+                entry["status"] = "failed"
+                entry["error"] = error
+            entry["timings"] = sync_main.timings.get(yaml_file_path, {})
+            report.append(entry)
+
+    state_entries = None
+    if state is not None:
+        state_entries = {entry["file"]: state.entries[entry["file"]]
+                         for entry in report
+                         if entry["file"] in state.entries}
+    return report, state_entries, metrics.to_dict(), sync_main.conflicts
+
+
+def peek_file(yaml_file_path):
+    # run_in_processes reads every file through this in its pool; of the
+    # config only what team_references reads goes back to the parent
+    start = time.perf_counter()
+    team, config = YamlDataLoader.peek_team_with_config(yaml_file_path)
+    references = {'additional_github_teams':
+                  config.get('additional_github_teams')} \
+        if isinstance(config, dict) else None
+    return team, references, time.perf_counter() - start
 
 
 class YamlDataLoader:
@@ -50,9 +411,39 @@ class YamlDataLoader:
 
     @staticmethod
     def load_team(file_path):
+        return YamlDataLoader.load_team_with_document(file_path)[0]
+
+    @staticmethod
+    @timed("load_team")
+    def load_team_with_document(file_path):
+        # the round-trip document is returned too, so YamlWriter can update
+        # and dump it without parsing the file a second time
         resolved_path = YamlDataLoader.resolve_file_path(file_path)
         team_config = YamlDataLoader.load_yaml_configuration(resolved_path)
+        return YamlDataLoader.parse_team_definition(file_path, team_config), \
+            team_config
 
+    @staticmethod
+    def peek_team(file_path):
+        # a quick read of the team definition only, without the document
+        return YamlDataLoader.peek_team_with_config(file_path)[0]
+
+    @staticmethod
+    def peek_team_with_config(file_path):
+        # plain dicts and lists from the safe loader, which cannot be
+        # dumped back with their quotes and comments
+        resolved_path = YamlDataLoader.resolve_file_path(file_path)
+        try:
+            with open(resolved_path, 'r') as file:
+                team_config = YAML(typ='safe').load(file)
+        except Exception as e:
+            raise RuntimeError(
+                f"Failed to load YAML configuration: {resolved_path}") from e
+        return YamlDataLoader.parse_team_definition(file_path, team_config), \
+            team_config
+
+    @staticmethod
+    def parse_team_definition(file_path, team_config):
         if file_path.startswith("submodules/RPU/permissions/"):
             return YamlDataLoader.parse_repo_team_definition(team_config)
         elif file_path.startswith("submodules/RPU/teams/"):
@@ -78,7 +469,7 @@ class YamlDataLoader:
 
     @staticmethod
     def load_yaml_configuration(path):
-        yaml = YAML(typ='safe')
+        yaml = create_round_trip_yaml()
         try:
             with open(path, 'r') as file:
                 return yaml.load(file)
@@ -119,15 +510,22 @@ class YamlDataLoader:
 
     @staticmethod
     def extract_developers(team_config):
-        developers = []
+        developers = DeveloperList()
         if "developers" in team_config and isinstance(team_config["developers"],
                                                       list):
 
             for dev in team_config["developers"]:
                 if isinstance(dev, str) and dev.strip():
-                    developers.append(DeveloperInfo(dev, None))
-                    logger.info(f"Adding new Yaml developer to list: {dev}")
-                elif not dev.strip():
+                    # plain str, not the round-trip quoted scalar type
+                    developers.append(DeveloperInfo(str(dev), None))
+                    logger.debug(f"Adding new Yaml developer to list: {dev}")
+                elif isinstance(dev, dict) and (dev.get("ldap") or
+                                                dev.get("github")):
+                    # already back-filled by an earlier run
+                    developers.append(DeveloperInfo(
+                        str(dev["ldap"]) if dev.get("ldap") else None,
+                        str(dev["github"]) if dev.get("github") else None))
+                elif isinstance(dev, str) and not dev.strip():
                     continue
                 else:
                     logger.error(f"Invalid developer entry: {dev}")
@@ -135,83 +533,197 @@ class YamlDataLoader:
         return developers
 
 
-def merge_github_developers(team, developers):
+def merge_github_developers(team, developers, aliases=None):
     if team:
-        members = team.get_members()
-        for member in members:
-            github_username = member.login
-            found = False
-            for developer in developers:
-                if developer.ldap == github_username:
-                    logger.info(
-                        f"Merging GitHub username for: {github_username}")
-                    developer.github = github_username
-                    found = True
-                    break
-
-            if not found:
-                developers.append(DeveloperInfo(None, github_username))
-                logger.info(
-                    f"Adding new GitHub developer to list: {github_username}")
-
+        merge_github_logins(member_logins(team), developers, aliases)
     else:
         if developers:
             logger.error(f"Team not found: {team}")
 
 
+def member_logins(team, stats=None):
+    # REST teams stream their member pages and count them in stats;
+    # PyGithub's PaginatedList is lazy as well, but reports nothing
+    from github_cache import RestTeam
+    if isinstance(team, RestTeam):
+        members = team.iter_members(stats)
+    else:
+        members = team.get_members()
+    for member in members:
+        yield member.login
+
+
+def index_developers(developers, aliases=None):
+    # format of aliases: {"ldap_name": "github_login"}
+    aliases = {normalize_login(ldap): normalize_login(github)
+               for ldap, github in (aliases or {}).items()}
+    index = {}
+    for developer in developers:
+        keys = []
+        if developer.github:
+            keys.append(normalize_login(developer.github))
+        if developer.ldap:
+            ldap = normalize_login(developer.ldap)
+            keys.append(ldap)
+            if ldap in aliases:
+                keys.append(aliases[ldap])
+        for key in keys:
+            # the first YAML entry wins, as with the previous linear scan
+            index.setdefault(key, developer)
+    return index
+
+
+@timed("merge_github_developers")
+def merge_github_logins(logins, developers, aliases=None):
+    if isinstance(developers, DeveloperList) and not aliases:
+        index = developers.index()
+    else:
+        index = index_developers(developers, aliases)
+    for github_username in logins:
+        key = normalize_login(github_username)
+        developer = index.get(key)
+        if developer is not None:
+            logger.debug(f"Merging GitHub username for: {github_username}")
+            developer.github = github_username
+            if isinstance(developers, DeveloperList):
+                developers.add_logins(developer)
+        else:
+            developer = DeveloperInfo(None, github_username)
+            developers.append(developer)
+            index[key] = developer
+            logger.debug(
+                f"Adding new GitHub developer to list: {github_username}")
+
+
 class TeamMerger:
-    def __init__(self, github_client):
+    def __init__(self, github_client, snapshot=None, rate_limit_gate=None,
+                 aliases=None, membership=None):
         self.github_client = github_client
-
+        self.aliases = aliases
+        # format: {("org_name", "team_slug"): ["member_login"]}, prefetched
+        self.membership = membership
+        # same format, filled as teams are fetched one by one
+        self.fetched_members = {}
+        self.snapshot = snapshot if snapshot is not None \
+            else TeamSnapshot.load()
+        self.rate_limit_gate = rate_limit_gate
+        self.organizations = {}
+        self.organizations_lock = threading.Lock()
+
+    def call_github(self, fn, *args):
+        if self.rate_limit_gate is None:
+            return fn(*args)
+        return self.rate_limit_gate.call(fn, *args)
+
+    def get_organization(self, org_name):
+        with self.organizations_lock:
+            if org_name not in self.organizations:
+                metrics.count_call("get_organization")
+                self.organizations[org_name] = self.call_github(
+                    self.github_client.get_organization, org_name)
+            return self.organizations[org_name]
+
+    def fetch_member_logins(self, org_name, team_slug):
+        key = (org_name, team_slug)
+        if self.membership is not None:
+            return self.membership.get(key)
+
+        if key not in self.fetched_members:
+            org = self.get_organization(org_name)
+            metrics.count_call("get_team_by_slug")
+            team = self.call_github(org.get_team_by_slug, team_slug)
+            if not team:
+                return None
+            stats = {}
+
+            def read_members():
+                # streamed page by page but collected in full before
+                # merging, so a rate-limit retry never sees a half-merged
+                # developer list
+                stats.update(pages=0, bytes=0, reused=False)
+                return list(member_logins(team, stats))
+
+            logins = self.call_github(read_members)
+            if not stats["pages"] and not stats["reused"]:
+                # PyGithub does not report its pages, they are estimated
+                per_page = getattr(self.github_client, 'per_page', None)
+                if not isinstance(per_page, int) or per_page <= 0:
+                    per_page = 30
+                stats["pages"] = max(1, math.ceil(len(logins) / per_page))
+            metrics.count_call("get_members", stats["pages"])
+            metrics.record_team(f"{org_name}/{team_slug}", stats["pages"],
+                                stats["bytes"], stats["reused"])
+            self.fetched_members[key] = logins
+        return self.fetched_members[key]
+
+    def merge_team_members(self, org_name, team_slug, developers):
+        logins = self.fetch_member_logins(org_name, team_slug)
+        if logins is None:
+            merge_github_developers(None, developers, self.aliases)
+        else:
+            merge_github_logins(logins, developers, self.aliases)
+
+    def required_team_slugs(self, team):
+        # the (org_name, team_slug) pairs whose members a sync will read
+        if isinstance(team, RepoYamlDefinition) and team.repo_name:
+            repo_team_name = team.repo_name + " Developers"
+            for team_info in self.snapshot.get_repo_roles(team.repo_name):
+                if team_info['team'] == repo_team_name:
+                    return [(team.org_name,
+                             to_slug(repo_team_name, self.snapshot))]
+        elif isinstance(team, SpecialYamlDefinition) and team.team_name:
+            if self.snapshot.has_team(team.team_name):
+                return [(team.org_name,
+                         to_slug(team.team_name, self.snapshot))]
+        return []
+
+    @timed("sync_repository_team")
     def sync_repository_team(self, repo_team):
+        from github import GithubException
+
         repo_name = repo_team.repo_name
         repo_team_name = repo_name + " Developers"
         org_name = repo_team.org_name
         developers = repo_team.developers
         additional_teams = repo_team.additional_teams
 
-        with open('team_repo_roles.json', 'r') as file:
-            # format: {"repo_name": [{"team": "team_name", "role": "role"}]}
-            team_repo_roles = json.load(file)
-
         try:
-            org = self.github_client.get_organization(org_name)
-            team_slug = to_slug(repo_team_name)
-
-            if repo_name in team_repo_roles:
-                for team_info in team_repo_roles[repo_name]:
-                    team_name = team_info['team']
-                    role = team_info['role']
-                    if team_name == repo_team_name:
-                        matching_team = org.get_team_by_slug(team_slug)
-                        merge_github_developers(matching_team, developers)
-                        repo_team.team_name = repo_team_name
-                        logger.info(f"Merging repo team: {repo_team.team_name}")
-                    else:
-                        logger.info(
-                            f"Additional team: {team_name}, role: {role}")
-                        additional_teams.add(
-                            AdditionalTeamDefinition(team_name, role))
+            team_slug = to_slug(repo_team_name, self.snapshot)
+
+            for team_info in self.snapshot.get_repo_roles(repo_name):
+                team_name = team_info['team']
+                role = team_info['role']
+                if team_name == repo_team_name:
+                    self.merge_team_members(org_name, team_slug, developers)
+                    repo_team.team_name = repo_team_name
+                    logger.info(f"Merging repo team: {repo_team.team_name}")
+                else:
+                    logger.info(
+                        f"Additional team: {team_name}, role: {role}")
+                    additional_teams.add(
+                        AdditionalTeamDefinition(team_name, role))
 
         except GithubException as e:
             logger.error(f"Failed to access GitHub API: {e}")
             raise
 
+    @timed("sync_special_team")
     def sync_special_team(self, special_team):
+        from github import GithubException
+
         logger.info(f"Merging special team: {special_team.team_name}")
         team_name = special_team.team_name
         org_name = special_team.org_name
         developers = special_team.developers
 
-        with open('all_teams.json', 'r') as file:
-            all_teams = json.load(file)
-
         try:
-            org = self.github_client.get_organization(org_name)
-
-            if team_name in all_teams:
-                team = org.get_team_by_slug(to_slug(team_name))
-                merge_github_developers(team, developers)
+            if self.snapshot.has_team(team_name):
+                self.merge_team_members(
+                    org_name, to_slug(team_name, self.snapshot), developers)
+            else:
+                logger.info(f"Special team not found on GitHub: {team_name}, "
+                            f"candidates: "
+                            f"{self.snapshot.slugs.candidates(team_name)}")
 
         except GithubException as e:
             logger.error(f"Failed to access GitHub API: {e}")
@@ -236,19 +748,28 @@ def update_developer_entries(team, data):
         data['developers'] = developer_details
 
 
+def create_round_trip_yaml():
+    # shared by loading and writing so a parsed document dumps back with
+    # its quotes, comments and anchors
+    yaml = YAML()
+    yaml.preserve_quotes = True
+    yaml.indent(mapping=4, sequence=4, offset=2)
+    yaml.default_flow_style = False
+    yaml.explicit_start = True
+    return yaml
+
+
 class YamlWriter:
     def __init__(self):
-        self.yaml = YAML()
-        self.yaml.preserve_quotes = True
-        self.yaml.indent(mapping=4, sequence=4, offset=2)
-        self.yaml.default_flow_style = False
-
-    def write_repo_team_to_yaml(self, repo_team, file_path):
-        yaml = self.yaml
-        yaml.explicit_start = True
+        self.yaml = create_round_trip_yaml()
 
+    def load_document(self, file_path):
         with open(file_path, 'r') as f:
-            data = yaml.load(f)
+            return self.yaml.load(f)
+
+    def write_repo_team_to_yaml(self, repo_team, file_path, data=None):
+        if data is None:
+            data = self.load_document(file_path)
 
         # update developer usernames
         update_developer_entries(repo_team, data)
@@ -262,7 +783,9 @@ class YamlWriter:
         # add additional teams
         additional_teams_details = []
         if repo_team.additional_teams:
-            for team in repo_team.additional_teams:
+            # sorted so the output does not depend on set iteration order
+            for team in sorted(repo_team.additional_teams,
+                               key=lambda t: (t.team_name, t.role or "")):
                 team_map = {
                     "team": scalarstring.DoubleQuotedScalarString(
                         team.team_name),
@@ -272,33 +795,54 @@ class YamlWriter:
             data['additional_github_teams'] = additional_teams_details
 
         # write to yaml
-        with open(file_path, 'w') as f:
-            yaml.dump(data, f)
-        logger.info("written finished.")
+        return self.dump(data, file_path)
 
-    def write_special_team_to_yaml(self, special_team, file_path):
-        yaml = self.yaml
-        yaml.explicit_start = True
-
-        with open(file_path, 'r') as f:
-            data = yaml.load(f)
+    def write_special_team_to_yaml(self, special_team, file_path, data=None):
+        if data is None:
+            data = self.load_document(file_path)
 
         update_developer_entries(special_team, data)
 
-        with open(file_path, 'w') as f:
-            yaml.dump(data, f)
-
+        return self.dump(data, file_path)
 
-def to_slug(name):
-    with open('all_teams.json', 'r') as file:
-        all_teams = json.load(file)
+    @timed("yaml_writer")
+    def dump(self, data, file_path):
+        stream = io.StringIO()
+        self.yaml.dump(data, stream)
+        content = stream.getvalue()
 
-    if name in all_teams:
-        return all_teams[name]
-    else:
-        slug = name.lower()
-        slug = re.sub(r'\s+', '-', slug)
-        slug = re.sub(r'[^\w-]', '', slug)
-        slug = re.sub(r'-+', '-', slug)
-        slug = slug.strip('-')
-        return slug
+        try:
+            with open(file_path, 'r') as f:
+                current = f.read()
+        except FileNotFoundError:
+            current = None
+        if content == current:
+            logger.info(f"Unchanged, not written: {file_path}")
+            return False
+
+        write_atomic(file_path, content)
+        logger.info("written finished.")
+        return True
+
+
+def team_references(team, snapshot, document=None):
+    # every team slug a file depends on: its own repository or special team
+    # and the additional teams, from the roles snapshot and the file itself
+    names = []
+    if isinstance(team, RepoYamlDefinition) and team.repo_name:
+        names.append(team.repo_name + " Developers")
+        names.extend(team_info['team'] for team_info in
+                     snapshot.get_repo_roles(team.repo_name))
+        if document:
+            names.extend(entry['team'] for entry in
+                         document.get('additional_github_teams') or []
+                         if isinstance(entry, dict) and entry.get('team'))
+    elif isinstance(team, SpecialYamlDefinition) and team.team_name:
+        names.append(team.team_name)
+    return sorted({to_slug(str(name), snapshot) for name in names})
+
+
+def to_slug(name, snapshot=None):
+    if snapshot is None:
+        return default_resolver(ALL_TEAMS_FILE).to_slug(name)
+    return snapshot.slugs.to_slug(name)
@@ -0,0 +1,74 @@
+import argparse
+import gc
+import json
+import logging
+import os
+import tempfile
+import time
+import tracemalloc
+
+from backfill_to_yaml import SyncMain, TeamMerger, YamlDataLoader
+from benchmarks.corpus import generate_corpus, use_corpus
+from fake_github import FakeGitHub
+
+
+def measure(file_count, developers_per_file, merge):
+    # memory retained by the team definitions of a whole corpus, loaded at
+    # once as whole-org analysis does; the parsed documents are dropped
+    logging.disable(logging.INFO)
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory() as root:
+        snapshot, members, files = generate_corpus(
+            root, file_count, developers_per_file=developers_per_file)
+        use_corpus(root)
+        try:
+            merger = TeamMerger(FakeGitHub(members), snapshot)
+            gc.collect()
+            tracemalloc.start()
+            start = time.perf_counter()
+            teams = [YamlDataLoader.load_team(path) for path in files]
+            if merge:
+                for team in teams:
+                    SyncMain.sync_team(merger, team)
+            seconds = time.perf_counter() - start
+            merger = None
+            gc.collect()
+            retained, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+        finally:
+            os.chdir(cwd)
+
+    developers = sum(len(team.developers) for team in teams)
+    additional_teams = sum(len(getattr(team, 'additional_teams', ()))
+                           for team in teams)
+    return {
+        "files": file_count,
+        "merge": merge,
+        "developers": developers,
+        "additional_teams": additional_teams,
+        "seconds": round(seconds, 3),
+        "retained_bytes": retained,
+        "peak_bytes": peak,
+        "bytes_per_file": round(retained / max(file_count, 1)),
+        "bytes_per_developer": round(retained / max(developers, 1)),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Memory held by the team definitions of a whole RPU "
+                    "corpus loaded at once.")
+    parser.add_argument("--sizes", type=int, nargs='+', default=[2000, 20000])
+    parser.add_argument("--developers", type=int, default=5,
+                        help="YAML developers per permissions file")
+    parser.add_argument("--merge", action="store_true",
+                        help="also merge GitHub members and role teams in")
+    options = parser.parse_args(argv)
+
+    for file_count in options.sizes:
+        print(json.dumps(measure(file_count, options.developers,
+                                 options.merge)))
+
+
+if __name__ == "__main__":
+    main()
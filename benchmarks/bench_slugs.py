@@ -0,0 +1,70 @@
+import argparse
+import json
+import re
+import time
+
+from slug_resolver import SlugResolver, normalize
+from team_snapshot import ALL_TEAMS_FILE
+
+
+def legacy_normalize(name):
+    # the four uncompiled passes to_slug used to run
+    slug = name.lower()
+    slug = re.sub(r'\s+', '-', slug)
+    slug = re.sub(r'[^\w-]', '', slug)
+    slug = re.sub(r'-+', '-', slug)
+    return slug.strip('-')
+
+
+def legacy_to_slug(name, all_teams_path):
+    # to_slug without a snapshot read the team map on every call
+    with open(all_teams_path, 'r') as file:
+        all_teams = json.load(file)
+    return all_teams[name] if name in all_teams else legacy_normalize(name)
+
+
+def rate(fn, names, rounds):
+    start = time.perf_counter()
+    for _ in range(rounds):
+        for name in names:
+            fn(name)
+    seconds = time.perf_counter() - start
+    return round(rounds * len(names) / seconds)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Slug resolution throughput over all names in "
+                    "all_teams.json, in names per second.")
+    parser.add_argument("--all-teams", default=ALL_TEAMS_FILE)
+    parser.add_argument("--rounds", type=int, default=20)
+    options = parser.parse_args(argv)
+
+    with open(options.all_teams, 'r') as file:
+        all_teams = json.load(file)
+    names = list(all_teams)
+    # the same names once more, as the fallback rules see unknown teams
+    unknown = [name + ' (renamed)' for name in names]
+
+    resolver = SlugResolver(all_teams, cache_size=2 * len(names))
+    cold = rate(resolver.to_slug, names + unknown, 1)
+    print(json.dumps({
+        "names": len(names),
+        "legacy_normalize": rate(legacy_normalize, names, options.rounds),
+        "normalize": rate(normalize, names, options.rounds),
+        "legacy_to_slug_file": rate(
+            lambda name: legacy_to_slug(name, options.all_teams),
+            names[:100], 1),
+        "resolver_cold": cold,
+        "resolver_cached": rate(resolver.to_slug, names + unknown,
+                                options.rounds),
+        "reverse": rate(resolver.to_name, list(all_teams.values()),
+                        options.rounds),
+        # shortened names, like those in teams/*.yml
+        "candidates": rate(resolver.candidates,
+                           [name.split()[0] for name in names[:200]], 1),
+    }))
+
+
+if __name__ == "__main__":
+    main()
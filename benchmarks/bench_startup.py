@@ -0,0 +1,64 @@
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+from benchmarks.corpus import generate_corpus
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+CLI = os.path.join(ROOT, 'cli.py')
+
+# format: {"name": [interpreter arguments]}, each run in a fresh process
+COMMANDS = {
+    "interpreter": ['-c', 'pass'],
+    # what every script paid before imports were deferred
+    "eager_imports": ['-c', 'import github_cache, backfill_to_yaml, replay'],
+    "help": [CLI, '--help'],
+    "sync_help": [CLI, 'sync', '--help'],
+    "report": [CLI, '-q', 'report', '--output', 'report'],
+}
+
+
+def cold_start(args, cwd, rounds):
+    env = dict(os.environ, PYTHONPATH=ROOT)
+    seconds = []
+    for _ in range(rounds):
+        start = time.perf_counter()
+        subprocess.run([sys.executable] + args, cwd=cwd, env=env,
+                       check=True, stdout=subprocess.DEVNULL)
+        seconds.append(time.perf_counter() - start)
+    # -X importtime lists every module imported, on stderr
+    imports = subprocess.run([sys.executable, '-X', 'importtime'] + args,
+                             cwd=cwd, env=env, check=True,
+                             stdout=subprocess.DEVNULL,
+                             stderr=subprocess.PIPE, text=True).stderr
+    return {
+        "median_ms": round(1000 * statistics.median(seconds), 1),
+        "min_ms": round(1000 * min(seconds), 1),
+        "imports_pygithub": any(line.split('|')[-1].strip() == 'github'
+                                for line in imports.splitlines()),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Cold-start time of the CLI, in fresh interpreters.")
+    parser.add_argument("--rounds", type=int, default=5)
+    parser.add_argument("--files", type=int, default=200,
+                        help="corpus size the report command runs on")
+    options = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory() as root:
+        generate_corpus(root, options.files)
+        results = {name: cold_start(args, root, options.rounds)
+                   for name, args in COMMANDS.items()}
+    print(json.dumps(results, indent=4))
+    return results
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,42 @@
+import argparse
+import json
+import logging
+import os
+import tempfile
+import time
+
+from backfill_to_yaml import SyncMain
+from benchmarks.corpus import generate_corpus, use_corpus
+from fake_github import FakeGitHub
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Speedup of the process-pool parse/merge/dump stage "
+                    "over process counts.")
+    parser.add_argument("--files", type=int, default=2000)
+    parser.add_argument("--processes", type=int, nargs='+',
+                        default=sorted({1, 2, 4, os.cpu_count() or 1}))
+    options = parser.parse_args(argv)
+    logging.disable(logging.INFO)
+
+    baseline = None
+    cwd = os.getcwd()
+    for processes in options.processes:
+        with tempfile.TemporaryDirectory() as root:
+            snapshot, members, files = generate_corpus(root, options.files)
+            use_corpus(root)
+            sync_main = SyncMain(FakeGitHub(members), snapshot)
+            start = time.perf_counter()
+            sync_main.run(files, workers=8, processes=processes)
+            elapsed = time.perf_counter() - start
+            os.chdir(cwd)
+
+        baseline = baseline or elapsed
+        print(json.dumps({"files": options.files, "processes": processes,
+                          "seconds": round(elapsed, 3),
+                          "speedup": round(baseline / elapsed, 2)}))
+
+
+if __name__ == "__main__":
+    main()
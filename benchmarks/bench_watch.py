@@ -0,0 +1,81 @@
+import argparse
+import json
+import logging
+import os
+import statistics
+import tempfile
+import threading
+import time
+
+from benchmarks.corpus import generate_corpus, use_corpus
+from fake_github import FakeGitHub
+from watch import SyncWatcher
+
+
+def measure(file_count, edits, interval, latency):
+    # seconds from saving an edit to the watcher writing the synced file
+    logging.disable(logging.INFO)
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory() as root:
+        snapshot, members, files = generate_corpus(root, file_count)
+        use_corpus(root)
+        stop = threading.Event()
+        thread = None
+        try:
+            watcher = SyncWatcher(FakeGitHub(members, latency), snapshot,
+                                  interval=interval, refresh_interval=3600)
+            start = time.perf_counter()
+            watcher.start()
+            startup = time.perf_counter() - start
+            thread = threading.Thread(target=watcher.run, args=(stop,))
+            thread.start()
+
+            seconds = []
+            for i in range(edits):
+                path = files[i % len(files)]
+                with open(path, 'r') as file:
+                    content = file.read()
+                ldap = f'edit{i}'
+                start = time.perf_counter()
+                with open(path, 'w') as file:
+                    file.write(content.replace(
+                        'developers:\n', f'developers:\n  - "{ldap}"\n'))
+                while True:
+                    with open(path, 'r') as file:
+                        if f'ldap: "{ldap}"' in file.read():
+                            break
+                    time.sleep(0.001)
+                seconds.append(time.perf_counter() - start)
+        finally:
+            stop.set()
+            if thread is not None:
+                thread.join()
+            os.chdir(cwd)
+
+    return {
+        "files": file_count,
+        "edits": edits,
+        "interval": interval,
+        "startup_seconds": round(startup, 3),
+        "latency_median": round(statistics.median(seconds), 3),
+        "latency_max": round(max(seconds), 3),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Watch mode latency: seconds from a saved YAML edit to "
+                    "the synced file, with warm team members.")
+    parser.add_argument("--files", type=int, default=500)
+    parser.add_argument("--edits", type=int, default=20)
+    parser.add_argument("--interval", type=float, default=0.25)
+    parser.add_argument("--latency", type=float, default=0.0,
+                        help="seconds per fake GitHub request")
+    options = parser.parse_args(argv)
+
+    print(json.dumps(measure(options.files, options.edits, options.interval,
+                             options.latency)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+import json
+import os
+from pathlib import Path
+
+from backfill_to_yaml import YamlDataLoader
+from team_snapshot import TeamSnapshot
+
+PERMISSIONS_DIR = 'submodules/RPU/permissions'
+TEAMS_DIR = 'submodules/RPU/teams'
+
+
+# Synthetic RPU checkout: one permissions file per repo plus a share of
+# teams/ files, with the matching all_teams.json / team_repo_roles.json.
+def generate_corpus(root, file_count, developers_per_file=5,
+                    members_per_team=8, special_team_ratio=0.05):
+    root = Path(root)
+    (root / PERMISSIONS_DIR).mkdir(parents=True, exist_ok=True)
+    (root / TEAMS_DIR).mkdir(parents=True, exist_ok=True)
+
+    all_teams = {'Core': 'core'}
+    team_repo_roles = {}
+    # format: {"team_slug": ["member_login"]}
+    members = {'core': [f'core{i}' for i in range(members_per_team)]}
+    files = []
+
+    special_count = int(file_count * special_team_ratio)
+    for i in range(file_count - special_count):
+        repo = f'plugin{i}'
+        team_name = f'{repo} Developers'
+        slug = f'{repo}-developers'
+        all_teams[team_name] = slug
+        team_repo_roles[repo] = [{'team': team_name, 'role': 'Admin'},
+                                 {'team': 'Core', 'role': 'Write'}]
+        # half of the YAML developers are also on GitHub
+        members[slug] = [f'dev{i}-{j}' for j in range(0, members_per_team)]
+        developers = ''.join(f'  - "dev{i}-{j * 2}"\n'
+                             for j in range(developers_per_file))
+        path = f'{PERMISSIONS_DIR}/{repo}.yml'
+        (root / path).write_text(
+            f'---\nname: "{repo}"\n'
+            f'github: &GH "jenkinsci/{repo}"\n'
+            f'paths:\n  - "org/jenkins-ci/plugins/{repo}"\n'
+            f'issues:\n  - github: *GH\n'
+            f'developers:\n{developers}')
+        files.append(path)
+
+    for i in range(special_count):
+        team_name = f'SIG: special{i}'
+        slug = f'sig-special{i}'
+        all_teams[team_name] = slug
+        members[slug] = [f'sig{i}-{j}' for j in range(members_per_team)]
+        path = f'{TEAMS_DIR}/special{i}.yml'
+        (root / path).write_text(
+            f'name: "{team_name}"\ndevelopers:\n  - "sig{i}-0"\n')
+        files.append(path)
+
+    with open(root / 'all_teams.json', 'w') as file:
+        json.dump(all_teams, file, indent=4)
+    with open(root / 'team_repo_roles.json', 'w') as file:
+        json.dump(team_repo_roles, file, indent=4)
+    return TeamSnapshot(all_teams, team_repo_roles), members, files
+
+
+def use_corpus(root):
+    # the loader resolves files below the RPU checkout of the current
+    # directory, so point both at the synthetic one
+    os.chdir(root)
+    YamlDataLoader.PERMISSIONS_PATH = Path(root, PERMISSIONS_DIR).resolve()
+    YamlDataLoader.TEAMS_PATH = Path(root, TEAMS_DIR).resolve()
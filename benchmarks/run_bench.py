@@ -0,0 +1,116 @@
+import argparse
+import json
+import logging
+import os
+import resource
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from backfill_to_yaml import SyncMain
+from benchmarks.corpus import generate_corpus, use_corpus
+from bulk_membership import GraphQLMembershipFetcher
+from fake_github import FakeGitHub, FakeGraphQLSession
+from instrumentation import metrics
+from team_snapshot import TeamSnapshot
+
+
+def run_size(file_count, options):
+    # runs in a fresh process per size so peak RSS is measured per size
+    logging.disable(logging.INFO)
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory() as root:
+        start = time.perf_counter()
+        _, members, files = generate_corpus(root, file_count)
+        generate_seconds = time.perf_counter() - start
+        use_corpus(root)
+        try:
+            start = time.perf_counter()
+            snapshot = TeamSnapshot.load()
+            snapshot_seconds = time.perf_counter() - start
+
+            github = FakeGitHub(members, latency=options.latency,
+                                per_page=options.page_size)
+            fetcher = None
+            if options.bulk:
+                fetcher = GraphQLMembershipFetcher(
+                    'token', FakeGraphQLSession(members))
+            sync_main = SyncMain(github, snapshot,
+                                 membership_fetcher=fetcher)
+
+            start = time.perf_counter()
+            sync_main.run(files, workers=options.workers,
+                          processes=options.processes)
+            wall_seconds = time.perf_counter() - start
+        finally:
+            os.chdir(cwd)
+
+    api_calls = dict(github.calls)
+    if fetcher is not None:
+        api_calls['graphql'] = fetcher.requests_made
+    return {
+        "files": file_count,
+        "workers": options.workers,
+        "processes": options.processes,
+        "latency": options.latency,
+        "page_size": options.page_size,
+        "bulk": options.bulk,
+        "wall_seconds": round(wall_seconds, 3),
+        "api_calls": api_calls,
+        "api_calls_total": sum(api_calls.values()),
+        "peak_rss_kb": peak_rss_kb(),
+        "stages": {
+            "generate_corpus": round(generate_seconds, 3),
+            "snapshot_load": round(snapshot_seconds, 3),
+            "parse": round(sum(t.get("parse", 0) for t in
+                               sync_main.timings.values()), 3),
+            "dump": round(sum(t.get("dump", 0) for t in
+                              sync_main.timings.values()), 3),
+            **{name: round(histogram["sum"], 3) for name, histogram in
+               metrics.to_dict()["stages"].items()},
+        },
+        "file_counts": dict(sync_main.file_counts),
+    }
+
+
+def peak_rss_kb():
+    # ru_maxrss is in kilobytes on Linux
+    return max(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+               resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss)
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Run the sync pipeline against a synthetic RPU corpus "
+                    "and a fake GitHub org, and report JSON results.")
+    parser.add_argument("--sizes", type=int, nargs='+', default=[2000],
+                        help="corpus sizes in files, e.g. 2000 20000 100000")
+    parser.add_argument("--latency", type=float, default=0.0,
+                        help="seconds added to every fake API call")
+    parser.add_argument("--page-size", type=int, default=30,
+                        help="members per page of the fake API")
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--processes", type=int, default=1)
+    parser.add_argument("--bulk", action="store_true",
+                        help="prefetch members with the GraphQL fetcher")
+    parser.add_argument("--output", help="write the results to this file")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    options = parse_args(argv)
+    results = []
+    for file_count in options.sizes:
+        with ProcessPoolExecutor(max_workers=1) as pool:
+            results.append(pool.submit(run_size, file_count, options)
+                           .result())
+
+    output = json.dumps(results, indent=4)
+    if options.output:
+        with open(options.output, 'w') as file:
+            file.write(output + '\n')
+    print(output)
+
+
+if __name__ == "__main__":
+    main()
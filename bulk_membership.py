@@ -0,0 +1,90 @@
+import logging
+import math
+
+import requests
+
+from instrumentation import metrics
+
+logger = logging.getLogger(__name__)
+
+GRAPHQL_URL = 'https://api.github.com/graphql'
+# PyGithub's default page size for team.get_members()
+REST_PAGE_SIZE = 30
+
+
+class GraphQLMembershipFetcher:
+    def __init__(self, github_token, session=None, url=GRAPHQL_URL,
+                 teams_per_request=20, page_size=100):
+        self.github_token = github_token
+        self.session = session if session is not None else requests.Session()
+        self.url = url
+        self.teams_per_request = teams_per_request
+        self.page_size = page_size
+        self.requests_made = 0
+        self.baseline_requests = 0
+
+    def fetch(self, org_name, team_slugs):
+        # format: {"team_slug": ["member_login"]}, missing teams are left out
+        members = {}
+        # format: {"team_slug": cursor}, None requests the first page
+        pending = {slug: None for slug in dict.fromkeys(team_slugs)}
+        missing = set()
+
+        while pending:
+            batch = list(pending.items())[:self.teams_per_request]
+            result = self.query_teams(org_name, batch)
+            for index, (slug, _) in enumerate(batch):
+                del pending[slug]
+                team = result.get(f't{index}')
+                if team is None:
+                    missing.add(slug)
+                    continue
+                page = team['members']
+                members.setdefault(slug, []).extend(
+                    node['login'] for node in page['nodes'])
+                if page['pageInfo']['hasNextPage']:
+                    pending[slug] = page['pageInfo']['endCursor']
+
+        for slug in missing:
+            logger.info(f"Team not found on GitHub: {slug}")
+
+        # one get_team_by_slug plus the member pages, per team
+        self.baseline_requests += sum(
+            1 + max(1, math.ceil(len(logins) / REST_PAGE_SIZE))
+            for logins in members.values()) + len(missing)
+        logger.info(f"Fetched members of {len(members)} teams with "
+                    f"{self.requests_made} GraphQL requests "
+                    f"(per-team REST baseline: {self.baseline_requests})")
+        return members
+
+    def query_teams(self, org_name, batch):
+        params = ['$org: String!']
+        fields = []
+        variables = {'org': org_name}
+        for index, (slug, cursor) in enumerate(batch):
+            params.append(f'$s{index}: String!')
+            params.append(f'$c{index}: String')
+            variables[f's{index}'] = slug
+            variables[f'c{index}'] = cursor
+            fields.append(
+                f't{index}: team(slug: $s{index}) {{ '
+                f'members(first: {self.page_size}, after: $c{index}) {{ '
+                f'nodes {{ login }} '
+                f'pageInfo {{ hasNextPage endCursor }} }} }}')
+        query = (f'query({", ".join(params)}) {{ '
+                 f'organization(login: $org) {{ {" ".join(fields)} }} }}')
+
+        self.requests_made += 1
+        metrics.count_call('graphql')
+        response = self.session.post(
+            self.url, json={'query': query, 'variables': variables},
+            headers={'Authorization': f'bearer {self.github_token}'})
+        response.raise_for_status()
+        payload = response.json()
+        if payload.get('errors'):
+            raise RuntimeError(f"GraphQL query failed: {payload['errors']}")
+
+        organization = payload['data']['organization']
+        if organization is None:
+            raise RuntimeError(f"Organization not found: {org_name}")
+        return organization
@@ -0,0 +1,79 @@
+import argparse
+import importlib
+import logging
+import sys
+
+# format: {"suite": "module"}, run as: cli.py bench <suite> [options]
+BENCHMARKS = {
+    "pipeline": "benchmarks.run_bench",
+    "transform": "benchmarks.bench_transform",
+    "memory": "benchmarks.bench_memory",
+    "slugs": "benchmarks.bench_slugs",
+    "startup": "benchmarks.bench_startup",
+    "watch": "benchmarks.bench_watch",
+}
+
+# format: {"command": ("module", "help")}; a module is only imported once
+# its command is run, so --help and a mistyped command cost no PyGithub
+COMMANDS = {
+    "sync": ("main", "back-fill the RPU YAML files from GitHub teams"),
+    "fetch-roles": ("fetch_team_and_role",
+                    "save the teams and roles of every jenkinsci repo"),
+    "fetch-teams": ("save_teams_to_json", "save the jenkinsci team names"),
+    "report": ("reconcile", "compare GitHub teams with the RPU YAML"),
+    "roles": ("roles_store",
+              "convert team_repo_roles between JSON and SQLite"),
+    "push": ("push", "push the RPU YAML team state to GitHub"),
+    "watch": ("watch", "keep syncing the RPU YAML as files change"),
+    "bench": (None, "run a benchmark: " + ", ".join(BENCHMARKS)),
+}
+
+# -q / -v step through these from INFO
+LOG_LEVELS = [logging.ERROR, logging.WARNING, logging.INFO, logging.DEBUG]
+
+
+def configure_logging(level=logging.INFO):
+    logging.basicConfig(level=level, format='%(message)s', stream=sys.stdout)
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(
+        prog="cli.py",
+        description="Sync the RPU YAML files with the jenkinsci GitHub "
+                    "teams. Options after the command are its own, see "
+                    "cli.py <command> --help.",
+        epilog="commands:\n" + "\n".join(
+            f"  {name:<14}{help_text}"
+            for name, (_, help_text) in COMMANDS.items()),
+        formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("-q", "--quiet", action="count", default=0,
+                        help="log less: warnings only, -qq errors only")
+    parser.add_argument("-v", "--verbose", action="count", default=0,
+                        help="log debug messages too")
+    parser.add_argument("command", choices=COMMANDS, metavar="command",
+                        help="one of the commands below")
+    parser.add_argument("args", nargs=argparse.REMAINDER,
+                        help=argparse.SUPPRESS)
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    options = parse_args(argv)
+    verbosity = LOG_LEVELS.index(logging.INFO) + options.verbose \
+        - options.quiet
+    configure_logging(LOG_LEVELS[max(0, min(verbosity,
+                                            len(LOG_LEVELS) - 1))])
+
+    module_name = COMMANDS[options.command][0]
+    args = options.args
+    if options.command == "bench":
+        if not args or args[0] not in BENCHMARKS:
+            raise SystemExit(f"cli.py bench: choose a suite from "
+                             f"{', '.join(BENCHMARKS)}")
+        module_name = BENCHMARKS[args[0]]
+        args = args[1:]
+    return importlib.import_module(module_name).main(args)
+
+
+if __name__ == "__main__":
+    main()
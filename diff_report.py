@@ -0,0 +1,115 @@
+import json
+import logging
+
+from atomic_io import write_atomic
+from yaml_definitions import RepoYamlDefinition, normalize_login
+
+logger = logging.getLogger(__name__)
+
+
+# What a sync would change in each RPU file, worked out from the parsed
+# document and the merged team without rendering any YAML.
+class DryRunReport:
+    def __init__(self):
+        # format: [{"file": "yaml_file_path", "changed": bool, ...}]
+        self.files = []
+        # format: [{"repo": "org/repo", "field": ..., "files": [...]}]
+        self.conflicts = []
+
+    def add(self, yaml_file_path, team, config, developers_before):
+        entry = file_diff(yaml_file_path, team, config, developers_before)
+        self.files.append(entry)
+        return entry
+
+    def summary(self):
+        return {
+            "files": len(self.files),
+            "changed": sum(entry["changed"] for entry in self.files),
+            "developers_added": sum(len(entry["developers_added"])
+                                    for entry in self.files),
+            "github_merged": sum(len(entry["github_merged"])
+                                 for entry in self.files),
+            "repository_team": sum(entry["repository_team"] is not None
+                                   for entry in self.files),
+            "additional_teams_added": sum(
+                len(entry["additional_github_teams"]["added"])
+                for entry in self.files),
+            "additional_teams_removed": sum(
+                len(entry["additional_github_teams"]["removed"])
+                for entry in self.files),
+            "conflicts": len(self.conflicts),
+        }
+
+    def summary_table(self):
+        return '\n'.join(f"{name:<28}{count:>8}"
+                         for name, count in self.summary().items())
+
+    def to_dict(self):
+        return {"summary": self.summary(), "files": self.files,
+                "conflicts": self.conflicts}
+
+    def write_json(self, path):
+        write_atomic(path, json.dumps(self.to_dict(), indent=4))
+        logger.info(f"Wrote dry-run report of {len(self.files)} files to "
+                    f"{path}")
+
+
+def file_diff(yaml_file_path, team, config, developers_before):
+    # developers_before: the (ldap, github) pairs parsed from the file, taken
+    # before the merge filled in logins and appended GitHub-only members
+    # matched by login rather than position: a file sharing its repo with
+    # others gets the developers of the whole group
+    developers_after = [(developer.ldap, developer.github)
+                        for developer in team.developers]
+    logins_before = {normalize_login(login) for pair in developers_before
+                     for login in pair if login}
+    known = [not logins_before.isdisjoint(
+        normalize_login(login) for login in pair if login)
+        for pair in developers_after]
+    entry = {
+        "file": yaml_file_path,
+        "developers_added": [github for (_, github), found in
+                             zip(developers_after, known) if not found],
+        "github_merged": [{"ldap": ldap, "github": github} for
+                          (ldap, github), found in
+                          zip(developers_after, known)
+                          if found and (ldap, github) not in
+                          developers_before],
+        "repository_team": None,
+        "additional_github_teams": {"added": [], "removed": []},
+    }
+
+    changed = False
+    if developers_after:
+        # YamlWriter rewrites every entry as an ldap/github mapping
+        entries = [{key: value for key, value in
+                    (("ldap", ldap), ("github", github)) if value}
+                   for ldap, github in developers_after]
+        changed = entries != config.get("developers")
+
+    if isinstance(team, RepoYamlDefinition):
+        before = config.get("repository_team")
+        if team.team_name and team.team_name != before:
+            entry["repository_team"] = {"before": before,
+                                        "after": team.team_name}
+            changed = True
+
+        teams_before = [(item.get("team"), item.get("role")) for item in
+                        config.get("additional_github_teams") or []
+                        if isinstance(item, dict)]
+        if team.additional_teams:
+            # in the order YamlWriter writes them
+            teams_after = [(item.team_name, item.role) for item in sorted(
+                team.additional_teams,
+                key=lambda item: (item.team_name, item.role or ""))]
+            entry["additional_github_teams"] = {
+                "added": [{"team": name, "role": role}
+                          for name, role in teams_after
+                          if (name, role) not in teams_before],
+                "removed": [{"team": name, "role": role}
+                            for name, role in teams_before
+                            if (name, role) not in teams_after]}
+            changed = changed or teams_after != teams_before
+
+    entry["changed"] = changed
+    return entry
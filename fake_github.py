@@ -0,0 +1,325 @@
+import hashlib
+import json
+import math
+import re
+import threading
+import time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlencode, urlparse
+
+from github import UnknownObjectException
+
+
+# In-process stand-in for the parts of PyGithub this tool uses, with
+# injectable latency so concurrent runs can be tested without a network.
+class FakeGitHub:
+    def __init__(self, teams=None, latency=0.0, rate_limit=5000,
+                 reset_time=0, per_page=30):
+        # format: {"team_slug": ["member_login"]}
+        self.teams = teams if teams is not None else {}
+        self.latency = latency
+        self.per_page = per_page
+        self.limit = rate_limit
+        self.remaining = rate_limit
+        self.rate_limiting_resettime = reset_time
+        self.calls = Counter()
+        self.lock = threading.Lock()
+
+    @property
+    def rate_limiting(self):
+        return self.remaining, self.limit
+
+    def request(self, endpoint):
+        with self.lock:
+            self.calls[endpoint] += 1
+            self.remaining -= 1
+        if self.latency:
+            time.sleep(self.latency)
+
+    def get_organization(self, org_name):
+        self.request('get_organization')
+        return FakeOrganization(self, org_name)
+
+
+class FakeOrganization:
+    def __init__(self, github, login):
+        self.github = github
+        self.login = login
+
+    def get_team_by_slug(self, slug):
+        self.github.request('get_team_by_slug')
+        if slug not in self.github.teams:
+            raise UnknownObjectException(404, {"message": "Not Found"}, None)
+        return FakeTeam(self.github, slug)
+
+
+class FakeTeam:
+    def __init__(self, github, slug):
+        self.github = github
+        self.slug = slug
+
+    def get_members(self):
+        logins = self.github.teams[self.slug]
+        # one request per page, as PyGithub's PaginatedList makes them
+        for _ in range(max(1, math.ceil(len(logins) / self.github.per_page))):
+            self.github.request('get_members')
+        return [FakeMember(login) for login in logins]
+
+
+class FakeMember:
+    def __init__(self, login):
+        self.login = login
+
+
+# Local stand-in for the GraphQL endpoint, answering the team member
+# queries built by bulk_membership.GraphQLMembershipFetcher.
+class FakeGraphQLSession:
+    def __init__(self, teams):
+        # format: {"team_slug": ["member_login"]}
+        self.teams = teams
+        self.requests = 0
+
+    def post(self, url, json=None, headers=None):
+        self.requests += 1
+        variables = json['variables']
+        page_size = int(re.search(r'members\(first: (\d+)',
+                                  json['query']).group(1))
+        organization = {}
+        index = 0
+        while f's{index}' in variables:
+            slug = variables[f's{index}']
+            if slug not in self.teams:
+                organization[f't{index}'] = None
+            else:
+                start = int(variables[f'c{index}'] or 0)
+                logins = self.teams[slug][start:start + page_size]
+                end = start + len(logins)
+                organization[f't{index}'] = {'members': {
+                    'nodes': [{'login': login} for login in logins],
+                    'pageInfo': {'hasNextPage': end < len(self.teams[slug]),
+                                 'endCursor': str(end)}}}
+            index += 1
+        return FakeResponse({'data': {'organization': organization}})
+
+
+class FakeResponse:
+    def __init__(self, payload, status_code=200, headers=None):
+        self.payload = payload
+        self.status_code = status_code
+        self.headers = headers if headers is not None else {}
+
+    def json(self):
+        return self.payload
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise RuntimeError(f"HTTP {self.status_code}")
+
+
+# Local stand-in for the REST endpoints used by github_cache's client.
+# Lists are paginated with Link headers and every answer carries an ETag,
+# so conditional requests get a 304 when nothing changed.
+class FakeRestSession:
+    def __init__(self, routes, base_url='https://api.github.com'):
+        # format: {"/orgs/org/teams/slug": {...} or [...]}
+        self.routes = routes
+        self.base_url = base_url
+        self.requests = []
+
+    def get(self, url, headers=None):
+        self.requests.append(url)
+        status_code, body, response_headers = render_route(
+            self.routes, self.base_url, url, headers or {})
+        return FakeResponse(body, status_code, response_headers)
+
+
+def render_route(routes, base_url, url, headers):
+    # returns (status_code, body, headers) the way the GitHub REST API would
+    parsed = urlparse(url)
+    params = parse_qs(parsed.query)
+    path = parsed.path
+    if path not in routes:
+        return 404, {"message": "Not Found"}, {}
+
+    body = routes[path]
+    response_headers = {'X-RateLimit-Remaining': '4999',
+                        'X-RateLimit-Limit': '5000',
+                        'X-RateLimit-Reset': '0'}
+    if isinstance(body, list):
+        per_page = int(params.get('per_page', ['30'])[0])
+        page = int(params.get('page', ['1'])[0])
+        last_page = max(1, math.ceil(len(body) / per_page))
+        start = (page - 1) * per_page
+        if page < last_page:
+            links = []
+            for rel, number in (('next', page + 1), ('last', last_page)):
+                link_url = f'{base_url}{path}?' + urlencode(
+                    {'per_page': per_page, 'page': number})
+                links.append(f'<{link_url}>; rel="{rel}"')
+            response_headers['Link'] = ', '.join(links)
+        body = body[start:start + per_page]
+
+    etag = '"%s"' % hashlib.sha1(
+        json.dumps(body, sort_keys=True).encode()).hexdigest()
+    response_headers['ETag'] = etag
+    if headers.get('If-None-Match') == etag:
+        return 304, None, response_headers
+    return 200, body, response_headers
+
+
+# The permission levels of the team repo API, lowest first
+PERMISSION_LEVELS = ('pull', 'triage', 'push', 'maintain', 'admin')
+
+
+def write_route(routes, method, path, body):
+    # applies a team membership or team repo write to the routes, the way
+    # the GitHub REST API would; returns (status_code, body)
+    parts = path.strip('/').split('/')
+    if len(parts) < 6 or parts[0] != 'orgs' or parts[2] != 'teams':
+        return 404, {"message": "Not Found"}
+    team_path = '/' + '/'.join(parts[:4])
+    if team_path not in routes:
+        return 404, {"message": "Not Found"}
+
+    if parts[4] == 'memberships' and len(parts) == 6:
+        members = routes.setdefault(team_path + '/members', [])
+        login = parts[5]
+        present = [member for member in members
+                   if member['login'].lower() == login.lower()]
+        if method == 'PUT':
+            if not present:
+                members.append({'login': login})
+            return 200, {'state': 'active', 'role': 'member'}
+        if not present:
+            return 404, {"message": "Not Found"}
+        members.remove(present[0])
+        return 204, None
+
+    if parts[4] == 'repos' and len(parts) == 7:
+        repos = routes.setdefault(team_path + '/repos', [])
+        present = [repo for repo in repos if repo['name'] == parts[6]]
+        # the same grant as listed by the repo
+        repo_teams = routes.setdefault(
+            f'/repos/{parts[5]}/{parts[6]}/teams', [])
+        repo_teams[:] = [team for team in repo_teams
+                         if team['slug'] != parts[3]]
+        if method == 'PUT':
+            level = PERMISSION_LEVELS.index(body['permission'])
+            permissions = {name: index <= level for index, name in
+                           enumerate(PERMISSION_LEVELS)}
+            if present:
+                present[0]['permissions'] = permissions
+            else:
+                repos.append({'name': parts[6],
+                              'full_name': f'{parts[5]}/{parts[6]}',
+                              'permissions': permissions})
+            repo_teams.append({'name': routes[team_path].get('name'),
+                               'slug': parts[3],
+                               'permission': body['permission']})
+            return 204, None
+        if not present:
+            return 404, {"message": "Not Found"}
+        repos.remove(present[0])
+        return 204, None
+    return 404, {"message": "Not Found"}
+
+
+# The same routes served over real HTTP on localhost, for clients that
+# bring their own connection pool (async_github). Tracks the peak number
+# of requests in flight, with an optional per-request latency. Team
+# membership and team repo writes change the routes, as on a real org.
+# With rate_limit_remaining=0 every request is refused as rate limited.
+class FakeGitHubServer:
+    def __init__(self, routes, latency=0.0, rate_limit_remaining=4999):
+        self.routes = routes
+        self.latency = latency
+        self.rate_limit_remaining = rate_limit_remaining
+        self.requests = []
+        # format: [("PUT" | "DELETE", "path", body)]
+        self.writes = []
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.lock = threading.Lock()
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0),
+                                          self.handler_class())
+        self.server.daemon_threads = True
+        self.base_url = f'http://127.0.0.1:{self.server.server_port}'
+        self.thread = threading.Thread(target=self.server.serve_forever,
+                                       daemon=True)
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.server.shutdown()
+        self.server.server_close()
+        self.thread.join()
+
+    def handler_class(self):
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def do_GET(self):
+                self.respond(*self.handle_request(lambda: render_route(
+                    fake.routes, fake.base_url, fake.base_url + self.path,
+                    self.headers)))
+
+            def do_PUT(self):
+                self.handle_write('PUT')
+
+            def do_DELETE(self):
+                self.handle_write('DELETE')
+
+            def handle_write(self, method):
+                length = int(self.headers.get('Content-Length') or 0)
+                body = json.loads(self.rfile.read(length)) if length else None
+
+                def write():
+                    with fake.lock:
+                        fake.writes.append((method, self.path, body))
+                        status_code, payload = write_route(
+                            fake.routes, method, self.path, body)
+                    return status_code, payload, {
+                        'X-RateLimit-Remaining': '4999',
+                        'X-RateLimit-Limit': '5000',
+                        'X-RateLimit-Reset': '0'}
+
+                self.respond(*self.handle_request(write))
+
+            def handle_request(self, answer):
+                with fake.lock:
+                    fake.requests.append(self.path)
+                    fake.in_flight += 1
+                    fake.max_in_flight = max(fake.max_in_flight,
+                                             fake.in_flight)
+                try:
+                    if fake.latency:
+                        time.sleep(fake.latency)
+                    if fake.rate_limit_remaining == 0:
+                        return 403, {"message": "API rate limit exceeded"}, {
+                            'X-RateLimit-Remaining': '0',
+                            'X-RateLimit-Limit': '5000',
+                            'X-RateLimit-Reset': '0'}
+                    return answer()
+                finally:
+                    with fake.lock:
+                        fake.in_flight -= 1
+
+            def respond(self, status_code, body, headers):
+                payload = b'' if body is None else json.dumps(body).encode()
+                self.send_response(status_code)
+                for name, value in headers.items():
+                    self.send_header(name, value)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
@@ -1,44 +1,130 @@
+import argparse
+import math
 import os
-import sys
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
 
-from github import Github
 import json
 import logging
 
-logging.basicConfig(level=logging.DEBUG, format='%(message)s',
-                    stream=sys.stdout)
+from atomic_io import write_atomic
+from roles_store import RolesStore
+from team_snapshot import TEAM_REPO_ROLES_FILE
 
 logger = logging.getLogger(__name__)
 
+CHECKPOINT_FILE = 'team_repo_roles.checkpoint.jsonl'
+
 
 class FetchAdditionalTeams:
-    def __init__(self):
-        global github_token
-        self.github_client = Github(github_token)
+    def __init__(self, github_client=None):
+        if github_client is None:
+            from github import Github
+            github_client = Github(os.getenv("GITHUB_OAUTH"))
+        self.github_client = github_client
 
-    def get_teams_and_roles(self, org_name="jenkinsci"):
+    def get_teams_and_roles(self, org_name="jenkinsci", workers=8,
+                            checkpoint_path=CHECKPOINT_FILE,
+                            output_path=TEAM_REPO_ROLES_FILE, store=None):
+        # store: optional RolesStore filled team by team as the crawl goes
+        start = time.perf_counter()
         org = self.github_client.get_organization(org_name)
-        all_teams = org.get_teams()
+        all_teams = list(org.get_teams())
+        per_page = getattr(self.github_client, 'per_page', 30) or 30
+        api_calls = 1 + max(1, math.ceil(len(all_teams) / per_page))
 
-        additional_teams = {}
+        # format: {"team_name": [["repo_name", "role"]]}
+        team_repos = load_checkpoint(checkpoint_path)
+        if team_repos:
+            # drop a line cut off by the interruption before appending
+            write_atomic(checkpoint_path, ''.join(
+                json.dumps({'team': name, 'repos': repos}) + '\n'
+                for name, repos in team_repos.items()))
+        pending = [team for team in all_teams if team.name not in team_repos]
+        positions = {team.name: index for index, team in enumerate(all_teams)}
+        if store is not None and not team_repos:
+            # a fresh crawl must not keep roles a previous crawl saw
+            store.clear()
+        logger.info(f"Fetching repos of {len(pending)} teams, "
+                    f"{len(all_teams) - len(pending)} resumed from "
+                    f"{checkpoint_path}")
+
+        with open(checkpoint_path, 'a') as checkpoint, \
+                ThreadPoolExecutor(max_workers=workers) as pool:
+
+            def record(team, repos):
+                team_repos[team.name] = repos
+                if store is not None:
+                    store.add_many((repo_name, team.name, role,
+                                    positions[team.name])
+                                   for repo_name, role in repos)
+                checkpoint.write(json.dumps(
+                    {'team': team.name, 'repos': repos}) + '\n')
+                checkpoint.flush()
+                logger.debug(f"Fetched {len(repos)} repos of team "
+                             f"{team.name}")
+                return max(1, math.ceil(len(repos) / per_page))
+
+            futures = {pool.submit(fetch_team_repos, team): team
+                       for team in pending}
+            try:
+                for future in as_completed(futures):
+                    api_calls += record(futures[future], future.result())
+            except BaseException:
+                # no new fetches after a failure; the ones already running
+                # are checkpointed, so a resume does not fetch them again
+                pool.shutdown(cancel_futures=True)
+                for future, team in futures.items():
+                    if team.name not in team_repos and \
+                            not future.cancelled() and \
+                            future.exception() is None:
+                        record(team, future.result())
+                raise
 
+        # assembled in org team order, as the serial crawl produced it
+        additional_teams = {}
+        repo_count = 0
         for team in all_teams:
-            for repo in team.get_repos():
-                repo_name = repo.name
-                if repo_name not in additional_teams:
-                    additional_teams[repo_name] = []
-
-                permission = team.get_repo_permission(repo)
-                role = permissions_to_role(permission)
-                additional_teams[repo_name].append({
+            for repo_name, role in team_repos[team.name]:
+                repo_count += 1
+                additional_teams.setdefault(repo_name, []).append({
                     'team': team.name,
                     'role': role
                 })
-                logger.info(f" team of repo {repo_name}:"
-                            f"team: {team.name}, role: {role}")
 
-        with open('team_repo_roles.json', 'w') as f:
-            json.dump(additional_teams, f, indent=4)
+        write_atomic(output_path, json.dumps(additional_teams, indent=4))
+        os.remove(checkpoint_path)
+
+        elapsed = time.perf_counter() - start
+        logger.info(f"Fetched {repo_count} team repos of {len(all_teams)} "
+                    f"teams in {elapsed:.1f}s "
+                    f"({len(pending) / max(elapsed, 1e-9):.1f} teams/s), "
+                    f"about {api_calls} API calls instead of "
+                    f"{api_calls + repo_count} with one permission call "
+                    f"per repo")
+        return additional_teams
+
+
+def fetch_team_repos(team):
+    # the team repos listing already carries the team's permissions, so
+    # there is no separate get_repo_permission call per repo
+    return [[repo.name, permissions_to_role(repo.permissions)]
+            for repo in team.get_repos()]
+
+
+def load_checkpoint(checkpoint_path):
+    team_repos = {}
+    if not os.path.exists(checkpoint_path):
+        return team_repos
+    with open(checkpoint_path, 'r') as file:
+        for line in file:
+            try:
+                entry = json.loads(line)
+            except json.JSONDecodeError:
+                # the last line may be cut off by the interruption
+                continue
+            team_repos[entry['team']] = entry['repos']
+    return team_repos
 
 
 def permissions_to_role(permissions):
@@ -55,11 +141,52 @@ def permissions_to_role(permissions):
     return None
 
 
-if __name__ == "__main__":
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Save the teams and roles of every jenkinsci repo.")
+    parser.add_argument("--cache", help="GitHub response cache file")
+    parser.add_argument("--offline", action="store_true",
+                        help="serve only cached GitHub responses")
+    parser.add_argument("--record",
+                        help="save every GitHub response into this "
+                             "compressed snapshot")
+    parser.add_argument("--replay",
+                        help="answer GitHub requests from a --record "
+                             "snapshot")
+    parser.add_argument("--async", dest="async_http", action="store_true",
+                        help="talk to GitHub over the asyncio backend")
+    parser.add_argument("--workers", type=int, default=8,
+                        help="number of teams fetched concurrently")
+    parser.add_argument("--store",
+                        help="also fill this SQLite roles store as teams "
+                             "are fetched")
+    options = parser.parse_args(argv)
+
     github_token = os.getenv("GITHUB_OAUTH")
-    if not github_token:
+    if not github_token and not (options.offline or options.replay):
         raise EnvironmentError(
             "GitHub OAuth token is not set in the environment variables.")
 
-    fetcher = FetchAdditionalTeams()
-    fetcher.get_teams_and_roles()
+    # PyGithub and requests only once the arguments are known to be valid
+    from github_cache import create_github_client
+    from replay import create_session
+
+    session = create_session(options.record, options.replay)
+    try:
+        fetcher = FetchAdditionalTeams(create_github_client(
+            github_token, options.cache, options.offline,
+            async_http=options.async_http, session=session))
+        store = RolesStore(options.store) if options.store else None
+        fetcher.get_teams_and_roles(workers=options.workers, store=store)
+        if options.async_http:
+            fetcher.github_client.close()
+    finally:
+        # a recording is only written by close(), failed runs included
+        if session is not None:
+            session.close()
+
+
+if __name__ == "__main__":
+    from cli import configure_logging
+    configure_logging(logging.DEBUG)
+    main()
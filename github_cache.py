@@ -0,0 +1,354 @@
+import json
+import logging
+import sqlite3
+import threading
+import time
+from urllib.parse import urlencode
+
+import requests
+from github import Github, GithubException, RateLimitExceededException, \
+    UnknownObjectException
+
+logger = logging.getLogger(__name__)
+
+API_URL = 'https://api.github.com'
+CACHE_FILE = '.github_cache.sqlite'
+# the largest page GitHub serves for list endpoints
+MAX_PER_PAGE = 100
+
+
+def create_github_client(github_token, cache_path=None, offline=False,
+                         ttl=None, async_http=False, session=None,
+                         reuse_members=False):
+    if session is not None:
+        # recording or replaying a run (see replay.py): a fresh in-memory
+        # cache, so both runs send the same requests
+        if cache_path is not None or offline or async_http:
+            raise ValueError("Record and replay use neither the cache nor "
+                             "the async backend.")
+        return CachedGitHubClient(github_token, ResponseCache(':memory:'),
+                                  session)
+
+    if async_http:
+        if cache_path is not None:
+            raise ValueError("The async backend does not use the cache.")
+        # aiohttp is only needed by this backend
+        from async_github import AsyncGitHubBackend
+        return AsyncGitHubBackend(github_token)
+
+    if cache_path is None:
+        if offline:
+            raise ValueError("Offline mode needs a cache file.")
+        if reuse_members:
+            raise ValueError("Reusing member lists needs a cache file.")
+        return Github(github_token, per_page=MAX_PER_PAGE)
+
+    cache = ResponseCache(cache_path) if ttl is None \
+        else ResponseCache(cache_path, ttl)
+    if not offline:
+        cache.evict_expired()
+    return CachedGitHubClient(github_token, cache, offline=offline,
+                              reuse_members=reuse_members)
+
+
+class CacheMissError(GithubException):
+    def __init__(self, url):
+        super().__init__(504, {"message": f"Not cached: {url}"}, None)
+        self.url = url
+
+
+class ResponseCache:
+    def __init__(self, path=CACHE_FILE, ttl=7 * 24 * 3600, clock=time.time):
+        self.path = path
+        # entries not revalidated within ttl seconds are evicted
+        self.ttl = ttl
+        self.clock = clock
+        self.lock = threading.Lock()
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        self.connection.execute(
+            'CREATE TABLE IF NOT EXISTS responses ('
+            'url TEXT PRIMARY KEY, etag TEXT, last_modified TEXT, '
+            'next_url TEXT, body TEXT, fetched_at REAL)')
+        self.connection.commit()
+
+    def get(self, url):
+        with self.lock:
+            row = self.connection.execute(
+                'SELECT etag, last_modified, next_url, body, fetched_at '
+                'FROM responses WHERE url = ?', (url,)).fetchone()
+        if row is None:
+            return None
+        return CachedResponse(url, *row)
+
+    def put(self, url, etag, last_modified, next_url, body):
+        with self.lock:
+            self.connection.execute(
+                'INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?)',
+                (url, etag, last_modified, next_url, body, self.clock()))
+            self.connection.commit()
+
+    def touch(self, url):
+        with self.lock:
+            self.connection.execute(
+                'UPDATE responses SET fetched_at = ? WHERE url = ?',
+                (self.clock(), url))
+            self.connection.commit()
+
+    def evict_expired(self):
+        with self.lock:
+            cursor = self.connection.execute(
+                'DELETE FROM responses WHERE fetched_at < ?',
+                (self.clock() - self.ttl,))
+            self.connection.commit()
+        if cursor.rowcount:
+            logger.info(f"Evicted {cursor.rowcount} expired cache entries")
+        return cursor.rowcount
+
+    def close(self):
+        self.connection.close()
+
+
+class CachedResponse:
+    def __init__(self, url, etag, last_modified, next_url, body, fetched_at):
+        self.url = url
+        self.etag = etag
+        self.last_modified = last_modified
+        self.next_url = next_url
+        self.body = body
+        self.fetched_at = fetched_at
+
+    def json(self):
+        return json.loads(self.body)
+
+
+# REST client for the endpoints TeamMerger, fetch_team_and_role.py and
+# save_teams_to_json.py use, shaped like PyGithub so it can replace it.
+# Every GET goes through the cache and is revalidated with ETag /
+# Last-Modified; a 304 answer costs no rate-limit budget. With reuse_members
+# a team whose member count and update time did not change skips even the
+# revalidation of its member pages, see RestTeam.iter_members.
+class CachedGitHubClient:
+    def __init__(self, github_token, cache, session=None, offline=False,
+                 base_url=API_URL, per_page=MAX_PER_PAGE,
+                 reuse_members=False):
+        self.github_token = github_token
+        self.cache = cache
+        self.session = session if session is not None else requests.Session()
+        self.offline = offline
+        self.base_url = base_url
+        self.per_page = per_page
+        self.reuse_members = reuse_members
+        self.rate_limiting = (-1, -1)
+        self.rate_limiting_resettime = 0
+        self.requests_made = 0
+        self.not_modified = 0
+        self.cache_hits = 0
+
+    def get_organization(self, org_name):
+        return RestOrganization(self, org_name)
+
+    def get_json(self, path, params=None):
+        return self.fetch(self.url(path, params)).json()
+
+    def get_pages(self, path, stats=None):
+        # stats, if given, counts the pages and body bytes read
+        url = self.url(path, {'per_page': self.per_page})
+        while url:
+            response = self.fetch(url)
+            if stats is not None:
+                stats["pages"] += 1
+                stats["bytes"] += len(response.body)
+            yield from response.json()
+            url = response.next_url
+
+    def stored_members(self, path, version):
+        # the member logins saved for this version of the team, if any
+        cached = self.cache.get(self.url(path) + MEMBER_LIST_SUFFIX)
+        if cached is None or cached.etag != version:
+            return None
+        self.cache.touch(cached.url)
+        return cached.json()
+
+    def store_members(self, path, version, logins):
+        # kept in the responses table, so the TTL eviction covers it
+        self.cache.put(self.url(path) + MEMBER_LIST_SUFFIX, version, None,
+                       None, json.dumps(logins))
+
+    def url(self, path, params=None):
+        url = self.base_url + path
+        if params:
+            url += '?' + urlencode(params)
+        return url
+
+    def fetch(self, url):
+        cached = self.cache.get(url)
+        if self.offline:
+            if cached is None:
+                raise CacheMissError(url)
+            self.cache_hits += 1
+            return cached
+
+        headers = {'Accept': 'application/vnd.github+json'}
+        if self.github_token:
+            headers['Authorization'] = f'token {self.github_token}'
+        if cached is not None:
+            if cached.etag:
+                headers['If-None-Match'] = cached.etag
+            if cached.last_modified:
+                headers['If-Modified-Since'] = cached.last_modified
+
+        self.requests_made += 1
+        response = self.session.get(url, headers=headers)
+        update_rate_limit(self, response.headers)
+
+        if response.status_code == 304 and cached is not None:
+            self.not_modified += 1
+            self.cache.touch(url)
+            return cached
+        if response.status_code >= 400:
+            raise_for_status(response.status_code, response.json(),
+                             response.headers)
+
+        body = json.dumps(response.json())
+        self.cache.put(url, response.headers.get('ETag'),
+                       response.headers.get('Last-Modified'),
+                       next_link(response.headers.get('Link')), body)
+        return self.cache.get(url)
+
+    def send(self, method, path, body=None):
+        # writes (PUT / DELETE) bypass the cache
+        if self.offline:
+            raise GithubException(
+                503, {"message": f"Offline, not sending {method} {path}"},
+                None)
+        headers = {'Accept': 'application/vnd.github+json'}
+        if self.github_token:
+            headers['Authorization'] = f'token {self.github_token}'
+        self.requests_made += 1
+        response = self.session.request(method, self.url(path), json=body,
+                                        headers=headers)
+        update_rate_limit(self, response.headers)
+
+        payload = response.json() if response.content else None
+        raise_for_status(response.status_code, payload, response.headers)
+        return payload
+
+
+def update_rate_limit(client, headers):
+    # keeps the PyGithub-style rate_limiting attributes of a REST client
+    if 'X-RateLimit-Remaining' in headers:
+        client.rate_limiting = (int(headers['X-RateLimit-Remaining']),
+                                int(headers.get('X-RateLimit-Limit', -1)))
+    if 'X-RateLimit-Reset' in headers:
+        client.rate_limiting_resettime = int(headers['X-RateLimit-Reset'])
+
+
+def raise_for_status(status_code, payload, headers):
+    # the exception PyGithub raises for an error answer; an exhausted
+    # budget is a RateLimitExceededException, which RateLimitGate retries
+    if status_code == 404:
+        raise UnknownObjectException(404, payload, dict(headers))
+    if status_code in (403, 429) and \
+            headers.get('X-RateLimit-Remaining') == '0':
+        raise RateLimitExceededException(status_code, payload,
+                                         dict(headers))
+    if status_code >= 400:
+        raise GithubException(status_code, payload, dict(headers))
+
+
+# cache key suffix of a team's complete member list; the etag column holds
+# the "members_count/updated_at" version it was fetched at
+MEMBER_LIST_SUFFIX = '#members'
+
+
+def next_link(link_header, rel='next'):
+    # format: <https://api.github.com/...&page=2>; rel="next",
+    #         <...>; rel="last"
+    if not link_header:
+        return None
+    for part in link_header.split(','):
+        url, _, link_rel = part.partition(';')
+        if link_rel.strip() == f'rel="{rel}"':
+            return url.strip()[1:-1]
+    return None
+
+
+class RestOrganization:
+    def __init__(self, client, login):
+        self.client = client
+        self.login = login
+
+    def get_team_by_slug(self, slug):
+        data = self.client.get_json(f'/orgs/{self.login}/teams/{slug}')
+        return RestTeam(self.client, self.login, data)
+
+    def get_teams(self):
+        return [RestTeam(self.client, self.login, data) for data in
+                self.client.get_pages(f'/orgs/{self.login}/teams')]
+
+
+class RestTeam:
+    def __init__(self, client, org_login, data):
+        self.client = client
+        self.org_login = org_login
+        self.name = data['name']
+        self.slug = data['slug']
+        # only the single team endpoint has these, not the team listing
+        self.members_count = data.get('members_count')
+        self.updated_at = data.get('updated_at')
+
+    def get_members(self):
+        return list(self.iter_members())
+
+    def iter_members(self, stats=None):
+        # streams the members page by page; stats, if given, gets the pages
+        # and bytes read and whether a stored list was used instead
+        path = f'/orgs/{self.org_login}/teams/{self.slug}/members'
+        version = None
+        if getattr(self.client, 'reuse_members', False) and \
+                self.members_count is not None:
+            # cheap, but blind to a member swapped for another between runs
+            version = f'{self.members_count}/{self.updated_at}'
+            logins = self.client.stored_members(path, version)
+            if logins is not None:
+                if stats is not None:
+                    stats["reused"] = True
+                for login in logins:
+                    yield RestNamedUser({'login': login})
+                return
+
+        logins = []
+        for data in self.client.get_pages(path, stats):
+            logins.append(data['login'])
+            yield RestNamedUser(data)
+        if version is not None:
+            self.client.store_members(path, version, logins)
+
+    def get_repos(self):
+        return [RestRepository(data) for data in self.client.get_pages(
+            f'/orgs/{self.org_login}/teams/{self.slug}/repos')]
+
+    def get_repo_permission(self, repo):
+        # the team repos listing already carries the team's permissions
+        return repo.permissions
+
+
+class RestNamedUser:
+    def __init__(self, data):
+        self.login = data['login']
+
+
+class RestRepository:
+    def __init__(self, data):
+        self.name = data['name']
+        self.full_name = data.get('full_name')
+        self.permissions = RestPermissions(data.get('permissions') or {})
+
+
+class RestPermissions:
+    def __init__(self, data):
+        self.admin = data.get('admin', False)
+        self.maintain = data.get('maintain', False)
+        self.push = data.get('push', False)
+        self.triage = data.get('triage', False)
+        self.pull = data.get('pull', False)
@@ -0,0 +1,199 @@
+import cProfile
+import functools
+import io
+import json
+import math
+import pstats
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+
+# upper bounds in seconds, Prometheus style
+BUCKETS = (0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0, math.inf)
+
+
+class Histogram:
+    def __init__(self):
+        self.buckets = [0] * len(BUCKETS)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, seconds):
+        for index, bound in enumerate(BUCKETS):
+            if seconds <= bound:
+                self.buckets[index] += 1
+                break
+        self.count += 1
+        self.sum += seconds
+        self.max = max(self.max, seconds)
+
+    def merge(self, data):
+        self.buckets = [a + b for a, b in zip(self.buckets, data['buckets'])]
+        self.count += data['count']
+        self.sum += data['sum']
+        self.max = max(self.max, data['max'])
+
+    def to_dict(self):
+        return {'buckets': self.buckets, 'count': self.count,
+                'sum': self.sum, 'max': self.max}
+
+
+class Metrics:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self.lock:
+            # format: {"stage": Histogram}
+            self.stages = {}
+            # format: {"endpoint": calls}, member pages counted one by one
+            self.api_calls = Counter()
+            # format: {"org/team_slug": {"pages": n, "bytes": n,
+            #                            "reused": bool}}, member reads
+            self.teams = {}
+            self.rate_limit_first = None
+            self.rate_limit_last = None
+
+    @contextmanager
+    def stage(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start)
+
+    def observe(self, name, seconds):
+        with self.lock:
+            self.stages.setdefault(name, Histogram()).observe(seconds)
+
+    def count_call(self, endpoint, count=1):
+        with self.lock:
+            self.api_calls[endpoint] += count
+
+    def record_team(self, team, pages, size=0, reused=False):
+        with self.lock:
+            self.teams[team] = {'pages': pages, 'bytes': size,
+                                'reused': reused}
+
+    def record_rate_limit(self, github_client):
+        rate_limiting = getattr(github_client, 'rate_limiting', None)
+        if not isinstance(rate_limiting, tuple) or rate_limiting[0] < 0:
+            return
+        remaining = rate_limiting[0]
+        with self.lock:
+            if self.rate_limit_first is None:
+                self.rate_limit_first = remaining
+            self.rate_limit_last = remaining
+
+    def rate_limit_used(self):
+        if self.rate_limit_first is None:
+            return None
+        return self.rate_limit_first - self.rate_limit_last
+
+    def to_dict(self):
+        with self.lock:
+            return {
+                'stages': {name: histogram.to_dict()
+                           for name, histogram in self.stages.items()},
+                'api_calls': dict(self.api_calls),
+                'teams': dict(self.teams),
+                'rate_limit_used': self.rate_limit_used(),
+            }
+
+    def merge(self, data):
+        # adds the metrics of a worker process
+        with self.lock:
+            for name, histogram in data['stages'].items():
+                self.stages.setdefault(name, Histogram()).merge(histogram)
+            self.api_calls.update(data['api_calls'])
+            self.teams.update(data.get('teams', {}))
+
+    def summary_table(self):
+        data = self.to_dict()
+        lines = [f"{'stage':<28}{'count':>8}{'total s':>10}"
+                 f"{'mean ms':>10}{'max ms':>10}"]
+        for name, histogram in sorted(data['stages'].items()):
+            count = histogram['count']
+            lines.append(f"{name:<28}{count:>8}{histogram['sum']:>10.3f}"
+                         f"{1000 * histogram['sum'] / max(count, 1):>10.2f}"
+                         f"{1000 * histogram['max']:>10.2f}")
+        lines.append(f"{'endpoint':<28}{'calls':>8}")
+        for endpoint, calls in sorted(data['api_calls'].items()):
+            lines.append(f"{endpoint:<28}{calls:>8}")
+        if data['teams']:
+            teams = data['teams'].values()
+            lines.append(f"{'member pages':<28}"
+                         f"{sum(team['pages'] for team in teams):>8}")
+            size = sum(team['bytes'] for team in teams)
+            lines.append(f"{'member kB':<28}{size // 1024:>8}")
+            lines.append(f"{'member lists reused':<28}"
+                         f"{sum(team['reused'] for team in teams):>8}")
+        if data['rate_limit_used'] is not None:
+            lines.append(f"{'rate limit used':<28}"
+                         f"{data['rate_limit_used']:>8}")
+        return '\n'.join(lines)
+
+    def write_json(self, path):
+        with open(path, 'w') as file:
+            json.dump(self.to_dict(), file, indent=4)
+
+    def write_prometheus(self, path):
+        data = self.to_dict()
+        lines = ['# TYPE rpu_sync_stage_seconds histogram']
+        for name, histogram in sorted(data['stages'].items()):
+            cumulative = 0
+            for bound, count in zip(BUCKETS, histogram['buckets']):
+                cumulative += count
+                le = '+Inf' if bound == math.inf else repr(bound)
+                lines.append(f'rpu_sync_stage_seconds_bucket'
+                             f'{{stage="{name}",le="{le}"}} {cumulative}')
+            lines.append(f'rpu_sync_stage_seconds_sum{{stage="{name}"}} '
+                         f'{histogram["sum"]}')
+            lines.append(f'rpu_sync_stage_seconds_count{{stage="{name}"}} '
+                         f'{histogram["count"]}')
+        lines.append('# TYPE rpu_sync_github_calls_total counter')
+        for endpoint, calls in sorted(data['api_calls'].items()):
+            lines.append(f'rpu_sync_github_calls_total'
+                         f'{{endpoint="{endpoint}"}} {calls}')
+        if data['teams']:
+            lines.append('# TYPE rpu_sync_member_pages_total counter')
+            lines.append(f'rpu_sync_member_pages_total '
+                         f'{sum(t["pages"] for t in data["teams"].values())}')
+            lines.append('# TYPE rpu_sync_member_bytes_total counter')
+            lines.append(f'rpu_sync_member_bytes_total '
+                         f'{sum(t["bytes"] for t in data["teams"].values())}')
+        if data['rate_limit_used'] is not None:
+            lines.append('# TYPE rpu_sync_rate_limit_used gauge')
+            lines.append(f'rpu_sync_rate_limit_used '
+                         f'{data["rate_limit_used"]}')
+        with open(path, 'w') as file:
+            file.write('\n'.join(lines) + '\n')
+
+
+def timed(name):
+    # decorator form of metrics.stage(name)
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with metrics.stage(name):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def profile(fn, output_path, top=25):
+    # runs fn under cProfile, saves the stats and returns the top entries
+    profiler = cProfile.Profile()
+    profiler.runcall(fn)
+    profiler.dump_stats(output_path)
+    stream = io.StringIO()
+    pstats.Stats(profiler, stream=stream).sort_stats(
+        'cumulative').print_stats(top)
+    return stream.getvalue()
+
+
+# shared by the whole run, like the module loggers
+metrics = Metrics()
@@ -1,43 +1,172 @@
+import argparse
+import json
 import logging
 import os
-import sys
-
-from github import Github
 
 from backfill_to_yaml import SyncMain
+from instrumentation import metrics, profile
+from reconcile import RPU_DIRECTORIES, list_yaml_files
+from sync_state import STATE_FILE, SyncState
+from team_index import TEAM_INDEX_FILE, TeamFileIndex
+from team_snapshot import TEAM_REPO_ROLES_FILE, TeamSnapshot
 
+logger = logging.getLogger(__name__)
 
-logging.basicConfig(level=logging.DEBUG, format='%(message)s',
-                    stream=sys.stdout)
 
-logger = logging.getLogger(__name__)
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Back-fill RPU YAML files from GitHub teams.")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="number of concurrent GitHub lookups")
+    parser.add_argument("--processes", type=int, default=1,
+                        help="number of processes parsing and writing YAML")
+    parser.add_argument("--aliases",
+                        help="JSON file mapping LDAP names to GitHub logins")
+    parser.add_argument("--bulk", action="store_true",
+                        help="prefetch team members in bulk over GraphQL")
+    parser.add_argument("--async", dest="async_http", action="store_true",
+                        help="talk to GitHub over the asyncio backend and "
+                             "prefetch team members concurrently")
+    parser.add_argument("--cache",
+                        help="cache GitHub responses in this SQLite file")
+    parser.add_argument("--offline", action="store_true",
+                        help="serve only cached GitHub responses")
+    parser.add_argument("--record",
+                        help="save every GitHub response of the run into "
+                             "this compressed snapshot")
+    parser.add_argument("--replay",
+                        help="answer GitHub requests from a --record "
+                             "snapshot, fully offline")
+    parser.add_argument("--cache-ttl", type=int,
+                        help="evict cache entries older than this (seconds)")
+    parser.add_argument("--reuse-members", action="store_true",
+                        help="with --cache, reuse a team's cached member "
+                             "list while its member count and update time "
+                             "are unchanged")
+    parser.add_argument("--roles", default=TEAM_REPO_ROLES_FILE,
+                        help="team_repo_roles as JSON or as a .sqlite store")
+    parser.add_argument("--state", default=STATE_FILE,
+                        help="file recording what the last sync saw")
+    parser.add_argument("--full", action="store_true",
+                        help="process every file, even unchanged ones")
+    parser.add_argument("--dry-run", action="store_true",
+                        help="report what would change without writing "
+                             "any YAML file")
+    parser.add_argument("--report", default="dry_run_report.json",
+                        help="where the --dry-run report is written as JSON")
+    parser.add_argument("--team",
+                        help="re-sync only the files referencing this team "
+                             "slug")
+    parser.add_argument("--team-index", default=TEAM_INDEX_FILE,
+                        help="file mapping team slugs to the YAML files "
+                             "referencing them")
+    parser.add_argument("--metrics-json",
+                        help="write stage timings and API calls as JSON")
+    parser.add_argument("--metrics-prom",
+                        help="write stage timings and API calls as a "
+                             "Prometheus textfile")
+    parser.add_argument("--profile",
+                        help="sync only this YAML file under cProfile")
+    parser.add_argument("--profile-output", default="sync.prof",
+                        help="where the --profile stats are saved")
+    return parser.parse_args(argv)
 
 
-def main():
-    directories = ["submodules/RPU/teams", "submodules/RPU/permissions"]
+def main(argv=None):
+    options = parse_args(argv)
+    # PyGithub and requests only once the arguments are known to be valid
+    from replay import create_session
 
     github_token = os.getenv("GITHUB_OAUTH")
-    if not github_token:
+    if not github_token and not (options.offline or options.replay):
         raise EnvironmentError(
             "GitHub OAuth token is not set in the environment variables.")
 
-    github_client = Github(github_token)
+    session = create_session(options.record, options.replay)
+    try:
+        sync(options, github_token, session)
+    finally:
+        # a recording is only written by close(), failed runs included
+        if session is not None:
+            session.close()
+    write_metrics(options)
+
+
+def sync(options, github_token, session):
+    from bulk_membership import GraphQLMembershipFetcher
+    from github_cache import create_github_client
+
+    github_client = create_github_client(github_token, options.cache,
+                                         options.offline, options.cache_ttl,
+                                         options.async_http, session,
+                                         options.reuse_members)
 
-    sync_main = SyncMain(github_client)
+    aliases = None
+    if options.aliases:
+        with open(options.aliases, 'r') as file:
+            # format: {"ldap_name": "github_login"}
+            aliases = json.load(file)
 
-    for directory in directories:
-        if not os.path.exists(directory):
-            logger.info(f"Directory not found: {directory}")
-            continue
+    membership_fetcher = None
+    if options.bulk:
+        membership_fetcher = GraphQLMembershipFetcher(github_token, session)
+    elif options.async_http:
+        membership_fetcher = github_client
 
-        files = [f for f in os.listdir(directory) if f.endswith('.yml')]
-        if not files:
+    snapshot = TeamSnapshot.load(team_repo_roles_path=options.roles)
+    team_index = TeamFileIndex.load(options.team_index)
+    sync_main = SyncMain(github_client, snapshot, aliases=aliases,
+                         membership_fetcher=membership_fetcher,
+                         state=SyncState.load(options.state),
+                         team_index=team_index, dry_run=options.dry_run)
+
+    if options.profile:
+        stats = profile(lambda: sync_main.run([options.profile], full=True),
+                        options.profile_output)
+        logger.info(f"Profile of {options.profile}, saved to "
+                    f"{options.profile_output}:\n" + stats)
+        return
+
+    # format: {"directory": ["yaml_file_path"]}
+    listed = {}
+    for directory in RPU_DIRECTORIES:
+        files = list_yaml_files([directory])
+        if files:
+            listed[directory] = files
+        elif os.path.exists(directory):
             logger.info(f"No YAML files found in {directory}.")
-            continue
 
-        args = [os.path.join(directory, f) for f in files]
-        sync_main.run(args)
+    team_index.prune(path for args in listed.values() for path in args)
+    if options.team and team_index.files:
+        selected = set(team_index.get_files(options.team))
+        logger.info(f"Team {options.team} is referenced by "
+                    f"{len(selected)} files")
+        listed = {directory: [path for path in args if path in selected]
+                  for directory, args in listed.items()}
+    elif options.team:
+        # the first run builds the index, so it syncs every file
+        logger.info(f"Team index {options.team_index} is empty, "
+                    f"syncing all files")
+
+    for args in listed.values():
+        if args:
+            sync_main.run(args, workers=options.workers, full=options.full,
+                          processes=options.processes)
+
+    if options.dry_run:
+        sync_main.report.write_json(options.report)
+    if options.async_http:
+        github_client.close()
+
+
+def write_metrics(options):
+    if options.metrics_json:
+        metrics.write_json(options.metrics_json)
+    if options.metrics_prom:
+        metrics.write_prometheus(options.metrics_prom)
 
 
 if __name__ == "__main__":
+    from cli import configure_logging
+    configure_logging(logging.DEBUG)
     main()
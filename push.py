@@ -0,0 +1,291 @@
+import argparse
+import json
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+from github import GithubException
+
+from atomic_io import write_atomic
+from backfill_to_yaml import TeamMerger, YamlDataLoader, to_slug
+from github_cache import create_github_client
+from instrumentation import metrics
+from rate_limit import RateLimitGate
+from reconcile import list_yaml_files
+from team_snapshot import TEAM_REPO_ROLES_FILE, TeamSnapshot
+from yaml_definitions import RepoYamlDefinition, normalize_login
+
+logger = logging.getLogger(__name__)
+
+PUSH_REPORT_FILE = 'push_report.json'
+
+# team repo API permission for each RPU role
+ROLE_PERMISSIONS = {'Read': 'pull', 'Triage': 'triage', 'Write': 'push',
+                    'Maintain': 'maintain', 'Admin': 'admin'}
+# and the other way round, for the permissions listed by GitHub
+PERMISSION_ROLES = {permission: role
+                    for role, permission in ROLE_PERMISSIONS.items()}
+
+
+# Pushes the team state of the RPU YAML to GitHub: the developers of each
+# team and the additional_github_teams roles of each repo. Only the
+# difference to GitHub is sent, one membership or repo permission at a
+# time. Files sharing a team or repo are merged first, so one file never
+# removes what another one grants.
+class PushEngine:
+    def __init__(self, github_client, snapshot, aliases=None, workers=4,
+                 batch_size=100):
+        self.github_client = github_client
+        self.snapshot = snapshot
+        # format: {"ldap_name": "github_login"}
+        self.aliases = {normalize_login(ldap): normalize_login(github)
+                        for ldap, github in (aliases or {}).items()}
+        self.workers = workers
+        self.batch_size = batch_size
+        self.gate = RateLimitGate(github_client)
+        self.merger = TeamMerger(github_client, snapshot,
+                                 self.gate if workers > 1 else None, aliases)
+        # format: [{"files": ["yaml_file_path"], "reason": "..."}]
+        self.skipped = []
+        # format: [{"files": [...], "team": "team_slug", "ldap": "name"}]
+        self.unresolved = []
+
+    def plan(self, yaml_files):
+        # format: {("org_name", "team_slug"): {"files": [], "developers": []}}
+        teams = {}
+        # format: {("org_name", "repo_name"): {"files": [], "teams": []}}
+        repos = {}
+        for yaml_file_path in yaml_files:
+            team, config = YamlDataLoader.peek_team_with_config(
+                yaml_file_path)
+            required = self.merger.required_team_slugs(team)
+            if 'developers' in config:
+                if required:
+                    entry = teams.setdefault(required[0], {
+                        "files": [], "developers": []})
+                    entry["files"].append(yaml_file_path)
+                    entry["developers"].extend(team.developers)
+                else:
+                    self.skipped.append({"files": [yaml_file_path],
+                                         "reason": "no GitHub team"})
+            if isinstance(team, RepoYamlDefinition) and team.repo_name and \
+                    'additional_github_teams' in config:
+                entry = repos.setdefault((team.org_name, team.repo_name), {
+                    "files": [], "teams": []})
+                entry["files"].append(yaml_file_path)
+                entry["teams"].extend(
+                    (item.get("team"), item.get("role")) for item in
+                    config['additional_github_teams'] or []
+                    if isinstance(item, dict))
+
+        with ThreadPoolExecutor(max_workers=max(1, self.workers)) as pool:
+            # list() re-raises the first worker exception, if any
+            list(pool.map(lambda key: self.merger.fetch_member_logins(*key),
+                          teams))
+            repo_teams = dict(zip(repos, pool.map(
+                lambda key: self.fetch_repo_teams(*key), repos)))
+
+        operations = []
+        for (org_name, team_slug), entry in teams.items():
+            operations.extend(self.membership_operations(
+                org_name, team_slug, entry["files"], entry["developers"]))
+        for (org_name, repo_name), entry in repos.items():
+            operations.extend(self.repo_team_operations(
+                org_name, repo_name, entry["files"], entry["teams"],
+                repo_teams[(org_name, repo_name)]))
+        return operations
+
+    def fetch_repo_teams(self, org_name, repo_name):
+        # format: {"team_slug": "role"}, as granted on GitHub right now
+        path = f'/repos/{org_name}/{repo_name}/teams'
+        repo_teams = self.gate.call(
+            lambda: list(self.github_client.get_pages(path)))
+        return {team_info['slug']: PERMISSION_ROLES.get(
+            team_info['permission'], team_info['permission'])
+            for team_info in repo_teams}
+
+    def membership_operations(self, org_name, team_slug, files, developers):
+        current = {normalize_login(login): login for login in
+                   self.merger.fetch_member_logins(org_name, team_slug) or []}
+        wanted = {}
+        keep = set()
+        unresolved = 0
+        for developer in developers:
+            if developer.github:
+                key = normalize_login(developer.github)
+                keep.add(key)
+                if key not in current:
+                    wanted.setdefault(key, developer.github)
+            elif developer.ldap:
+                # not back-filled yet: only keeps a member of that name
+                ldap = normalize_login(developer.ldap)
+                keep.add(self.aliases.get(ldap, ldap))
+                if self.aliases.get(ldap, ldap) not in current:
+                    unresolved += 1
+                    self.unresolved.append({"files": files,
+                                            "team": team_slug,
+                                            "ldap": developer.ldap})
+
+        path = f'/orgs/{org_name}/teams/{team_slug}/memberships'
+        operations = [operation('add_member', 'PUT', f'{path}/{login}',
+                                {'role': 'member'}, files, team_slug, login)
+                      for login in wanted.values()]
+        removed = [login for key, login in current.items()
+                   if key not in keep]
+        if removed and unresolved:
+            # any member may be the GitHub login of an unresolved developer
+            self.skipped.append({
+                "files": files, "reason": f"not removing {len(removed)} "
+                                          f"members of {team_slug}: "
+                                          f"{unresolved} developers have "
+                                          f"no GitHub login"})
+            return operations
+        operations.extend(operation('remove_member', 'DELETE',
+                                    f'{path}/{login}', None, files,
+                                    team_slug, login)
+                          for login in removed)
+        return operations
+
+    def repo_team_operations(self, org_name, repo_name, files, wanted_teams,
+                             current):
+        # current: {"team_slug": "role"}, see fetch_repo_teams
+        repo_team_slug = to_slug(repo_name + " Developers", self.snapshot)
+        current = {team_slug: role for team_slug, role in current.items()
+                   if team_slug != repo_team_slug}
+        wanted = {}
+        for team_name, role in wanted_teams:
+            if wanted.get(team_name, role) != role:
+                self.skipped.append({
+                    "files": files, "reason": f"conflicting roles for "
+                                              f"{team_name}: "
+                                              f"{wanted[team_name]}, {role}"})
+                wanted[team_name] = None
+            elif team_name not in wanted:
+                wanted[team_name] = role
+
+        operations = []
+        # format: {"team_slug"}, wanted teams with a role or a conflict
+        wanted_slugs = set()
+        for team_name, role in wanted.items():
+            team_slug = to_slug(team_name, self.snapshot) \
+                if isinstance(team_name, str) else None
+            wanted_slugs.add(team_slug)
+            if role is None or current.get(team_slug) == role:
+                continue
+            if role not in ROLE_PERMISSIONS or \
+                    not self.snapshot.has_team(team_name):
+                self.skipped.append({"files": files,
+                                     "reason": f"unknown team or role: "
+                                               f"{team_name}, {role}"})
+                continue
+            operations.append(operation(
+                'set_repo_permission', 'PUT',
+                f'/orgs/{org_name}/teams/{team_slug}/repos/'
+                f'{org_name}/{repo_name}',
+                {'permission': ROLE_PERMISSIONS[role]}, files, team_slug,
+                repo_name))
+        for team_slug in current:
+            if team_slug not in wanted_slugs:
+                operations.append(operation(
+                    'remove_repo', 'DELETE',
+                    f'/orgs/{org_name}/teams/{team_slug}/repos/'
+                    f'{org_name}/{repo_name}', None, files, team_slug,
+                    repo_name))
+        return operations
+
+    def apply(self, operations):
+        results = []
+        for start in range(0, len(operations), self.batch_size):
+            batch = operations[start:start + self.batch_size]
+            # a low budget pauses before a batch rather than halfway in
+            self.gate.wait()
+            with ThreadPoolExecutor(max_workers=max(1, self.workers)) as pool:
+                results.extend(pool.map(self.apply_operation, batch))
+        failed = sum(result["status"] == "failed" for result in results)
+        logger.info(f"Applied {len(results) - failed} changes, "
+                    f"{failed} failed")
+        return results
+
+    def apply_operation(self, entry):
+        metrics.count_call(entry["action"])
+        try:
+            self.gate.call(self.github_client.send, entry["method"],
+                           entry["path"], entry["body"])
+        except GithubException as e:
+            logger.error(f"Failed to {entry['action']} {entry['target']} "
+                         f"for {entry['team']}: {e}")
+            return dict(entry, status="failed", error=str(e))
+        return dict(entry, status="applied")
+
+    def report(self, operations):
+        actions = {}
+        for entry in operations:
+            actions[entry["action"]] = actions.get(entry["action"], 0) + 1
+        return {
+            "summary": dict(actions, skipped=len(self.skipped),
+                            unresolved=len(self.unresolved)),
+            "operations": operations,
+            "skipped": self.skipped,
+            "unresolved": self.unresolved,
+        }
+
+
+def operation(action, method, path, body, files, team_slug, target):
+    return {"action": action, "method": method, "path": path, "body": body,
+            "files": files, "team": team_slug, "target": target}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Push the developers and additional teams of the RPU "
+                    "YAML to GitHub.")
+    parser.add_argument("files", nargs='*',
+                        help="YAML files to push, all of submodules/RPU "
+                             "when left out")
+    parser.add_argument("--dry-run", action="store_true",
+                        help="only report the changes")
+    parser.add_argument("--report", default=PUSH_REPORT_FILE,
+                        help="where the planned or applied changes are "
+                             "written as JSON")
+    parser.add_argument("--workers", type=int, default=4,
+                        help="number of concurrent GitHub requests")
+    parser.add_argument("--batch-size", type=int, default=100,
+                        help="changes sent between rate limit checks")
+    parser.add_argument("--aliases",
+                        help="JSON file mapping LDAP names to GitHub logins")
+    parser.add_argument("--roles", default=TEAM_REPO_ROLES_FILE,
+                        help="team_repo_roles as JSON or as a .sqlite store")
+    parser.add_argument("--cache",
+                        help="cache GitHub reads in this SQLite file")
+    options = parser.parse_args(argv)
+
+    github_token = os.getenv("GITHUB_OAUTH")
+    if not github_token:
+        raise EnvironmentError(
+            "GitHub OAuth token is not set in the environment variables.")
+    # the REST client, which can also send writes; in-memory cache if none
+    github_client = create_github_client(github_token,
+                                         options.cache or ':memory:')
+
+    aliases = None
+    if options.aliases:
+        with open(options.aliases, 'r') as file:
+            aliases = json.load(file)
+
+    engine = PushEngine(github_client,
+                        TeamSnapshot.load(team_repo_roles_path=options.roles),
+                        aliases, options.workers, options.batch_size)
+    operations = engine.plan(options.files or list_yaml_files())
+    if not options.dry_run:
+        operations = engine.apply(operations)
+    report = engine.report(operations)
+    write_atomic(options.report, json.dumps(report, indent=4))
+    logger.info(f"Push {'plan' if options.dry_run else 'result'}: "
+                f"{report['summary']}, written to {options.report}")
+    return report
+
+
+if __name__ == "__main__":
+    from cli import configure_logging
+    configure_logging(logging.DEBUG)
+    main()
@@ -0,0 +1,58 @@
+import logging
+import threading
+import time
+
+from github import RateLimitExceededException
+
+logger = logging.getLogger(__name__)
+
+
+# shared by every worker so the whole pool backs off together
+class RateLimitGate:
+    def __init__(self, github_client, min_remaining=100, max_retries=3,
+                 sleep=time.sleep, clock=time.time):
+        self.github_client = github_client
+        self.min_remaining = min_remaining
+        self.max_retries = max_retries
+        self.sleep = sleep
+        self.clock = clock
+        self.paused_until = 0
+        self.lock = threading.Lock()
+
+    def call(self, fn, *args):
+        retries = 0
+        while True:
+            self.wait()
+            try:
+                result = fn(*args)
+            except RateLimitExceededException:
+                retries += 1
+                if retries > self.max_retries:
+                    raise
+                self.pause(self._reset_time())
+                continue
+            self.observe()
+            return result
+
+    def wait(self):
+        with self.lock:
+            delay = self.paused_until - self.clock()
+        if delay > 0:
+            self.sleep(delay)
+
+    def observe(self):
+        remaining, _ = self.github_client.rate_limiting
+        # a negative budget means no response has reported it yet
+        if 0 <= remaining <= self.min_remaining:
+            self.pause(self._reset_time())
+
+    def pause(self, until):
+        with self.lock:
+            if until > self.paused_until:
+                self.paused_until = until
+                logger.warning(f"Rate limit nearly exhausted, pausing all "
+                               f"workers until {until}")
+
+    def _reset_time(self):
+        # one extra second so the reset has really happened server side
+        return self.github_client.rate_limiting_resettime + 1
@@ -0,0 +1,128 @@
+import argparse
+import json
+import logging
+import os
+import time
+
+from atomic_io import write_atomic
+from backfill_to_yaml import YamlDataLoader
+from team_snapshot import ALL_TEAMS_FILE, TEAM_REPO_ROLES_FILE, TeamSnapshot
+from yaml_definitions import RepoYamlDefinition
+
+logger = logging.getLogger(__name__)
+
+RPU_DIRECTORIES = ["submodules/RPU/teams", "submodules/RPU/permissions"]
+OUTPUT_DIRECTORY = 'others'
+
+GITHUB_TEAMS_HEADER = "# teams only in GitHub"
+YAML_TEAMS_HEADER = ("# Only in YAML - developers field is non-null and "
+                     "there is no corresponding team on GitHub\nprojects:")
+
+
+def list_yaml_files(directories=RPU_DIRECTORIES):
+    files = []
+    for directory in directories:
+        if not os.path.exists(directory):
+            logger.info(f"Directory not found: {directory}")
+            continue
+        files.extend(os.path.join(directory, f)
+                     for f in sorted(os.listdir(directory))
+                     if f.endswith('.yml'))
+    return files
+
+
+# Compares the GitHub snapshot (all_teams.json, team_repo_roles) with the
+# RPU YAML, without calling GitHub: one pass over the files collects the
+# YAML side as sets, and every list is a set difference or intersection.
+def reconcile(snapshot, yaml_files):
+    # teams each YAML file stands for: "<repo> Developers" or teams/ names
+    yaml_teams = set()
+    # the subset whose developers list is not empty
+    yaml_teams_with_developers = set()
+    yaml_repos = set()
+    unreadable = []
+    for yaml_file_path in yaml_files:
+        try:
+            team = YamlDataLoader.peek_team(yaml_file_path)
+        except Exception as e:
+            logger.error(f"Skipping {yaml_file_path}: {e}")
+            unreadable.append(yaml_file_path)
+            continue
+        if isinstance(team, RepoYamlDefinition):
+            if not team.repo_name:
+                continue
+            yaml_repos.add(team.repo_name)
+            team_name = team.repo_name + " Developers"
+        elif team.team_name:
+            team_name = team.team_name
+        else:
+            continue
+        yaml_teams.add(team_name)
+        if team.developers:
+            yaml_teams_with_developers.add(team_name)
+
+    github_teams = set(snapshot.all_teams)
+    role_repos = set()
+    teams_with_repos = set()
+    for repo_name, teams in snapshot.team_repo_roles.items():
+        role_repos.add(repo_name)
+        teams_with_repos.update(team_info['team'] for team_info in teams)
+
+    covered_repos = yaml_repos & role_repos
+    return {
+        "github_teams": sorted(github_teams - yaml_teams),
+        "yaml_teams": sorted(yaml_teams_with_developers - github_teams),
+        "orphaned_teams": sorted(github_teams - teams_with_repos - yaml_teams),
+        "repos_without_yaml": sorted(role_repos - yaml_repos),
+        "repos_without_teams": sorted(yaml_repos - role_repos),
+        "repo_coverage": {
+            "yaml_repos": len(yaml_repos),
+            "github_repos": len(role_repos),
+            "covered": len(covered_repos),
+            "ratio": round(len(covered_repos) / len(yaml_repos), 4)
+            if yaml_repos else None,
+        },
+        "unreadable_files": unreadable,
+    }
+
+
+def write_report(report, output_directory=OUTPUT_DIRECTORY):
+    os.makedirs(output_directory, exist_ok=True)
+    write_atomic(os.path.join(output_directory, 'github_teams.txt'),
+                 '\n'.join([GITHUB_TEAMS_HEADER] + report["github_teams"])
+                 + '\n')
+    write_atomic(os.path.join(output_directory, 'yaml_teams.txt'),
+                 '\n'.join([YAML_TEAMS_HEADER] + report["yaml_teams"]) + '\n')
+    write_atomic(os.path.join(output_directory, 'reconciliation.json'),
+                 json.dumps(report, indent=4) + '\n')
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Regenerate the others/*.txt lists and a JSON report "
+                    "comparing GitHub teams with the RPU YAML.")
+    parser.add_argument("--all-teams", default=ALL_TEAMS_FILE)
+    parser.add_argument("--roles", default=TEAM_REPO_ROLES_FILE,
+                        help="team_repo_roles as JSON or as a .sqlite store")
+    parser.add_argument("--output", default=OUTPUT_DIRECTORY,
+                        help="directory the text and JSON files go to")
+    options = parser.parse_args(argv)
+
+    start = time.perf_counter()
+    snapshot = TeamSnapshot.load(options.all_teams, options.roles)
+    yaml_files = list_yaml_files()
+    report = reconcile(snapshot, yaml_files)
+    write_report(report, options.output)
+    logger.info(f"Reconciled {len(yaml_files)} YAML files with "
+                f"{len(snapshot.all_teams)} GitHub teams in "
+                f"{time.perf_counter() - start:.2f}s: "
+                f"{len(report['github_teams'])} only in GitHub, "
+                f"{len(report['yaml_teams'])} only in YAML, "
+                f"{len(report['orphaned_teams'])} orphaned")
+    return report
+
+
+if __name__ == "__main__":
+    from cli import configure_logging
+    configure_logging(logging.DEBUG)
+    main()
@@ -0,0 +1,134 @@
+import gzip
+import json
+import logging
+import os
+import threading
+
+import requests
+from github import GithubException
+
+from atomic_io import write_atomic
+
+logger = logging.getLogger(__name__)
+
+# the response headers the clients read; request headers, and with them
+# the token, are never recorded
+RECORDED_HEADERS = ('ETag', 'Last-Modified', 'Link', 'X-RateLimit-Remaining',
+                    'X-RateLimit-Limit', 'X-RateLimit-Reset')
+
+
+class ReplayMissError(GithubException):
+    def __init__(self, method, url):
+        super().__init__(504, {"message": f"Not recorded: {method} {url}"},
+                         None)
+        self.url = url
+
+
+def exchange_key(method, url, payload=None):
+    if payload is None:
+        return f'{method} {url}'
+    return f'{method} {url} {json.dumps(payload, sort_keys=True)}'
+
+
+# Wraps the requests session of CachedGitHubClient and
+# GraphQLMembershipFetcher and keeps every response of the run; close()
+# saves them into one gzip-compressed JSON snapshot for ReplaySession.
+class RecordingSession:
+    def __init__(self, path, session=None):
+        self.path = path
+        self.session = session if session is not None else requests.Session()
+        self.lock = threading.Lock()
+        # format: {"METHOD url [body]": [{"status", "headers", "payload"}]}
+        self.exchanges = {}
+
+    def get(self, url, headers=None):
+        response = self.session.get(url, headers=headers)
+        self.record(exchange_key('GET', url), response)
+        return response
+
+    def post(self, url, json=None, headers=None):
+        response = self.session.post(url, json=json, headers=headers)
+        self.record(exchange_key('POST', url, json), response)
+        return response
+
+    def record(self, key, response):
+        try:
+            payload = response.json()
+        except ValueError:
+            payload = None
+        answer = {'status': response.status_code,
+                  'headers': {name: response.headers[name]
+                              for name in RECORDED_HEADERS
+                              if name in response.headers},
+                  'payload': payload}
+        with self.lock:
+            self.exchanges.setdefault(key, []).append(answer)
+
+    def close(self):
+        write_atomic(self.path, gzip.compress(
+            json.dumps(self.exchanges).encode()))
+        logger.info(f"Recorded {sum(map(len, self.exchanges.values()))} "
+                    f"responses to {self.path} "
+                    f"({os.path.getsize(self.path)} bytes)")
+
+
+# Answers the requests of a recorded run from its snapshot, in recorded
+# order per request; a request asked more often than recorded gets the
+# last answer again. Anything not recorded raises ReplayMissError.
+class ReplaySession:
+    def __init__(self, exchanges):
+        self.exchanges = exchanges
+        self.lock = threading.Lock()
+        # format: {"METHOD url [body]": answers served}
+        self.served = {}
+
+    @classmethod
+    def load(cls, path):
+        with gzip.open(path, 'rt') as file:
+            return cls(json.load(file))
+
+    def get(self, url, headers=None):
+        return self.replay('GET', url)
+
+    def post(self, url, json=None, headers=None):
+        return self.replay('POST', url, json)
+
+    def replay(self, method, url, payload=None):
+        key = exchange_key(method, url, payload)
+        answers = self.exchanges.get(key)
+        if not answers:
+            raise ReplayMissError(method, url)
+        with self.lock:
+            index = self.served.get(key, 0)
+            self.served[key] = index + 1
+        answer = answers[min(index, len(answers) - 1)]
+        return ReplayResponse(answer['payload'], answer['status'],
+                              answer['headers'])
+
+    def close(self):
+        pass
+
+
+class ReplayResponse:
+    def __init__(self, payload, status_code, headers):
+        self.payload = payload
+        self.status_code = status_code
+        self.headers = headers
+
+    def json(self):
+        return self.payload
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise GithubException(self.status_code, self.payload,
+                                  self.headers)
+
+
+def create_session(record_path=None, replay_path=None):
+    if record_path and replay_path:
+        raise ValueError("Record and replay cannot be combined.")
+    if record_path:
+        return RecordingSession(record_path)
+    if replay_path:
+        return ReplaySession.load(replay_path)
+    return None
@@ -0,0 +1,65 @@
+import logging
+
+from yaml_definitions import DeveloperInfo, DeveloperList, \
+    RepoYamlDefinition, normalize_login
+
+logger = logging.getLogger(__name__)
+
+
+def group_by_repo(teams):
+    # format: [[team_index]], every team once and in input order; permission
+    # files naming the same org/repo end up in the same group
+    groups = {}
+    for i, team in enumerate(teams):
+        if isinstance(team, RepoYamlDefinition) and team.repo_name:
+            key = (team.org_name, team.repo_name)
+        else:
+            key = i
+        groups.setdefault(key, []).append(i)
+    return list(groups.values())
+
+
+# Several plugins can live in one GitHub repo, each with its own permission
+# file. Synced one by one, every file would get a different developer list
+# for the same repo team; the union of the group is synced once instead.
+# An entry matches an earlier one by GitHub login or LDAP name, the first
+# file wins where they disagree and the disagreement is returned.
+def merge_developer_sets(yaml_file_paths, teams):
+    developers = DeveloperList()
+    index = developers.index()
+    # format: {id(DeveloperInfo): "yaml_file_path"}, where each entry came from
+    sources = {}
+    # format: [{"repo": "org/repo", "field": "github", "values": [...],
+    #           "files": [...]}]
+    conflicts = []
+    repo = f"{teams[0].org_name}/{teams[0].repo_name}"
+    for yaml_file_path, team in zip(yaml_file_paths, teams):
+        for developer in team.developers:
+            keys = [normalize_login(login) for login in
+                    (developer.github, developer.ldap) if login]
+            existing = next((index[key] for key in keys if key in index),
+                            None)
+            if existing is None:
+                entry = DeveloperInfo(developer.ldap, developer.github)
+                developers.append(entry)
+                sources[id(entry)] = yaml_file_path
+                continue
+
+            for field in ('ldap', 'github'):
+                value = getattr(developer, field)
+                current = getattr(existing, field)
+                if not value:
+                    continue
+                if not current:
+                    setattr(existing, field, value)
+                    developers.add_logins(existing)
+                elif normalize_login(current) != normalize_login(value):
+                    logger.warning(f"Conflicting {field} in {repo}: "
+                                   f"{current} in "
+                                   f"{sources[id(existing)]}, {value} in "
+                                   f"{yaml_file_path}")
+                    conflicts.append({
+                        "repo": repo, "field": field,
+                        "values": [current, value],
+                        "files": [sources[id(existing)], yaml_file_path]})
+    return developers, conflicts
@@ -0,0 +1,130 @@
+import argparse
+import json
+import logging
+import sqlite3
+import threading
+
+from atomic_io import write_atomic
+
+logger = logging.getLogger(__name__)
+
+ROLES_STORE_FILE = 'team_repo_roles.sqlite'
+
+
+# team_repo_roles kept in SQLite, indexed by repo and by team, so a single
+# repo is looked up without loading the whole org. get() matches dict.get
+# on the JSON format: {"repo_name": [{"team": "team_name", "role": "role"}]}
+class RolesStore:
+    def __init__(self, path=ROLES_STORE_FILE):
+        self.path = path
+        self.lock = threading.Lock()
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        self.connection.executescript(
+            'CREATE TABLE IF NOT EXISTS roles ('
+            'repo TEXT NOT NULL, team TEXT NOT NULL, role TEXT, '
+            'position INTEGER NOT NULL, PRIMARY KEY (repo, team)) '
+            'WITHOUT ROWID;'
+            'CREATE INDEX IF NOT EXISTS roles_by_team ON roles (team);')
+
+    # pickled by path, so worker processes open their own connection
+    def __getstate__(self):
+        return {'path': self.path}
+
+    def __setstate__(self, state):
+        self.__init__(state['path'])
+
+    def get(self, repo_name, default=None):
+        with self.lock:
+            rows = self.connection.execute(
+                'SELECT team, role FROM roles WHERE repo = ? '
+                'ORDER BY position, team', (repo_name,)).fetchall()
+        if not rows:
+            return default
+        return [{'team': team, 'role': role} for team, role in rows]
+
+    def __contains__(self, repo_name):
+        with self.lock:
+            return self.connection.execute(
+                'SELECT 1 FROM roles WHERE repo = ? LIMIT 1',
+                (repo_name,)).fetchone() is not None
+
+    def __len__(self):
+        with self.lock:
+            return self.connection.execute(
+                'SELECT COUNT(DISTINCT repo) FROM roles').fetchone()[0]
+
+    def get_team_repos(self, team_name):
+        with self.lock:
+            return self.connection.execute(
+                'SELECT repo, role FROM roles WHERE team = ? ORDER BY repo',
+                (team_name,)).fetchall()
+
+    def add(self, repo_name, team_name, role, position):
+        # position orders a repo's teams, e.g. the team's index in the org
+        self.add_many([(repo_name, team_name, role, position)])
+
+    def add_many(self, entries):
+        with self.lock:
+            self.connection.executemany(
+                'INSERT OR REPLACE INTO roles VALUES (?, ?, ?, ?)', entries)
+            self.connection.commit()
+
+    def items(self):
+        with self.lock:
+            rows = self.connection.execute(
+                'SELECT repo, team, role FROM roles '
+                'ORDER BY repo, position, team').fetchall()
+        team_repo_roles = {}
+        for repo_name, team_name, role in rows:
+            team_repo_roles.setdefault(repo_name, []).append(
+                {'team': team_name, 'role': role})
+        return team_repo_roles.items()
+
+    def clear(self):
+        with self.lock:
+            self.connection.execute('DELETE FROM roles')
+            self.connection.commit()
+
+    def close(self):
+        self.connection.close()
+
+
+def import_json(json_path, store_path):
+    with open(json_path, 'r') as file:
+        team_repo_roles = json.load(file)
+    store = RolesStore(store_path)
+    store.clear()
+    store.add_many((repo_name, team_info['team'], team_info['role'], index)
+                   for repo_name, teams in team_repo_roles.items()
+                   for index, team_info in enumerate(teams))
+    logger.info(f"Imported {len(team_repo_roles)} repos into {store_path}")
+    return store
+
+
+def export_json(store_path, json_path):
+    # repos come out sorted by name; the teams of a repo keep their order
+    store = RolesStore(store_path)
+    team_repo_roles = dict(store.items())
+    store.close()
+    write_atomic(json_path, json.dumps(team_repo_roles, indent=4))
+    logger.info(f"Exported {len(team_repo_roles)} repos to {json_path}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Convert team_repo_roles between JSON and SQLite.")
+    parser.add_argument("direction", choices=["import", "export"])
+    parser.add_argument("--json", default="team_repo_roles.json")
+    parser.add_argument("--store", default=ROLES_STORE_FILE)
+    options = parser.parse_args(argv)
+
+    if options.direction == "import":
+        import_json(options.json, options.store).close()
+    else:
+        export_json(options.store, options.json)
+
+
+if __name__ == "__main__":
+    from cli import configure_logging
+    configure_logging(logging.DEBUG)
+    main()
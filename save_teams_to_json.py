@@ -1,13 +1,15 @@
-import os
-
-from github import Github
+import argparse
 import json
+import logging
+import os
 
 
 class SaveTeamsToJson:
-    def __init__(self):
-        global github_token
-        self.github_client = Github(github_token)
+    def __init__(self, github_client=None):
+        if github_client is None:
+            from github import Github
+            github_client = Github(os.getenv("GITHUB_OAUTH"))
+        self.github_client = github_client
 
     def save_teams_to_json(self):
         org_name = "jenkinsci"
@@ -19,11 +21,39 @@ class SaveTeamsToJson:
             json.dump(teams_data, f, indent=4)
 
 
-if __name__ == "__main__":
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Save jenkinsci teams.")
+    parser.add_argument("--cache", help="GitHub response cache file")
+    parser.add_argument("--offline", action="store_true",
+                        help="serve only cached GitHub responses")
+    parser.add_argument("--record",
+                        help="save every GitHub response into this "
+                             "compressed snapshot")
+    parser.add_argument("--replay",
+                        help="answer GitHub requests from a --record "
+                             "snapshot")
+    options = parser.parse_args(argv)
+
     github_token = os.getenv("GITHUB_OAUTH")
-    if not github_token:
+    if not github_token and not (options.offline or options.replay):
         raise EnvironmentError(
             "GitHub OAuth token is not set in the environment variables.")
 
-    saver = SaveTeamsToJson()
-    saver.save_teams_to_json()
+    # PyGithub and requests only once the arguments are known to be valid
+    from github_cache import create_github_client
+    from replay import create_session
+
+    session = create_session(options.record, options.replay)
+    try:
+        saver = SaveTeamsToJson(create_github_client(
+            github_token, options.cache, options.offline, session=session))
+        saver.save_teams_to_json()
+    finally:
+        if session is not None:
+            session.close()
+
+
+if __name__ == "__main__":
+    from cli import configure_logging
+    configure_logging(logging.DEBUG)
+    main()
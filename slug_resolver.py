@@ -0,0 +1,64 @@
+import difflib
+import functools
+import json
+import re
+
+# the four passes of the original to_slug in two: drop anything but word
+# characters, whitespace and dashes, then collapse runs of both into a dash
+UNSLUGGABLE = re.compile(r'[^\w\s-]+')
+SEPARATORS = re.compile(r'[\s-]+')
+
+
+def normalize(name):
+    return SEPARATORS.sub('-', UNSLUGGABLE.sub('', name.lower())).strip('-')
+
+
+# GitHub team names and slugs, in both directions. Names missing from the
+# org's team map fall back to GitHub's own slug rules; candidates() finds
+# the teams a misspelt or shortened name (e.g. "ux" for "SIG: UX") meant.
+class SlugResolver:
+    def __init__(self, all_teams, cache_size=4096):
+        # format: {"team_name": "team_slug"}
+        self.all_teams = all_teams
+        self.cache_size = cache_size
+        self.names_by_slug = {slug: name for name, slug in all_teams.items()}
+        self.to_slug = functools.lru_cache(maxsize=cache_size)(self.resolve)
+
+    # the cache is not pickled, worker processes start their own
+    def __getstate__(self):
+        return {'all_teams': self.all_teams, 'cache_size': self.cache_size}
+
+    def __setstate__(self, state):
+        self.__init__(state['all_teams'], state['cache_size'])
+
+    @classmethod
+    def load(cls, all_teams_path):
+        with open(all_teams_path, 'r') as file:
+            return cls(json.load(file))
+
+    def resolve(self, name):
+        slug = self.all_teams.get(name)
+        return slug if slug is not None else normalize(name)
+
+    def to_name(self, slug):
+        return self.names_by_slug.get(slug)
+
+    def candidates(self, name, limit=5, cutoff=0.6):
+        # team names for a name that is not in the map, best first
+        slug = normalize(name)
+        if slug in self.names_by_slug:
+            return [self.names_by_slug[slug]]
+        # the name is a whole word of the slug: "ux" in "sig-ux"
+        found = [team_slug for team_slug in self.names_by_slug
+                 if slug and slug in team_slug.split('-')]
+        found.sort(key=len)
+        found += difflib.get_close_matches(slug, list(self.names_by_slug),
+                                           limit, cutoff)
+        return [self.names_by_slug[team_slug] for team_slug in
+                dict.fromkeys(found)][:limit]
+
+
+@functools.lru_cache(maxsize=None)
+def default_resolver(all_teams_path):
+    # for callers without a TeamSnapshot, read once per path
+    return SlugResolver.load(all_teams_path)
@@ -0,0 +1,46 @@
+import hashlib
+import json
+import logging
+import os
+
+from atomic_io import write_atomic
+
+logger = logging.getLogger(__name__)
+
+STATE_FILE = '.sync_state.json'
+
+
+class SyncState:
+    def __init__(self, path=STATE_FILE, entries=None):
+        self.path = path
+        # format: {"file_path": {"yaml": hash, "roles": hash, "members": hash}}
+        self.entries = entries if entries is not None else {}
+
+    @classmethod
+    def load(cls, path=STATE_FILE):
+        if not os.path.exists(path):
+            return cls(path)
+        with open(path, 'r') as file:
+            return cls(path, json.load(file))
+
+    def is_unchanged(self, file_path, fingerprint):
+        return self.entries.get(file_path) == fingerprint
+
+    def record(self, file_path, fingerprint):
+        self.entries[file_path] = fingerprint
+
+    def save(self):
+        write_atomic(self.path, json.dumps(self.entries, indent=4,
+                                           sort_keys=True))
+        logger.info(f"Saved sync state of {len(self.entries)} files to "
+                    f"{self.path}")
+
+
+def hash_file(path):
+    with open(path, 'rb') as file:
+        return hashlib.sha256(file.read()).hexdigest()
+
+
+def hash_json(value):
+    return hashlib.sha256(
+        json.dumps(value, sort_keys=True).encode()).hexdigest()
@@ -0,0 +1,59 @@
+import json
+import logging
+import os
+
+from atomic_io import write_atomic
+
+logger = logging.getLogger(__name__)
+
+TEAM_INDEX_FILE = '.team_index.json'
+
+
+# Maps each GitHub team slug to the RPU YAML files that reference it, so a
+# membership change only re-syncs those files.
+class TeamFileIndex:
+    def __init__(self, path=TEAM_INDEX_FILE, files=None):
+        self.path = path
+        # format: {"yaml_file_path": ["team_slug"]}
+        self.files = {}
+        # format: {"team_slug": {"yaml_file_path"}}
+        self.teams = {}
+        for file_path, slugs in (files or {}).items():
+            self.update(file_path, slugs)
+
+    @classmethod
+    def load(cls, path=TEAM_INDEX_FILE):
+        if not os.path.exists(path):
+            return cls(path)
+        with open(path, 'r') as file:
+            return cls(path, json.load(file))
+
+    def update(self, file_path, slugs):
+        self.remove(file_path)
+        self.files[file_path] = sorted(set(slugs))
+        for slug in self.files[file_path]:
+            self.teams.setdefault(slug, set()).add(file_path)
+
+    def remove(self, file_path):
+        for slug in self.files.pop(file_path, []):
+            self.teams[slug].discard(file_path)
+            if not self.teams[slug]:
+                del self.teams[slug]
+
+    def prune(self, existing_file_paths):
+        existing_file_paths = set(existing_file_paths)
+        for file_path in list(self.files):
+            if file_path not in existing_file_paths:
+                self.remove(file_path)
+
+    def get_files(self, slug):
+        return sorted(self.teams.get(slug, ()))
+
+    def save(self):
+        if self.path is None:
+            # in memory only, as the watcher's default index
+            return
+        write_atomic(self.path, json.dumps(self.files, indent=4,
+                                           sort_keys=True))
+        logger.info(f"Saved team index of {len(self.files)} files to "
+                    f"{self.path}")
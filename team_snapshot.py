@@ -0,0 +1,70 @@
+import json
+import logging
+import sys
+import time
+
+from roles_store import RolesStore
+from slug_resolver import SlugResolver
+
+logger = logging.getLogger(__name__)
+
+ALL_TEAMS_FILE = 'all_teams.json'
+TEAM_REPO_ROLES_FILE = 'team_repo_roles.json'
+
+
+class TeamSnapshot:
+    def __init__(self, all_teams, team_repo_roles, load_seconds=0.0):
+        # format: {"team_name": "team_slug"}
+        self.all_teams = all_teams
+        # format: {"repo_name": [{"team": "team_name", "role": "role"}]},
+        # or a RolesStore answering the same lookups from SQLite
+        self.team_repo_roles = team_repo_roles
+        self.slugs = SlugResolver(all_teams)
+        self.load_seconds = load_seconds
+
+    @classmethod
+    def load(cls, all_teams_path=ALL_TEAMS_FILE,
+             team_repo_roles_path=TEAM_REPO_ROLES_FILE):
+        start = time.perf_counter()
+        with open(all_teams_path, 'r') as file:
+            all_teams = json.load(file)
+        if team_repo_roles_path.endswith('.sqlite'):
+            team_repo_roles = RolesStore(team_repo_roles_path)
+        else:
+            with open(team_repo_roles_path, 'r') as file:
+                team_repo_roles = json.load(file)
+
+        snapshot = cls(all_teams, team_repo_roles,
+                       time.perf_counter() - start)
+        logger.info(f"Loaded team snapshot in {snapshot.load_seconds:.3f}s: "
+                    f"{len(all_teams)} teams, {len(team_repo_roles)} repos, "
+                    f"{snapshot.memory_size()} bytes")
+        return snapshot
+
+    def has_team(self, team_name):
+        return team_name in self.all_teams
+
+    def get_slug(self, team_name):
+        return self.all_teams.get(team_name)
+
+    def get_team_name(self, slug):
+        return self.slugs.to_name(slug)
+
+    def get_repo_roles(self, repo_name):
+        return self.team_repo_roles.get(repo_name, [])
+
+    def memory_size(self):
+        return _deep_sizeof(self.all_teams) + \
+            _deep_sizeof(self.team_repo_roles) + \
+            _deep_sizeof(self.slugs.names_by_slug)
+
+
+def _deep_sizeof(obj):
+    size = sys.getsizeof(obj)
+    if isinstance(obj, dict):
+        for key, value in obj.items():
+            size += _deep_sizeof(key) + _deep_sizeof(value)
+    elif isinstance(obj, (list, tuple, set)):
+        for item in obj:
+            size += _deep_sizeof(item)
+    return size
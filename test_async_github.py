@@ -0,0 +1,97 @@
+import unittest
+
+from github import RateLimitExceededException
+
+from async_github import AsyncGitHubBackend
+from backfill_to_yaml import SyncMain
+from fake_github import FakeGitHub, FakeGitHubServer
+from fetch_team_and_role import fetch_team_repos, permissions_to_role
+from test_backfill_to_yaml import RpuTreeTestCase
+
+
+def team_routes(teams, org_name='jenkinsci'):
+    routes = {}
+    for slug, logins in teams.items():
+        routes[f'/orgs/{org_name}/teams/{slug}'] = {'name': slug,
+                                                    'slug': slug}
+        routes[f'/orgs/{org_name}/teams/{slug}/members'] = [
+            {'login': login} for login in logins]
+    return routes
+
+
+class TestAsyncGitHubBackend(unittest.TestCase):
+
+    def backend(self, server, concurrency=2):
+        backend = AsyncGitHubBackend('token', server.base_url, per_page=2,
+                                     concurrency=concurrency)
+        self.addCleanup(backend.close)
+        return backend
+
+    def test_pages_are_fetched_together_under_the_cap(self):
+        logins = [f'user{i}' for i in range(9)]
+        with FakeGitHubServer(team_routes({'core': logins}),
+                              latency=0.05) as server:
+            backend = self.backend(server)
+            team = backend.get_organization('jenkinsci') \
+                .get_team_by_slug('core')
+
+            self.assertEqual([m.login for m in team.get_members()], logins)
+            self.assertEqual(server.max_in_flight, 2)
+            self.assertEqual(backend.requests_made, 6)
+            self.assertEqual(backend.rate_limiting, (4999, 5000))
+
+    def test_fetch_leaves_out_missing_teams(self):
+        teams = {'a': ['u1', 'u2', 'u3'], 'b': []}
+        with FakeGitHubServer(team_routes(teams)) as server:
+            members = self.backend(server, concurrency=4).fetch(
+                'jenkinsci', ['a', 'b', 'missing', 'a'])
+
+        self.assertEqual(members, teams)
+
+    def test_teams_and_repo_permissions(self):
+        routes = {
+            '/orgs/jenkinsci/teams': [{'name': 'Core', 'slug': 'core'}],
+            '/orgs/jenkinsci/teams/core/repos': [
+                {'name': 'repo', 'permissions': {'pull': True,
+                                                 'push': True}}],
+        }
+        with FakeGitHubServer(routes) as server:
+            backend = self.backend(server)
+            team = backend.get_organization('jenkinsci').get_teams()[0]
+            repo = team.get_repos()[0]
+
+            self.assertEqual(permissions_to_role(
+                team.get_repo_permission(repo)), 'Write')
+            self.assertEqual(fetch_team_repos(team), [['repo', 'Write']])
+
+    def test_exhausted_budget_raises_rate_limit_exception(self):
+        with FakeGitHubServer({}, rate_limit_remaining=0) as server:
+            backend = self.backend(server)
+            self.assertRaises(RateLimitExceededException, backend.get_json,
+                              '/orgs/jenkinsci/teams/core')
+            self.assertEqual(backend.rate_limiting, (0, 5000))
+
+
+class TestAsyncSync(RpuTreeTestCase):
+
+    def test_output_matches_pygithub_backend(self):
+        snapshot, teams, files = self.create_tree(4)
+        originals = {f: self.read_file(f) for f in files}
+        SyncMain(FakeGitHub(teams), snapshot).run(files)
+        expected = {f: self.read_file(f) for f in files}
+
+        with FakeGitHubServer(team_routes(teams)) as server:
+            backend = AsyncGitHubBackend('token', server.base_url,
+                                         concurrency=4)
+            self.addCleanup(backend.close)
+            for membership_fetcher in (None, backend):
+                for f, content in originals.items():
+                    self.write_file(f, content)
+                SyncMain(backend, snapshot,
+                         membership_fetcher=membership_fetcher).run(files)
+                self.assertEqual({f: self.read_file(f) for f in files},
+                                 expected)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,13 +1,21 @@
 from unittest import TestCase
 
+import os
+import tempfile
 import unittest
 from pathlib import Path
 from unittest.mock import patch, MagicMock, mock_open
 from ruamel.yaml import YAML
 from backfill_to_yaml import YamlDataLoader, TeamMerger, YamlWriter, SyncMain, \
-    merge_github_developers
+    merge_github_developers, merge_github_logins, to_slug
+from bulk_membership import GraphQLMembershipFetcher
+from fake_github import FakeGitHub, FakeGraphQLSession
+from rate_limit import RateLimitGate
+from sync_state import SyncState
+from team_index import TeamFileIndex
+from team_snapshot import TeamSnapshot
 from yaml_definitions import RepoYamlDefinition, SpecialYamlDefinition, \
-    AdditionalTeamDefinition, DeveloperInfo
+    AdditionalTeamDefinition, DeveloperInfo, DeveloperList
 
 
 class TestYamlDataLoader(unittest.TestCase):
@@ -109,6 +117,442 @@ class TestTeamMerger(unittest.TestCase):
             self.assertTrue(found,
                             f"Developer {expected_dev.ldap} with GitHub {expected_dev.github} not found")
 
+    def test_merge_is_case_insensitive_and_keeps_order(self):
+        team = MagicMock()
+        team.get_members.return_value = [
+            MagicMock(login='charlie'),
+            MagicMock(login='BOB'),
+            MagicMock(login='Charlie'),
+            MagicMock(login='dave')
+        ]
+        developers = [
+            DeveloperInfo('Alice', None),
+            DeveloperInfo('bob', None)
+        ]
+
+        merge_github_developers(team, developers)
+
+        self.assertEqual([(dev.ldap, dev.github) for dev in developers],
+                         [('Alice', None), ('bob', 'BOB'),
+                          (None, 'Charlie'), (None, 'dave')])
+
+    def test_merge_uses_aliases(self):
+        developers = [
+            DeveloperInfo('Bob_in_ldap', None),
+            DeveloperInfo('Alice', None)
+        ]
+
+        merge_github_logins(['Bob_in_github'], developers,
+                            {'bob_in_ldap': 'BOB_IN_GITHUB'})
+
+        self.assertEqual([(dev.ldap, dev.github) for dev in developers],
+                         [('Bob_in_ldap', 'Bob_in_github'), ('Alice', None)])
+
+    def test_sync_repository_team_uses_snapshot(self):
+        snapshot = TeamSnapshot(
+            {'repo Developers': 'repo-developers', 'Core': 'core'},
+            {'repo': [{'team': 'repo Developers', 'role': 'Admin'},
+                      {'team': 'Core', 'role': 'Write'}]})
+        github_client = MagicMock()
+        org = github_client.get_organization.return_value
+        org.get_team_by_slug.return_value.get_members.return_value = [
+            MagicMock(login='Alice')]
+        repo_team = RepoYamlDefinition(None, [DeveloperInfo('Alice', None)],
+                                       'org', 'repo', set())
+
+        with patch('builtins.open') as mock_file:
+            TeamMerger(github_client, snapshot).sync_repository_team(
+                repo_team)
+            mock_file.assert_not_called()
+
+        org.get_team_by_slug.assert_called_once_with('repo-developers')
+        self.assertEqual(repo_team.team_name, 'repo Developers')
+        self.assertEqual(repo_team.developers[0].github, 'Alice')
+        self.assertEqual([(t.team_name, t.role)
+                          for t in repo_team.additional_teams],
+                         [('Core', 'Write')])
+
+
+class TestTeamSnapshot(unittest.TestCase):
+
+    def test_lookups(self):
+        snapshot = TeamSnapshot({'SIG: UX': 'sig-ux'},
+                                {'repo': [{'team': 'SIG: UX',
+                                           'role': 'Read'}]})
+        self.assertTrue(snapshot.has_team('SIG: UX'))
+        self.assertEqual(snapshot.get_slug('SIG: UX'), 'sig-ux')
+        self.assertEqual(snapshot.get_team_name('sig-ux'), 'SIG: UX')
+        self.assertEqual(snapshot.get_repo_roles('missing'), [])
+        self.assertEqual(to_slug('SIG: UX', snapshot), 'sig-ux')
+        self.assertEqual(to_slug('New  Team!', snapshot), 'new-team')
+        self.assertGreater(snapshot.memory_size(), 0)
+
+
+class TestYamlDefinitions(unittest.TestCase):
+
+    def test_additional_teams_are_deduplicated(self):
+        snapshot = TeamSnapshot(
+            {'repo Developers': 'repo-developers'},
+            {'repo': [{'team': 'Core', 'role': 'Write'},
+                      {'team': 'Core', 'role': 'Write'},
+                      {'team': 'Core', 'role': 'Read'}]})
+        repo_team = RepoYamlDefinition(None, [], 'org', 'repo', set())
+        merger = TeamMerger(MagicMock(), snapshot)
+
+        merger.sync_repository_team(repo_team)
+        merger.sync_repository_team(repo_team)
+
+        self.assertEqual(repo_team.additional_teams,
+                         {AdditionalTeamDefinition('Core', 'Write'),
+                          AdditionalTeamDefinition('Core', 'Read')})
+        self.assertFalse(hasattr(repo_team, '__dict__'))
+        self.assertRaises(AttributeError, setattr,
+                          next(iter(repo_team.additional_teams)), 'role',
+                          'Admin')
+
+    def test_developer_list_is_keyed_by_login(self):
+        developers = DeveloperList([DeveloperInfo('Alice', None),
+                                    DeveloperInfo('bob', 'Bob-GH'),
+                                    DeveloperInfo('ALICE', None)])
+
+        merge_github_logins(['alice', 'bob-gh', 'carol'], developers)
+
+        self.assertIs(developers.get(' Alice'), developers[0])
+        self.assertIs(developers.get('CAROL'), developers[3])
+        self.assertEqual(developers, [DeveloperInfo('Alice', 'alice'),
+                                      DeveloperInfo('bob', 'bob-gh'),
+                                      DeveloperInfo('ALICE', None),
+                                      DeveloperInfo(None, 'carol')])
+
+
+class RpuTreeTestCase(unittest.TestCase):
+    # Runs each test inside a temporary checkout with a submodules/RPU tree.
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        cwd = os.getcwd()
+        os.chdir(self.tmp.name)
+        self.addCleanup(os.chdir, cwd)
+        root = Path(self.tmp.name).resolve()
+        for attr, sub in (('PERMISSIONS_PATH', 'permissions'),
+                          ('TEAMS_PATH', 'teams')):
+            path = root / 'submodules' / 'RPU' / sub
+            path.mkdir(parents=True)
+            patcher = patch.object(YamlDataLoader, attr, path)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def write_file(self, relative_path, content):
+        Path(relative_path).write_text(content)
+        return relative_path
+
+    def read_file(self, relative_path):
+        return Path(relative_path).read_text()
+
+    def create_tree(self, count):
+        all_teams = {}
+        roles = {}
+        teams = {}
+        files = []
+        for i in range(count):
+            repo = f'repo{i}'
+            team_name = f'{repo} Developers'
+            slug = f'{repo}-developers'
+            all_teams[team_name] = slug
+            roles[repo] = [{'team': team_name, 'role': 'Admin'},
+                           {'team': 'Core', 'role': 'Write'},
+                           {'team': 'SIG: UX', 'role': 'Read'}]
+            teams[slug] = [f'dev{i}', f'extra{i}']
+            files.append(self.write_file(
+                f'submodules/RPU/permissions/plugin-{i}.yml',
+                f'---\nname: "plugin-{i}"\n'
+                f'github: &GH "jenkinsci/{repo}"\n'
+                f'developers:\n  - "dev{i}"  # maintainer\n'))
+        return TeamSnapshot(all_teams, roles), teams, files
+
+
+class TestSyncMainConcurrency(RpuTreeTestCase):
+
+    def test_concurrent_output_matches_serial(self):
+        snapshot, teams, files = self.create_tree(8)
+        originals = {f: self.read_file(f) for f in files}
+
+        SyncMain(FakeGitHub(teams), snapshot).run(files)
+        serial = {f: self.read_file(f) for f in files}
+
+        for f, content in originals.items():
+            self.write_file(f, content)
+        github = FakeGitHub(teams, latency=0.01)
+        SyncMain(github, snapshot).run(files, workers=4)
+        concurrent = {f: self.read_file(f) for f in files}
+
+        self.assertEqual(serial, concurrent)
+        self.assertIn('github: "extra0"', serial[files[0]])
+        self.assertEqual(github.calls['get_organization'], 1)
+        self.assertEqual(github.calls['get_members'], len(files))
+
+    def test_process_pool_output_matches_serial(self):
+        snapshot, teams, files = self.create_tree(6)
+        originals = {f: self.read_file(f) for f in files}
+
+        SyncMain(FakeGitHub(teams), snapshot).run(files)
+        serial = {f: self.read_file(f) for f in files}
+
+        for f, content in originals.items():
+            self.write_file(f, content)
+        github = FakeGitHub(teams)
+        sync_main = SyncMain(github, snapshot, state=SyncState('state.json'))
+        sync_main.run(files, workers=2, processes=3)
+
+        self.assertEqual(serial, {f: self.read_file(f) for f in files})
+        self.assertEqual(sync_main.file_counts, {'written': len(files)})
+        self.assertEqual(github.calls['get_members'], len(files))
+        self.assertEqual(set(sync_main.state.entries), set(files))
+        self.assertEqual(set(sync_main.timings[files[-1]]), {'parse', 'dump'})
+
+        sync_main = SyncMain(FakeGitHub(teams), snapshot,
+                             state=sync_main.state)
+        sync_main.run(files, workers=2, processes=3)
+        self.assertEqual(sync_main.file_counts, {'skipped': len(files)})
+
+    def test_bulk_membership_output_matches_serial(self):
+        snapshot, teams, files = self.create_tree(5)
+        originals = {f: self.read_file(f) for f in files}
+
+        SyncMain(FakeGitHub(teams), snapshot).run(files)
+        serial = {f: self.read_file(f) for f in files}
+
+        for f, content in originals.items():
+            self.write_file(f, content)
+        github = FakeGitHub(teams)
+        session = FakeGraphQLSession(teams)
+        fetcher = GraphQLMembershipFetcher('token', session,
+                                           teams_per_request=2, page_size=1)
+        SyncMain(github, snapshot, membership_fetcher=fetcher).run(files)
+
+        self.assertEqual(serial, {f: self.read_file(f) for f in files})
+        self.assertEqual(sum(github.calls.values()), 0)
+        # two member pages per team, two teams per request
+        self.assertEqual(fetcher.requests_made, 5)
+        self.assertEqual(fetcher.baseline_requests, 10)
+
+
+class TestSinglePassPipeline(RpuTreeTestCase):
+
+    def test_each_file_is_parsed_once_and_keeps_anchors(self):
+        snapshot, teams, files = self.create_tree(2)
+        sync_main = SyncMain(FakeGitHub(teams), snapshot)
+
+        with patch('ruamel.yaml.YAML.load', autospec=True,
+                   side_effect=YAML.load) as mock_load:
+            sync_main.run(files)
+
+        self.assertEqual(mock_load.call_count, len(files))
+        self.assertEqual(self.read_file(files[0]),
+                         '---\n'
+                         'name: "plugin-0"\n'
+                         'github: &GH "jenkinsci/repo0"\n'
+                         'developers:\n'
+                         '  - ldap: "dev0"\n'
+                         '    github: "dev0"\n'
+                         '  - github: "extra0"\n'
+                         'repository_team: "repo0 Developers"\n'
+                         'additional_github_teams:\n'
+                         '  - team: "Core"\n'
+                         '    role: "Write"\n'
+                         '  - team: "SIG: UX"\n'
+                         '    role: "Read"\n')
+        self.assertEqual(set(sync_main.timings[files[0]]), {'parse', 'dump'})
+
+    def test_identical_output_is_not_rewritten(self):
+        snapshot, teams, files = self.create_tree(2)
+        SyncMain(FakeGitHub(teams), snapshot).run(files)
+        teams['repo1-developers'].append('newcomer')
+
+        sync_main = SyncMain(FakeGitHub(teams), snapshot)
+        with patch('backfill_to_yaml.write_atomic',
+                   side_effect=OSError('disk full')) as mock_write:
+            self.assertRaises(OSError, sync_main.run, files)
+        mock_write.assert_called_once()
+        self.assertNotIn('newcomer', self.read_file(files[1]))
+
+        sync_main = SyncMain(FakeGitHub(teams), snapshot)
+        sync_main.run(files)
+        self.assertEqual(sync_main.file_counts,
+                         {'unchanged': 1, 'written': 1})
+        self.assertIn('newcomer', self.read_file(files[1]))
+
+
+class TestIncrementalSync(RpuTreeTestCase):
+
+    def run_sync(self, snapshot, teams, files, workers=1, full=False):
+        with patch.object(YamlWriter, 'write_repo_team_to_yaml',
+                          autospec=True,
+                          side_effect=YamlWriter.write_repo_team_to_yaml) \
+                as mock_write:
+            SyncMain(FakeGitHub(teams), snapshot,
+                     state=SyncState.load('state.json')).run(
+                files, workers=workers, full=full)
+        return [call.args[2] for call in mock_write.call_args_list]
+
+    def test_skips_files_unless_yaml_members_or_roles_change(self):
+        snapshot, teams, files = self.create_tree(3)
+
+        self.assertEqual(self.run_sync(snapshot, teams, files), files)
+        self.assertEqual(self.run_sync(snapshot, teams, files, workers=2), [])
+
+        self.write_file(files[0], self.read_file(files[0]) + 'cd: {}\n')
+        teams['repo1-developers'].append('newcomer')
+        snapshot.team_repo_roles['repo2'].append(
+            {'team': 'Security', 'role': 'Admin'})
+        self.assertEqual(self.run_sync(snapshot, teams, files), files)
+
+        self.assertEqual(self.run_sync(snapshot, teams, files), [])
+        self.assertEqual(self.run_sync(snapshot, teams, files, full=True),
+                         files)
+
+    def test_unchanged_files_and_groups_are_not_merged(self):
+        snapshot, teams, files = self.create_tree(2)
+        files.append(self.write_file(
+            'submodules/RPU/permissions/plugin-1-extra.yml',
+            '---\ngithub: "jenkinsci/repo1"\ndevelopers:\n  - "other"\n'))
+        self.assertEqual(self.run_sync(snapshot, teams, files), files)
+
+        with patch.object(SyncMain, 'sync_team') as mock_sync:
+            self.assertEqual(self.run_sync(snapshot, teams, files), [])
+        mock_sync.assert_not_called()
+
+        # one file of the repo changed: the whole group is merged again
+        self.write_file(files[2], self.read_file(files[2]) + 'cd: {}\n')
+        self.assertEqual(self.run_sync(snapshot, teams, files), files[1:])
+        self.assertIn('ldap: "other"', self.read_file(files[1]))
+        self.assertEqual(self.run_sync(snapshot, teams, files), [])
+
+    def test_rerun_reads_back_filled_developers(self):
+        snapshot, teams, files = self.create_tree(1)
+        self.run_sync(snapshot, teams, files)
+        synced = self.read_file(files[0])
+
+        self.run_sync(snapshot, teams, files, full=True)
+
+        self.assertEqual(self.read_file(files[0]), synced)
+
+
+class TestRepoGroups(RpuTreeTestCase):
+
+    def test_files_of_one_repo_are_written_from_the_same_result(self):
+        snapshot, teams, files = self.create_tree(2)
+        SyncMain(FakeGitHub(teams), snapshot).run(files[1:])
+        files.append(self.write_file(
+            'submodules/RPU/permissions/plugin-1-extra.yml',
+            '---\nname: "plugin-1-extra"\ngithub: "jenkinsci/repo1"\n'
+            'developers:\n  - "newdev"\n'
+            '  - ldap: "dev1"\n    github: "dev1-old"\n'))
+        originals = {f: self.read_file(f) for f in files}
+
+        for processes in (1, 2):
+            for f, content in originals.items():
+                self.write_file(f, content)
+            github = FakeGitHub(teams)
+            sync_main = SyncMain(github, snapshot)
+            sync_main.run(files, workers=2, processes=processes)
+
+            developers = self.read_file(files[1]).split('developers:')[1]
+            self.assertEqual(
+                self.read_file(files[2]).split('developers:')[1],
+                developers)
+            self.assertIn('ldap: "newdev"', developers)
+            self.assertNotIn('dev1-old', developers)
+            self.assertEqual(github.calls['get_members'], 2)
+            self.assertEqual(sync_main.conflicts, [{
+                'repo': 'jenkinsci/repo1', 'field': 'github',
+                'values': ['dev1', 'dev1-old'],
+                'files': [files[1], files[2]]}])
+
+
+class TestDryRun(RpuTreeTestCase):
+
+    def test_reports_changes_without_writing(self):
+        snapshot, teams, files = self.create_tree(2)
+        teams['repo1-developers'] = ['Dev1']
+        originals = {f: self.read_file(f) for f in files}
+
+        sync_main = SyncMain(FakeGitHub(teams), snapshot, dry_run=True,
+                             state=SyncState.load('state.json'))
+        sync_main.run(files)
+
+        self.assertEqual({f: self.read_file(f) for f in files}, originals)
+        self.assertFalse(os.path.exists('state.json'))
+        first, second = sync_main.report.files
+        self.assertEqual(first['developers_added'], ['extra0'])
+        self.assertEqual(first['github_merged'],
+                         [{'ldap': 'dev0', 'github': 'dev0'}])
+        self.assertEqual(first['repository_team'],
+                         {'before': None, 'after': 'repo0 Developers'})
+        self.assertEqual(first['additional_github_teams']['added'],
+                         [{'team': 'Core', 'role': 'Write'},
+                          {'team': 'SIG: UX', 'role': 'Read'}])
+        self.assertEqual(second['developers_added'], [])
+        self.assertEqual(second['github_merged'],
+                         [{'ldap': 'dev1', 'github': 'Dev1'}])
+        self.assertEqual(sync_main.report.summary()['changed'], 2)
+
+        SyncMain(FakeGitHub(teams), snapshot).run(files)
+        sync_main = SyncMain(FakeGitHub(teams), snapshot, dry_run=True)
+        sync_main.run(files)
+        self.assertEqual(sync_main.report.summary()['changed'], 0)
+        self.assertEqual(sync_main.file_counts['unchanged'], 2)
+
+
+class TestTeamFileIndex(RpuTreeTestCase):
+
+    def test_run_indexes_teams_referenced_by_each_file(self):
+        snapshot, teams, files = self.create_tree(2)
+        team_index = TeamFileIndex('index.json')
+
+        SyncMain(FakeGitHub(teams), snapshot, team_index=team_index).run(
+            files, processes=2)
+        SyncMain(FakeGitHub(teams), snapshot, team_index=team_index).run(
+            files[:1])
+
+        reloaded = TeamFileIndex.load('index.json')
+        self.assertEqual(reloaded.get_files('repo1-developers'), files[1:])
+        self.assertEqual(reloaded.get_files('sig-ux'), files)
+        self.assertEqual(reloaded.files[files[0]],
+                         ['core', 'repo0-developers', 'sig-ux'])
+
+        reloaded.prune(files[1:])
+        self.assertEqual(reloaded.get_files('core'), files[1:])
+
+
+class TestGraphQLMembershipFetcher(unittest.TestCase):
+
+    def test_fetch_pages_through_members_and_skips_missing_teams(self):
+        session = FakeGraphQLSession({'a': ['u1', 'u2', 'u3'], 'b': []})
+        fetcher = GraphQLMembershipFetcher('token', session,
+                                           teams_per_request=2, page_size=2)
+
+        members = fetcher.fetch('jenkinsci', ['a', 'b', 'missing', 'a'])
+
+        self.assertEqual(members, {'a': ['u1', 'u2', 'u3'], 'b': []})
+        self.assertEqual(fetcher.requests_made, 2)
+
+
+class TestRateLimitGate(unittest.TestCase):
+
+    def test_pauses_pool_when_budget_is_low(self):
+        github = FakeGitHub(rate_limit=10, reset_time=100)
+        sleeps = []
+        gate = RateLimitGate(github, min_remaining=9, sleep=sleeps.append,
+                             clock=lambda: 40)
+
+        gate.call(github.request, 'get_members')
+        self.assertEqual(gate.paused_until, 101)
+
+        gate.call(github.request, 'get_members')
+        self.assertEqual(sleeps, [61])
+
 
 if __name__ == '__main__':
     unittest.main()
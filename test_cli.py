@@ -0,0 +1,46 @@
+import logging
+import os
+import subprocess
+import sys
+import unittest
+from unittest.mock import patch
+
+import cli
+from test_backfill_to_yaml import RpuTreeTestCase
+
+
+class TestCli(RpuTreeTestCase):
+
+    def test_dispatches_with_log_level(self):
+        self.write_file('submodules/RPU/permissions/plugin-0.yml',
+                        'github: "jenkinsci/repo0"\ndevelopers:\n  - "a"\n')
+        self.write_file('all_teams.json', '{"Core": "core"}')
+        self.write_file('team_repo_roles.json', '{}')
+
+        with patch('cli.configure_logging') as mock_logging:
+            report = cli.main(['-q', 'report', '--output', 'out'])
+        mock_logging.assert_called_once_with(logging.WARNING)
+        self.assertEqual(report['github_teams'], ['Core'])
+        self.assertTrue(os.path.exists('out/reconciliation.json'))
+
+        with patch('cli.configure_logging') as mock_logging, \
+                patch('benchmarks.bench_slugs.main') as mock_bench:
+            cli.main(['-vv', 'bench', 'slugs', '--rounds', '1'])
+        mock_logging.assert_called_once_with(logging.DEBUG)
+        mock_bench.assert_called_once_with(['--rounds', '1'])
+
+    def test_report_runs_without_pygithub(self):
+        self.write_file('all_teams.json', '{}')
+        self.write_file('team_repo_roles.json', '{}')
+        root = os.path.dirname(os.path.abspath(cli.__file__))
+        output = subprocess.run(
+            [sys.executable, '-c',
+             'import sys, cli; cli.main(["-qq", "report"]); '
+             'print("github" in sys.modules)'],
+            env=dict(os.environ, PYTHONPATH=root), check=True,
+            capture_output=True, text=True).stdout
+        self.assertEqual(output.strip(), 'False')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,80 @@
+import json
+import os
+import tempfile
+import time
+import unittest
+from unittest.mock import MagicMock
+
+from fetch_team_and_role import FetchAdditionalTeams, load_checkpoint
+
+
+def mock_team(name, repos):
+    team = MagicMock()
+    team.name = name
+    repo_mocks = []
+    for repo_name, push in repos:
+        repo = MagicMock(permissions=MagicMock(
+            admin=False, maintain=False, push=push, triage=False, pull=True))
+        repo.name = repo_name
+        repo_mocks.append(repo)
+    team.get_repos.return_value = repo_mocks
+    return team
+
+
+class TestFetchAdditionalTeams(unittest.TestCase):
+
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.checkpoint_path = os.path.join(tmp.name, 'checkpoint.jsonl')
+        self.output_path = os.path.join(tmp.name, 'team_repo_roles.json')
+        self.github_client = MagicMock(per_page=30)
+        self.core = mock_team('Core', [('repo-a', True), ('repo-b', True)])
+        self.readers = mock_team('Readers', [('repo-a', False)])
+        self.github_client.get_organization.return_value.get_teams \
+            .return_value = [self.core, self.readers]
+
+    def test_reads_roles_from_listing_and_resumes(self):
+        with open(self.checkpoint_path, 'w') as file:
+            file.write(json.dumps({'team': 'Core',
+                                   'repos': [['repo-a', 'Write']]}) + '\n')
+            file.write('{"team": "Rea')
+
+        FetchAdditionalTeams(self.github_client).get_teams_and_roles(
+            workers=2, checkpoint_path=self.checkpoint_path,
+            output_path=self.output_path)
+
+        self.core.get_repos.assert_not_called()
+        self.readers.get_repo_permission.assert_not_called()
+        with open(self.output_path) as file:
+            self.assertEqual(json.load(file), {
+                'repo-a': [{'team': 'Core', 'role': 'Write'},
+                           {'team': 'Readers', 'role': 'Read'}]})
+        self.assertFalse(os.path.exists(self.checkpoint_path))
+
+    def test_failure_stops_queued_fetches_and_keeps_finished_ones(self):
+        self.core.get_repos.side_effect = RuntimeError('rate limited')
+        teams = [mock_team(f'Team {i}', [('repo-c', True)])
+                 for i in range(20)]
+        for team in teams:
+            team.get_repos.side_effect = \
+                lambda repos=team.get_repos.return_value: \
+                time.sleep(0.05) or repos
+        self.github_client.get_organization.return_value.get_teams \
+            .return_value = [self.core] + teams
+
+        self.assertRaises(
+            RuntimeError,
+            FetchAdditionalTeams(self.github_client).get_teams_and_roles,
+            workers=1, checkpoint_path=self.checkpoint_path,
+            output_path=self.output_path)
+
+        fetched = [team.name for team in teams if team.get_repos.called]
+        self.assertLess(len(fetched), len(teams))
+        self.assertEqual(list(load_checkpoint(self.checkpoint_path)),
+                         fetched)
+        self.assertFalse(os.path.exists(self.output_path))
+
+
+if __name__ == '__main__':
+    unittest.main()
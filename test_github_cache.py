@@ -0,0 +1,135 @@
+import os
+import tempfile
+import unittest
+
+from github import RateLimitExceededException, UnknownObjectException
+
+from backfill_to_yaml import TeamMerger
+from fake_github import FakeResponse, FakeRestSession
+from fetch_team_and_role import permissions_to_role
+from github_cache import CacheMissError, CachedGitHubClient, \
+    ResponseCache, raise_for_status
+from instrumentation import metrics
+from rate_limit import RateLimitGate
+from team_snapshot import TeamSnapshot
+
+
+class TestCachedGitHubClient(unittest.TestCase):
+
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.now = 1000
+        self.cache = ResponseCache(os.path.join(tmp.name, 'cache.sqlite'),
+                                   ttl=60, clock=lambda: self.now)
+        self.addCleanup(self.cache.close)
+        self.session = FakeRestSession({
+            '/orgs/org/teams': [
+                {'name': 'Core', 'slug': 'core'},
+                {'name': 'SIG: UX', 'slug': 'sig-ux'}],
+            '/orgs/org/teams/core': {'name': 'Core', 'slug': 'core'},
+            '/orgs/org/teams/core/members': [
+                {'login': 'alice'}, {'login': 'bob'}, {'login': 'carol'}],
+            '/orgs/org/teams/core/repos': [
+                {'name': 'repo', 'permissions': {'pull': True,
+                                                 'push': True}}],
+        })
+
+    def client(self, offline=False, reuse_members=False):
+        return CachedGitHubClient('token', self.cache, self.session,
+                                  offline=offline, per_page=2,
+                                  reuse_members=reuse_members)
+
+    def test_revalidates_with_etag(self):
+        team = self.client().get_organization('org').get_team_by_slug('core')
+        self.assertEqual([m.login for m in team.get_members()],
+                         ['alice', 'bob', 'carol'])
+
+        client = self.client()
+        team = client.get_organization('org').get_team_by_slug('core')
+        self.assertEqual([m.login for m in team.get_members()],
+                         ['alice', 'bob', 'carol'])
+        self.assertEqual(client.requests_made, 3)
+        self.assertEqual(client.not_modified, 3)
+        self.assertEqual(client.rate_limiting, (4999, 5000))
+
+    def test_rate_limited_get_is_retried_by_the_gate(self):
+        answer = self.session.get
+        exhausted = [FakeResponse(
+            {'message': 'API rate limit exceeded'}, 403,
+            {'X-RateLimit-Remaining': '0', 'X-RateLimit-Limit': '5000',
+             'X-RateLimit-Reset': '2000'})]
+        self.session.get = lambda url, headers=None: \
+            exhausted.pop() if exhausted else answer(url, headers)
+        client = self.client()
+        sleeps = []
+        gate = RateLimitGate(client, sleep=sleeps.append,
+                             clock=lambda: self.now)
+
+        team = gate.call(client.get_json, '/orgs/org/teams/core')
+
+        self.assertEqual(team['slug'], 'core')
+        self.assertEqual(client.requests_made, 2)
+        self.assertEqual(sleeps, [1001])
+        self.assertRaises(RateLimitExceededException, raise_for_status, 429,
+                          None, {'X-RateLimit-Remaining': '0'})
+
+    def test_offline_serves_only_cached_data(self):
+        org = self.client().get_organization('org')
+        self.assertEqual([t.slug for t in org.get_teams()],
+                         ['core', 'sig-ux'])
+        requests_before = len(self.session.requests)
+
+        org = self.client(offline=True).get_organization('org')
+        self.assertEqual([t.name for t in org.get_teams()],
+                         ['Core', 'SIG: UX'])
+        self.assertRaises(CacheMissError, org.get_team_by_slug, 'core')
+        self.assertEqual(len(self.session.requests), requests_before)
+
+    def test_repo_permissions_come_from_listing(self):
+        team = self.client().get_organization('org').get_team_by_slug('core')
+        repo = team.get_repos()[0]
+        self.assertEqual(permissions_to_role(team.get_repo_permission(repo)),
+                         'Write')
+
+    def test_missing_team_and_ttl_eviction(self):
+        org = self.client().get_organization('org')
+        self.assertRaises(UnknownObjectException, org.get_team_by_slug,
+                          'missing')
+        org.get_team_by_slug('core')
+
+        self.now += 61
+        self.assertEqual(self.cache.evict_expired(), 1)
+        self.assertRaises(CacheMissError, self.client(offline=True)
+                          .get_organization('org').get_team_by_slug, 'core')
+
+    def test_unchanged_team_reuses_stored_member_list(self):
+        self.session.routes['/orgs/org/teams/core'].update(
+            members_count=3, updated_at='2024-01-01T00:00:00Z')
+        metrics.reset()
+        self.addCleanup(metrics.reset)
+
+        def fetch():
+            client = self.client(reuse_members=True)
+            requests_before = len(self.session.requests)
+            logins = TeamMerger(client, TeamSnapshot({}, {})) \
+                .fetch_member_logins('org', 'core')
+            return logins, len(self.session.requests) - requests_before
+
+        self.assertEqual(fetch(), (['alice', 'bob', 'carol'], 3))
+        self.assertEqual(metrics.teams['org/core']['pages'], 2)
+        self.assertGreater(metrics.teams['org/core']['bytes'], 0)
+
+        # only the team itself is revalidated
+        self.assertEqual(fetch(), (['alice', 'bob', 'carol'], 1))
+        self.assertEqual(metrics.teams['org/core'],
+                         {'pages': 0, 'bytes': 0, 'reused': True})
+
+        self.session.routes['/orgs/org/teams/core']['members_count'] = 4
+        self.session.routes['/orgs/org/teams/core/members'].append(
+            {'login': 'dave'})
+        self.assertEqual(fetch(), (['alice', 'bob', 'carol', 'dave'], 3))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,64 @@
+import os
+import tempfile
+import unittest
+
+from backfill_to_yaml import TeamMerger
+from fake_github import FakeGitHub
+from instrumentation import Metrics, metrics
+from team_snapshot import TeamSnapshot
+from yaml_definitions import DeveloperInfo, RepoYamlDefinition
+
+
+class TestMetrics(unittest.TestCase):
+
+    def setUp(self):
+        metrics.reset()
+        self.addCleanup(metrics.reset)
+
+    def test_counts_stages_and_member_pages(self):
+        snapshot = TeamSnapshot(
+            {'repo Developers': 'repo-developers'},
+            {'repo': [{'team': 'repo Developers', 'role': 'Admin'}]})
+        github = FakeGitHub({'repo-developers': ['a', 'b', 'c']}, per_page=2)
+        metrics.record_rate_limit(github)
+
+        TeamMerger(github, snapshot).sync_repository_team(RepoYamlDefinition(
+            None, [DeveloperInfo('a', None)], 'org', 'repo', set()))
+        metrics.record_rate_limit(github)
+
+        data = metrics.to_dict()
+        self.assertEqual(data['api_calls'], {'get_organization': 1,
+                                             'get_team_by_slug': 1,
+                                             'get_members': 2})
+        self.assertEqual(data['rate_limit_used'], 4)
+        self.assertEqual(set(data['stages']), {'sync_repository_team',
+                                               'merge_github_developers'})
+        self.assertIn('get_members', metrics.summary_table())
+
+    def test_prometheus_buckets_are_cumulative(self):
+        worker = Metrics()
+        worker.observe('yaml_writer', 0.002)
+        worker.observe('yaml_writer', 2)
+        metrics.merge(worker.to_dict())
+        metrics.count_call('graphql', 3)
+
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'metrics.prom')
+            metrics.write_prometheus(path)
+            with open(path) as file:
+                lines = file.read().splitlines()
+
+        self.assertIn('rpu_sync_stage_seconds_bucket'
+                      '{stage="yaml_writer",le="0.001"} 0', lines)
+        self.assertIn('rpu_sync_stage_seconds_bucket'
+                      '{stage="yaml_writer",le="0.005"} 1', lines)
+        self.assertIn('rpu_sync_stage_seconds_bucket'
+                      '{stage="yaml_writer",le="+Inf"} 2', lines)
+        self.assertIn('rpu_sync_stage_seconds_count{stage="yaml_writer"} 2',
+                      lines)
+        self.assertIn('rpu_sync_github_calls_total{endpoint="graphql"} 3',
+                      lines)
+
+
+if __name__ == '__main__':
+    unittest.main()
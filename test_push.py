@@ -0,0 +1,104 @@
+import unittest
+
+import requests
+
+from fake_github import FakeGitHubServer
+from github_cache import CachedGitHubClient, ResponseCache
+from push import PushEngine
+from team_snapshot import TeamSnapshot
+from test_backfill_to_yaml import RpuTreeTestCase
+
+
+class TestPushEngine(RpuTreeTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.snapshot = TeamSnapshot(
+            {'repo0 Developers': 'repo0-developers', 'Core': 'core',
+             'SIG: UX': 'sig-ux'},
+            # stale: the repo teams on GitHub are what is diffed
+            {'repo0': [{'team': 'repo0 Developers', 'role': 'Admin'},
+                       {'team': 'Core', 'role': 'Admin'}]})
+        self.routes = {
+            '/orgs/jenkinsci/teams/repo0-developers': {
+                'name': 'repo0 Developers', 'slug': 'repo0-developers'},
+            '/orgs/jenkinsci/teams/repo0-developers/members': [
+                {'login': 'Dev0'}, {'login': 'keeper'}, {'login': 'gone'},
+                {'login': 'shared'}],
+            '/orgs/jenkinsci/teams/core': {'name': 'Core', 'slug': 'core'},
+            '/orgs/jenkinsci/teams/sig-ux': {'name': 'SIG: UX',
+                                             'slug': 'sig-ux'},
+            '/orgs/jenkinsci/teams/sig-ux/repos': [
+                {'name': 'repo0', 'permissions': {'pull': True}}],
+            '/repos/jenkinsci/repo0/teams': [
+                {'name': 'repo0 Developers', 'slug': 'repo0-developers',
+                 'permission': 'admin'},
+                {'name': 'Core', 'slug': 'core', 'permission': 'push'},
+                {'name': 'SIG: UX', 'slug': 'sig-ux', 'permission': 'pull'}],
+        }
+        self.files = [
+            self.write_file(
+                'submodules/RPU/permissions/plugin-0.yml',
+                '---\ngithub: "jenkinsci/repo0"\ndevelopers:\n'
+                '  - ldap: "dev0"\n    github: "dev0"\n'
+                '  - github: "newbie"\n'
+                '  - "keeper"\n'
+                'additional_github_teams:\n'
+                '  - team: "Core"\n    role: "Admin"\n'),
+            self.write_file(
+                'submodules/RPU/permissions/plugin-0-extra.yml',
+                '---\ngithub: "jenkinsci/repo0"\ndevelopers:\n'
+                '  - github: "shared"\n')]
+
+    def engine(self, server):
+        client = CachedGitHubClient('token', ResponseCache(':memory:'),
+                                    requests.Session(),
+                                    base_url=server.base_url)
+        return PushEngine(client, self.snapshot, workers=2, batch_size=2)
+
+    def test_plans_minimal_diff_and_applies_it(self):
+        with FakeGitHubServer(self.routes) as server:
+            operations = self.engine(server).plan(self.files)
+            self.assertEqual(server.writes, [])
+            self.assertEqual(
+                sorted((op['action'], op['team'], op['target'])
+                       for op in operations),
+                [('add_member', 'repo0-developers', 'newbie'),
+                 ('remove_member', 'repo0-developers', 'gone'),
+                 ('remove_repo', 'sig-ux', 'repo0'),
+                 ('set_repo_permission', 'core', 'repo0')])
+
+            results = self.engine(server).apply(operations)
+
+            self.assertEqual({result['status'] for result in results},
+                             {'applied'})
+            self.assertEqual(
+                [member['login'] for member in self.routes[
+                    '/orgs/jenkinsci/teams/repo0-developers/members']],
+                ['Dev0', 'keeper', 'shared', 'newbie'])
+            self.assertTrue(self.routes['/orgs/jenkinsci/teams/core/repos']
+                            [0]['permissions']['admin'])
+            self.assertEqual(
+                self.routes['/orgs/jenkinsci/teams/sig-ux/repos'], [])
+            self.assertEqual(self.engine(server).plan(self.files), [])
+
+    def test_keeps_members_while_a_developer_is_unresolved(self):
+        # "Dev0 Ldap" is GitHub's Dev0, which the YAML does not know yet
+        self.write_file(self.files[0],
+                        '---\ngithub: "jenkinsci/repo0"\ndevelopers:\n'
+                        '  - "Dev0 Ldap"\n'
+                        '  - github: "newbie"\n')
+        with FakeGitHubServer(self.routes) as server:
+            engine = self.engine(server)
+            operations = engine.plan(self.files)
+
+        self.assertEqual([(op['action'], op['target']) for op in operations],
+                         [('add_member', 'newbie')])
+        self.assertEqual([entry['ldap'] for entry in engine.unresolved],
+                         ['Dev0 Ldap'])
+        self.assertEqual(len(engine.skipped), 1)
+        self.assertIn('not removing 3 members', engine.skipped[0]['reason'])
+
+
+if __name__ == '__main__':
+    unittest.main()
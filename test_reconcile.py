@@ -0,0 +1,47 @@
+import json
+import unittest
+
+from reconcile import main
+from test_backfill_to_yaml import RpuTreeTestCase
+
+
+class TestReconcile(RpuTreeTestCase):
+
+    def test_lists_teams_and_repos_missing_on_either_side(self):
+        with open('all_teams.json', 'w') as file:
+            json.dump({'repo0 Developers': 'repo0-developers', 'Core': 'core',
+                       'Lonely': 'lonely', 'Gone Developers': 'gone'}, file)
+        with open('team_repo_roles.json', 'w') as file:
+            json.dump({'repo0': [{'team': 'repo0 Developers', 'role': 'Admin'},
+                                 {'team': 'Core', 'role': 'Write'}],
+                       'gone': [{'team': 'Gone Developers', 'role': 'Admin'}]},
+                      file)
+        self.write_file('submodules/RPU/permissions/plugin-0.yml',
+                        'github: "jenkinsci/repo0"\ndevelopers:\n  - "a"\n')
+        self.write_file('submodules/RPU/permissions/plugin-1.yml',
+                        'github: "jenkinsci/repo1"\ndevelopers:\n  - "b"\n')
+        self.write_file('submodules/RPU/permissions/plugin-2.yml',
+                        'github: "jenkinsci/repo2"\ndevelopers: []\n')
+        self.write_file('submodules/RPU/teams/ux.yml',
+                        'name: "ux"\ndevelopers:\n  - "c"\n')
+        self.write_file('submodules/RPU/teams/broken.yml', 'name: [\n')
+
+        report = main([])
+
+        self.assertEqual(report['github_teams'],
+                         ['Core', 'Gone Developers', 'Lonely'])
+        self.assertEqual(report['yaml_teams'], ['repo1 Developers', 'ux'])
+        self.assertEqual(report['orphaned_teams'], ['Lonely'])
+        self.assertEqual(report['repos_without_yaml'], ['gone'])
+        self.assertEqual(report['repos_without_teams'], ['repo1', 'repo2'])
+        self.assertEqual(report['repo_coverage']['covered'], 1)
+        self.assertEqual(report['unreadable_files'],
+                         ['submodules/RPU/teams/broken.yml'])
+        lines = self.read_file('others/yaml_teams.txt').splitlines()
+        self.assertEqual(lines[2:], ['repo1 Developers', 'ux'])
+        with open('others/reconciliation.json') as file:
+            self.assertEqual(json.load(file), report)
+
+
+if __name__ == '__main__':
+    unittest.main()
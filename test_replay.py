@@ -0,0 +1,64 @@
+import gzip
+import json
+import unittest
+
+from backfill_to_yaml import SyncMain
+from bulk_membership import GraphQLMembershipFetcher
+from fake_github import FakeGraphQLSession, FakeRestSession
+from github_cache import create_github_client
+from replay import RecordingSession, ReplayMissError, ReplaySession
+from test_backfill_to_yaml import RpuTreeTestCase
+
+
+class TestRecordReplay(RpuTreeTestCase):
+
+    def test_replayed_run_matches_recorded_run(self):
+        snapshot, teams, files = self.create_tree(3)
+        originals = {f: self.read_file(f) for f in files}
+        routes = {}
+        for slug, logins in teams.items():
+            routes[f'/orgs/jenkinsci/teams/{slug}'] = {'name': slug,
+                                                       'slug': slug}
+            routes[f'/orgs/jenkinsci/teams/{slug}/members'] = [
+                {'login': login} for login in logins]
+
+        recording = RecordingSession('run.json.gz', FakeRestSession(routes))
+        SyncMain(create_github_client('token', session=recording),
+                 snapshot).run(files, workers=2)
+        recording.close()
+        recorded = {f: self.read_file(f) for f in files}
+
+        for f, content in originals.items():
+            self.write_file(f, content)
+        replay = ReplaySession.load('run.json.gz')
+        client = create_github_client(None, session=replay)
+        SyncMain(client, snapshot).run(files, workers=2)
+
+        self.assertEqual({f: self.read_file(f) for f in files}, recorded)
+        self.assertEqual(client.rate_limiting, (4999, 5000))
+        self.assertRaises(ReplayMissError, client.get_json, '/orgs/other')
+        with gzip.open('run.json.gz', 'rt') as file:
+            recorded_json = file.read()
+        self.assertNotIn('token', recorded_json)
+        self.assertNotIn('Authorization', recorded_json)
+        for answers in json.loads(recorded_json).values():
+            for answer in answers:
+                self.assertNotIn('Authorization', answer['headers'])
+
+    def test_replays_graphql_queries(self):
+        teams = {'a': ['u1', 'u2', 'u3'], 'b': []}
+        recording = RecordingSession('graphql.json.gz',
+                                     FakeGraphQLSession(teams))
+        GraphQLMembershipFetcher('token', recording, page_size=2).fetch(
+            'jenkinsci', ['a', 'b'])
+        recording.close()
+
+        fetcher = GraphQLMembershipFetcher(
+            None, ReplaySession.load('graphql.json.gz'), page_size=2)
+
+        self.assertEqual(fetcher.fetch('jenkinsci', ['a', 'b']), teams)
+        self.assertEqual(fetcher.requests_made, 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,74 @@
+import json
+import logging
+import os
+import pickle
+import tempfile
+import unittest
+from unittest.mock import patch
+
+import cli
+from roles_store import RolesStore, export_json, import_json
+from team_snapshot import TeamSnapshot
+
+
+class TestRolesStore(unittest.TestCase):
+
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.json_path = os.path.join(tmp.name, 'team_repo_roles.json')
+        self.store_path = os.path.join(tmp.name, 'team_repo_roles.sqlite')
+        self.all_teams_path = os.path.join(tmp.name, 'all_teams.json')
+        self.team_repo_roles = {
+            'repo-b': [{'team': 'repo-b Developers', 'role': 'Admin'},
+                       {'team': 'Core', 'role': 'Write'}],
+            'repo-a': [{'team': 'Core', 'role': 'Read'}],
+        }
+        with open(self.json_path, 'w') as file:
+            json.dump(self.team_repo_roles, file)
+        with open(self.all_teams_path, 'w') as file:
+            json.dump({'Core': 'core'}, file)
+
+    def test_round_trip_and_lookups(self):
+        store = import_json(self.json_path, self.store_path)
+        self.addCleanup(store.close)
+
+        self.assertEqual(store.get('repo-b'), self.team_repo_roles['repo-b'])
+        self.assertEqual(store.get('missing', []), [])
+        self.assertIn('repo-a', store)
+        self.assertEqual(len(store), 2)
+        self.assertEqual(store.get_team_repos('Core'),
+                         [('repo-a', 'Read'), ('repo-b', 'Write')])
+        self.assertEqual(pickle.loads(pickle.dumps(store)).get('repo-a'),
+                         self.team_repo_roles['repo-a'])
+
+        export_json(self.store_path, self.json_path)
+        with open(self.json_path) as file:
+            self.assertEqual(json.load(file), self.team_repo_roles)
+
+    def test_cli_command_logs_the_conversion(self):
+        with patch('cli.configure_logging') as mock_logging, \
+                self.assertLogs('roles_store', logging.INFO) as logs:
+            cli.main(['roles', 'import', '--json', self.json_path,
+                      '--store', self.store_path])
+
+        mock_logging.assert_called_once_with(logging.INFO)
+        self.assertEqual(logs.output, [f'INFO:roles_store:Imported 2 repos '
+                                       f'into {self.store_path}'])
+        store = RolesStore(self.store_path)
+        self.addCleanup(store.close)
+        self.assertEqual(len(store), 2)
+
+    def test_snapshot_reads_store(self):
+        import_json(self.json_path, self.store_path).close()
+
+        snapshot = TeamSnapshot.load(self.all_teams_path, self.store_path)
+
+        self.assertIsInstance(snapshot.team_repo_roles, RolesStore)
+        self.assertEqual(snapshot.get_repo_roles('repo-a'),
+                         [{'team': 'Core', 'role': 'Read'}])
+        self.assertEqual(snapshot.get_repo_roles('missing'), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
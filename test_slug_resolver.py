@@ -0,0 +1,44 @@
+import pickle
+import unittest
+
+from slug_resolver import SlugResolver, normalize
+
+
+class TestSlugResolver(unittest.TestCase):
+
+    def setUp(self):
+        self.resolver = SlugResolver({
+            'SIG: UX': 'sig-ux',
+            'Core': 'core',
+            'ux-widget Developers': 'ux-widget-developers',
+            'Docs Team': 'docs'})
+
+    def test_resolves_both_ways_and_caches(self):
+        self.assertEqual(self.resolver.to_slug('SIG: UX'), 'sig-ux')
+        self.assertEqual(self.resolver.to_slug('New  Team!'), 'new-team')
+        self.assertEqual(self.resolver.to_slug('New  Team!'), 'new-team')
+        self.assertEqual(self.resolver.to_slug.cache_info().hits, 1)
+        self.assertEqual(self.resolver.to_name('docs'), 'Docs Team')
+        self.assertIsNone(self.resolver.to_name('missing'))
+
+    def test_normalize_matches_github_slug_rules(self):
+        self.assertEqual(normalize(' A - b!_c\tD '), 'a-b_c-d')
+        self.assertEqual(normalize('a !b'), 'a-b')
+        self.assertEqual(normalize('--'), '')
+
+    def test_candidates_for_near_misses(self):
+        self.assertEqual(self.resolver.candidates('ux')[:2],
+                         ['SIG: UX', 'ux-widget Developers'])
+        self.assertEqual(self.resolver.candidates('cor'), ['Core'])
+        self.assertEqual(self.resolver.candidates('docs'), ['Docs Team'])
+        self.assertEqual(self.resolver.candidates('zzz'), [])
+
+    def test_pickles_without_cache(self):
+        self.resolver.to_slug('Core')
+        copy = pickle.loads(pickle.dumps(self.resolver))
+        self.assertEqual(copy.to_slug('SIG: UX'), 'sig-ux')
+        self.assertEqual(copy.to_slug.cache_info().currsize, 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
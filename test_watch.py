@@ -0,0 +1,84 @@
+import threading
+import time
+import unittest
+from unittest.mock import patch
+
+from backfill_to_yaml import SyncMain
+from fake_github import FakeGitHub
+from test_backfill_to_yaml import RpuTreeTestCase
+from watch import SyncWatcher
+
+
+class TestSyncWatcher(RpuTreeTestCase):
+
+    def watcher(self, github, snapshot):
+        return SyncWatcher(github, snapshot, workers=2, interval=0.02,
+                           refresh_interval=3600)
+
+    def add_developer(self, path, ldap):
+        self.write_file(path, self.read_file(path).replace(
+            'developers:\n', f'developers:\n  - "{ldap}"\n'))
+
+    def test_syncs_changed_files_from_warm_members(self):
+        snapshot, teams, files = self.create_tree(3)
+        github = FakeGitHub(teams)
+        watcher = self.watcher(github, snapshot)
+        self.assertEqual(watcher.start().file_counts, {'written': 3})
+        self.assertIsNone(watcher.poll())
+
+        self.add_developer(files[0], 'newbie')
+        sync_main = watcher.poll()
+
+        self.assertEqual(sync_main.file_counts, {'written': 1})
+        self.assertIn('ldap: "newbie"', self.read_file(files[0]))
+        self.assertEqual(github.calls['get_members'], 3)
+        self.assertIsNone(watcher.poll())
+
+        # a second file of repo2 is synced together with the first one
+        extra = self.write_file('submodules/RPU/permissions/plugin-2b.yml',
+                                '---\ngithub: "jenkinsci/repo2"\n'
+                                'developers:\n  - "other"\n')
+        self.assertEqual(set(watcher.poll().file_status), {files[2], extra})
+        self.assertIn('ldap: "other"', self.read_file(files[2]))
+
+        teams['repo1-developers'].append('late')
+        before = self.read_file(files[0])
+        self.assertEqual(list(watcher.refresh().file_status), [files[1]])
+        self.assertIn('github: "late"', self.read_file(files[1]))
+        self.assertEqual(self.read_file(files[0]), before)
+
+    def test_failed_sync_is_retried_on_next_poll(self):
+        snapshot, teams, files = self.create_tree(2)
+        watcher = self.watcher(FakeGitHub(teams), snapshot)
+        watcher.start()
+
+        self.add_developer(files[0], 'retry')
+        with patch.object(SyncMain, 'run',
+                          side_effect=RuntimeError('GitHub is down')):
+            watcher.poll()
+        self.assertNotIn('ldap: "retry"', self.read_file(files[0]))
+
+        self.assertEqual(watcher.poll().file_counts, {'written': 1})
+        self.assertIn('ldap: "retry"', self.read_file(files[0]))
+        self.assertIsNone(watcher.poll())
+
+    def test_run_syncs_edits_until_stopped(self):
+        # only checks the loop; benchmarks.bench_watch measures latency
+        snapshot, teams, files = self.create_tree(2)
+        watcher = self.watcher(FakeGitHub(teams), snapshot)
+        watcher.start()
+        stop = threading.Event()
+        thread = threading.Thread(target=watcher.run, args=(stop,))
+        thread.start()
+        self.addCleanup(thread.join)
+        self.addCleanup(stop.set)
+
+        deadline = time.monotonic() + 30
+        self.add_developer(files[1], 'fast')
+        while 'ldap: "fast"' not in self.read_file(files[1]):
+            self.assertLess(time.monotonic(), deadline)
+            time.sleep(0.01)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,305 @@
+import argparse
+import json
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from backfill_to_yaml import SyncMain, TeamMerger, YamlDataLoader
+from instrumentation import metrics
+from reconcile import RPU_DIRECTORIES
+from sync_state import STATE_FILE, SyncState
+from team_index import TEAM_INDEX_FILE, TeamFileIndex
+from team_snapshot import ALL_TEAMS_FILE, TEAM_REPO_ROLES_FILE, TeamSnapshot
+from yaml_definitions import RepoYamlDefinition
+
+logger = logging.getLogger(__name__)
+
+# the SyncMain file statuses of a file that needs no retry
+SYNCED_STATUSES = ("written", "unchanged", "skipped", "would_write")
+
+
+# Team members kept between syncs, handed to SyncMain as its
+# membership_fetcher: each team is read from GitHub once, and afterwards
+# only by refresh(), which runs off the sync path.
+class WarmMembership:
+    def __init__(self, github_client, snapshot, workers=4):
+        self.github_client = github_client
+        self.snapshot = snapshot
+        self.workers = workers
+        self.merger = self.create_merger()
+        self.lock = threading.Lock()
+
+    def create_merger(self):
+        from rate_limit import RateLimitGate
+        gate = RateLimitGate(self.github_client) if self.workers > 1 \
+            else None
+        return TeamMerger(self.github_client, self.snapshot, gate)
+
+    def fetch(self, org_name, team_slugs):
+        # format: {"team_slug": ["member_login"]}, missing teams are left out
+        keys = [(org_name, team_slug)
+                for team_slug in dict.fromkeys(team_slugs)]
+        with self.lock:
+            merger = self.merger
+        logins = self.fetch_keys(merger, keys)
+        return {team_slug: team_logins for (_, team_slug), team_logins in
+                zip(keys, logins) if team_logins is not None}
+
+    def fetch_keys(self, merger, keys):
+        with ThreadPoolExecutor(max_workers=max(1, self.workers)) as pool:
+            # list() re-raises the first worker exception, if any
+            return list(pool.map(
+                lambda key: merger.fetch_member_logins(*key), keys))
+
+    def refresh(self):
+        # refetches every team seen so far into a new merger, then swaps it
+        # in; returns the (org_name, team_slug) keys whose members changed
+        with self.lock:
+            old = self.merger
+            known = dict(old.fetched_members)
+        merger = self.create_merger()
+        self.fetch_keys(merger, list(known))
+        with self.lock:
+            # teams first fetched while the refresh ran
+            for key, logins in list(old.fetched_members.items()):
+                merger.fetched_members.setdefault(key, logins)
+            self.merger = merger
+        return {key for key, logins in known.items()
+                if merger.fetched_members.get(key) != logins}
+
+    def set_snapshot(self, snapshot):
+        with self.lock:
+            self.snapshot = snapshot
+            self.merger.snapshot = snapshot
+
+
+# Long-running sync next to an RPU checkout. The team snapshot and the
+# member lists stay in memory; the YAML directories are polled for files
+# whose mtime or size changed and only those, plus the other files of
+# their repo, are synced. Member lists are refreshed in the background and
+# the files of changed teams re-synced.
+class SyncWatcher:
+    def __init__(self, github_client, snapshot, directories=RPU_DIRECTORIES,
+                 aliases=None, state=None, team_index=None, workers=4,
+                 interval=0.25, refresh_interval=900, snapshot_paths=None):
+        self.github_client = github_client
+        self.snapshot = snapshot
+        self.directories = directories
+        self.aliases = aliases
+        self.state = state
+        # SyncMain keeps it up to date; refresh() looks files up in it
+        self.team_index = team_index if team_index is not None \
+            else TeamFileIndex(None)
+        self.interval = interval
+        self.refresh_interval = refresh_interval
+        # (all_teams, team_repo_roles) reloaded when either file changes
+        self.snapshot_paths = snapshot_paths
+        self.members = WarmMembership(github_client, snapshot, workers)
+        # format: {"yaml_file_path": (mtime_ns, size)}
+        self.seen = {}
+        self.snapshot_seen = self.snapshot_stamps()
+        # format: {"yaml_file_path": ("org_name", "repo_name")}
+        self.repos = {}
+        # syncs come from the poll loop and from the refresh thread
+        self.lock = threading.RLock()
+        self.started = False
+
+    def start(self):
+        # the first sync covers every file and warms the member lists
+        self.seen = scan(self.directories)
+        self.started = True
+        return self.sync(list(self.seen))
+
+    def run(self, stop=None):
+        stop = stop if stop is not None else threading.Event()
+        if not self.started:
+            self.start()
+        refresher = threading.Thread(target=self.refresh_loop, args=(stop,),
+                                     daemon=True)
+        refresher.start()
+        logger.info(f"Watching {', '.join(self.directories)} every "
+                    f"{self.interval}s")
+        while not stop.wait(self.interval):
+            try:
+                self.poll()
+            except Exception as e:
+                logger.error(f"Poll failed: {e}")
+        refresher.join()
+
+    def refresh_loop(self, stop):
+        while not stop.wait(self.refresh_interval):
+            try:
+                self.refresh()
+            except Exception as e:
+                logger.error(f"Background refresh failed: {e}")
+
+    def poll(self):
+        # one scan; returns the SyncMain of the files it synced, if any
+        current = scan(self.directories)
+        with self.lock:
+            changed = [path for path, stamp in current.items()
+                       if self.seen.get(path) != stamp]
+            for path in set(self.seen) - set(current):
+                logger.info(f"Removed: {path}")
+                self.team_index.remove(path)
+                self.repos.pop(path, None)
+            self.seen = current
+
+            snapshot_stamps = self.snapshot_stamps()
+            if snapshot_stamps != self.snapshot_seen:
+                self.snapshot_seen = snapshot_stamps
+                self.snapshot = TeamSnapshot.load(*self.snapshot_paths)
+                self.members.set_snapshot(self.snapshot)
+                # the roles of any repo may have changed
+                return self.sync(list(current))
+            if changed:
+                return self.sync(changed)
+        return None
+
+    def refresh(self):
+        start = time.perf_counter()
+        changed = self.members.refresh()
+        logger.info(f"Refreshed team members in "
+                    f"{time.perf_counter() - start:.2f}s, "
+                    f"{len(changed)} teams changed")
+        files = {path for _, team_slug in changed
+                 for path in self.team_index.get_files(team_slug)}
+        if files:
+            return self.sync(sorted(files))
+        return None
+
+    def sync(self, paths):
+        with self.lock:
+            start = time.perf_counter()
+            paths = [path for path in paths if self.read_repo(path)]
+            # the other files of the same repo are written from one team
+            repos = {self.repos[path] for path in paths
+                     if self.repos.get(path)}
+            batch = sorted(set(paths) | {path for path, repo in
+                                         self.repos.items() if repo in repos})
+            if not batch:
+                return None
+
+            metrics.reset()
+            sync_main = SyncMain(self.github_client, self.snapshot,
+                                 self.aliases,
+                                 membership_fetcher=self.members,
+                                 state=self.state, team_index=self.team_index)
+            try:
+                sync_main.run(batch)
+            except Exception as e:
+                logger.error(f"Failed to sync {len(batch)} files: {e}")
+            for path in batch:
+                if sync_main.file_status.get(path) in SYNCED_STATUSES:
+                    # the files just written are not edits to sync again
+                    self.seen[path] = stamp(path)
+                elif os.path.exists(path):
+                    # failed or never reached: the next poll retries it
+                    self.seen.pop(path, None)
+            logger.info(f"Synced {len(batch)} files in "
+                        f"{time.perf_counter() - start:.3f}s")
+            return sync_main
+
+    def read_repo(self, path):
+        # False for a file that is gone or cannot be parsed (yet), e.g. an
+        # editor's half-written save; the next change picks it up again
+        try:
+            team = YamlDataLoader.peek_team(path)
+        except Exception as e:
+            logger.error(f"Skipping {path}: {e}")
+            return False
+        self.repos[path] = (team.org_name, team.repo_name) if isinstance(
+            team, RepoYamlDefinition) and team.repo_name else None
+        return True
+
+    def snapshot_stamps(self):
+        if self.snapshot_paths is None:
+            return None
+        return [stamp(path) for path in self.snapshot_paths]
+
+
+def stamp(path):
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return stat.st_mtime_ns, stat.st_size
+
+
+def scan(directories):
+    # format: {"yaml_file_path": (mtime_ns, size)}
+    stamps = {}
+    for directory in directories:
+        if not os.path.exists(directory):
+            continue
+        with os.scandir(directory) as entries:
+            for entry in entries:
+                if entry.name.endswith('.yml') and entry.is_file():
+                    stat = entry.stat()
+                    stamps[os.path.join(directory, entry.name)] = \
+                        (stat.st_mtime_ns, stat.st_size)
+    return stamps
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Keep the RPU YAML synced with GitHub: re-sync files "
+                    "as they change and refresh team members on a "
+                    "schedule.")
+    parser.add_argument("--interval", type=float, default=0.25,
+                        help="seconds between scans of the YAML "
+                             "directories")
+    parser.add_argument("--refresh", type=float, default=900,
+                        help="seconds between refreshes of the team "
+                             "members")
+    parser.add_argument("--workers", type=int, default=4,
+                        help="number of concurrent GitHub lookups")
+    parser.add_argument("--aliases",
+                        help="JSON file mapping LDAP names to GitHub logins")
+    parser.add_argument("--cache",
+                        help="cache GitHub responses in this SQLite file")
+    parser.add_argument("--roles", default=TEAM_REPO_ROLES_FILE,
+                        help="team_repo_roles as JSON or as a .sqlite store")
+    parser.add_argument("--state", default=STATE_FILE,
+                        help="file recording what the last sync saw")
+    parser.add_argument("--team-index", default=TEAM_INDEX_FILE,
+                        help="file mapping team slugs to the YAML files "
+                             "referencing them")
+    options = parser.parse_args(argv)
+
+    github_token = os.getenv("GITHUB_OAUTH")
+    if not github_token:
+        raise EnvironmentError(
+            "GitHub OAuth token is not set in the environment variables.")
+    from github_cache import create_github_client
+    github_client = create_github_client(github_token, options.cache)
+
+    aliases = None
+    if options.aliases:
+        with open(options.aliases, 'r') as file:
+            # format: {"ldap_name": "github_login"}
+            aliases = json.load(file)
+
+    snapshot_paths = (ALL_TEAMS_FILE, options.roles)
+    watcher = SyncWatcher(github_client, TeamSnapshot.load(*snapshot_paths),
+                          aliases=aliases,
+                          state=SyncState.load(options.state),
+                          team_index=TeamFileIndex.load(options.team_index),
+                          workers=options.workers,
+                          interval=options.interval,
+                          refresh_interval=options.refresh,
+                          snapshot_paths=snapshot_paths)
+    stop = threading.Event()
+    try:
+        watcher.run(stop)
+    except KeyboardInterrupt:
+        stop.set()
+        logger.info("Stopped watching")
+
+
+if __name__ == "__main__":
+    from cli import configure_logging
+    configure_logging(logging.DEBUG)
+    main()
@@ -1,10 +1,15 @@
+# The model keeps one object per RPU file, developer and additional team,
+# so whole-org analysis holds the corpus in memory: __slots__ keeps them
+# free of a per-instance __dict__.
 class TeamDefinition:
+    __slots__ = ('org_name', 'team_name', 'developers')
     DEFAULT_ORG_NAME = "jenkinsci"
 
     def __init__(self, team_name, developers, org_name=None):
         self.org_name = org_name if org_name is not None else self.DEFAULT_ORG_NAME
         self.team_name = team_name
-        self.developers = developers if developers is not None else []
+        self.developers = developers if developers is not None \
+            else DeveloperList()
 
     def get_org_name(self):
         return self.org_name
@@ -20,6 +25,8 @@ class TeamDefinition:
 
 
 class RepoYamlDefinition(TeamDefinition):
+    __slots__ = ('repo_name', 'additional_teams')
+
     def __init__(self, team_name, developers, org_name, repo_name,
                  additional_teams):
         super().__init__(team_name, developers, org_name)
@@ -34,33 +41,70 @@ class RepoYamlDefinition(TeamDefinition):
 
 
 class SpecialYamlDefinition(TeamDefinition):
+    __slots__ = ()
+
     def __init__(self, team_name, developers, org_name=None):
         super().__init__(team_name, developers, org_name)
 
 
+# Compared and hashed by value, so a repo's additional_teams set holds each
+# (team, role) pair once; immutable, as its hash must not change in a set.
 class AdditionalTeamDefinition:
+    __slots__ = ('team_name', 'role')
+
     def __init__(self, team_name, role):
-        self.team_name = team_name
-        self.role = role
+        object.__setattr__(self, 'team_name', team_name)
+        object.__setattr__(self, 'role', role)
+
+    def __setattr__(self, name, value):
+        raise AttributeError(f"AdditionalTeamDefinition is immutable, "
+                             f"cannot set {name}")
+
+    def __delattr__(self, name):
+        raise AttributeError(f"AdditionalTeamDefinition is immutable, "
+                             f"cannot delete {name}")
+
+    # pickled for worker processes; the default would set the slots
+    def __reduce__(self):
+        return AdditionalTeamDefinition, (self.team_name, self.role)
+
+    def __eq__(self, other):
+        if not isinstance(other, AdditionalTeamDefinition):
+            return NotImplemented
+        return (self.team_name, self.role) == (other.team_name, other.role)
+
+    def __hash__(self):
+        return hash((self.team_name, self.role))
+
+    def __repr__(self):
+        return f"AdditionalTeamDefinition({self.team_name!r}, {self.role!r})"
 
     def get_name(self):
         return self.team_name
 
-    def set_name(self, team_name):
-        self.team_name = team_name
-
     def get_role(self):
         return self.role
 
-    def set_role(self, role):
-        self.role = role
-
 
+# Merging fills in github on the instance, so it is compared by value but
+# not hashable.
 class DeveloperInfo:
+    __slots__ = ('ldap', 'github')
+
     def __init__(self, ldap, github):
         self.ldap = ldap
         self.github = github
 
+    def __eq__(self, other):
+        if not isinstance(other, DeveloperInfo):
+            return NotImplemented
+        return (self.ldap, self.github) == (other.ldap, other.github)
+
+    __hash__ = None
+
+    def __repr__(self):
+        return f"DeveloperInfo({self.ldap!r}, {self.github!r})"
+
     def get_ldap_username(self):
         return self.ldap
 
@@ -73,6 +117,67 @@ class DeveloperInfo:
     def set_github_username(self, github):
         self.github = github
 
+
+def normalize_login(login):
+    # GitHub logins are case-insensitive
+    return login.strip().lower()
+
+
+# A team's developers in YAML order, also reachable by normalized GitHub or
+# LDAP login; the first entry for a login wins. Used like the plain list
+# it replaces. The login index is built on first lookup, so a corpus that
+# is only loaded does not pay for it.
+class DeveloperList:
+    __slots__ = ('developers', 'logins')
+
+    def __init__(self, developers=()):
+        self.developers = list(developers)
+        # format: {"normalized_login": DeveloperInfo}
+        self.logins = None
+
+    def append(self, developer):
+        self.developers.append(developer)
+        self.add_logins(developer)
+
+    def index(self):
+        if self.logins is None:
+            self.logins = {}
+            for developer in self.developers:
+                self.add_logins(developer)
+        return self.logins
+
+    def add_logins(self, developer):
+        if self.logins is None:
+            return
+        for login in (developer.github, developer.ldap):
+            if login:
+                self.logins.setdefault(normalize_login(login), developer)
+
+    def get(self, login):
+        return self.index().get(normalize_login(login))
+
+    def __iter__(self):
+        return iter(self.developers)
+
+    def __len__(self):
+        return len(self.developers)
+
+    def __getitem__(self, index):
+        return self.developers[index]
+
+    def __eq__(self, other):
+        if isinstance(other, DeveloperList):
+            return self.developers == other.developers
+        if isinstance(other, list):
+            return self.developers == other
+        return NotImplemented
+
+    __hash__ = None
+
+    def __repr__(self):
+        return f"DeveloperList({self.developers!r})"
+
+
 from enum import Enum
 
 class Role(Enum):